@@ -100,6 +100,21 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# The timetable snapshots are invalidated by the generation worker, a separate process,
+# so the cache has to be shared between processes, the default local-memory one is not.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+
+# Rendered routine pdfs, one file per distinct content
+ROUTINE_PDF_ROOT = BASE_DIR / 'pdfs'
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
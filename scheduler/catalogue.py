@@ -0,0 +1,53 @@
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Tuple
+from scheduler.models import TimeSlot, Shift, SlotGroup
+from scheduler.validation import ConstraintCheckerEngine
+
+
+class SlotGroupCatalogue:
+    """
+    Every valid consecutive slot group of the shift keyed by (day, duration), built once per generator.
+    Groups follow the same rule as ConstraintCheckerEngine.is_consecutive, the Morning shift exception included.
+    """
+    def __init__(self, time_slots: List[TimeSlot], shift: Shift, slot_bit: Callable[[int], int], durations: Iterable[int] = ()):
+        self.shift = shift
+        self.slot_bit = slot_bit
+
+        self.slots_by_day: Dict[str, List[TimeSlot]] = defaultdict(list)
+        for slot in time_slots:
+            self.slots_by_day[slot.day].append(slot)
+        for slots in self.slots_by_day.values():
+            slots.sort(key=lambda s: s.slot_number)
+
+        self.day_masks = {day: self._mask(slots) for day, slots in self.slots_by_day.items()}
+
+        self.groups: Dict[Tuple[str, int], List[SlotGroup]] = {}
+        for duration in set(durations):
+            self.build(duration)
+
+    def _mask(self, slots: List[TimeSlot]) -> int:
+        mask = 0
+        for slot in slots:
+            mask |= self.slot_bit(slot.id)
+        return mask
+
+    def build(self, duration: int):
+        for day, slots in self.slots_by_day.items():
+            groups = []
+            for i in range(len(slots) - duration + 1):
+                window = slots[i:i + duration]
+                if ConstraintCheckerEngine.is_consecutive(window, self.shift):
+                    group = SlotGroup(window)
+                    group.day = day
+                    group.mask = self._mask(window)
+                    groups.append(group)
+            self.groups[(day, duration)] = groups
+
+    def free_days(self, busy: int) -> List[str]:
+        """Days with at least one slot outside the busy mask, in time slot order."""
+        return [day for day, mask in self.day_masks.items() if mask & ~busy]
+
+    def free_groups(self, day: str, duration: int, busy: int) -> List[SlotGroup]:
+        if (day, duration) not in self.groups:
+            self.build(duration)
+        return [group for group in self.groups.get((day, duration), ()) if not group.mask & busy]
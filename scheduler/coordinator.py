@@ -0,0 +1,174 @@
+import copy
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from scheduler.models import Assignment, TimeSlot
+from scheduler.scheduleGenerator import ScheduleGenerator
+from scheduler.tracker import Tracker
+
+
+class Unit(NamedTuple):
+    """One generator run of a coordinated generation: a shift, or the sections of one department within a shift."""
+    shift: str
+    department: Optional[int]
+    inputs: tuple
+
+
+class UnitResult(NamedTuple):
+    shift: str
+    department: Optional[int]
+    assignments: List[Assignment]
+    unassigned_sessions: int
+    total_score: float
+
+    @property
+    def label(self) -> str:
+        return self.shift if self.department is None else f'{self.shift} / department {self.department}'
+
+
+def split_units(inputs_by_shift: Dict[str, tuple], by_department: bool = False) -> List[Unit]:
+    """
+    One unit per shift, or per shift and section department. A department's unit gets every course of its sections'
+    semesters, whatever the course's department, as a section is offered them in a single shift run. Teachers are the
+    same objects in every unit, so the load one unit gives a teacher counts against max_classes_per_week in all the
+    others.
+    """
+    teachers_by_id = {}
+    units = []
+    for constrains, courses, teachers, rooms, time_slots, shift, sections in inputs_by_shift.values():
+        teachers = [teachers_by_id.setdefault(t.id, t) for t in teachers]
+        if not by_department:
+            units.append(Unit(shift.name, None, (constrains, courses, teachers, rooms, time_slots, shift, sections)))
+            continue
+
+        for department_id in sorted({s.department.id for s in sections}):
+            unit_sections = [s for s in sections if s.department.id == department_id]
+            semesters = {s.semester for s in unit_sections}
+            unit_courses = [c.model_copy(deep=True) for c in courses if c.semester in semesters]
+            units.append(Unit(
+                shift.name, department_id, (constrains, unit_courses, teachers, rooms, time_slots, shift, unit_sections),
+            ))
+    return units
+
+
+def unit_resources(unit: Unit) -> Tuple[Set[int], Set[int]]:
+    """Ids of the teachers and rooms the unit's generator may use, by the department and lab rules it applies."""
+    constrains, courses, teachers, rooms, time_slots, shift, sections = unit.inputs
+    departments = {c.department.id for c in courses}
+    lab_departments = {c.department.id for c in courses if c.is_lab}
+    has_theory = any(not c.is_lab for c in courses)
+
+    teacher_ids = {t.id for t in teachers if t.department.id in departments}
+    room_ids = {r.id for r in rooms if (r.is_lab and r.department.id in lab_departments) or (not r.is_lab and has_theory)}
+    return teacher_ids, room_ids
+
+
+def overlaps(a: TimeSlot, b: TimeSlot) -> bool:
+    return a.day == b.day and a.start_time < b.end_time and b.start_time < a.end_time
+
+
+def conflict_graph(units: List[Unit]) -> Dict[int, Set[int]]:
+    """
+    Unit index -> indices of the units it shares resources with. Sharing a teacher always couples two units, the weekly
+    load is counted across them. Sharing a room only does when some of their time slots overlap.
+    """
+    resources = [unit_resources(unit) for unit in units]
+    graph = {i: set() for i in range(len(units))}
+    for i in range(len(units)):
+        for j in range(i + 1, len(units)):
+            shared_teachers = resources[i][0] & resources[j][0]
+            shared_rooms = resources[i][1] & resources[j][1]
+            if shared_teachers or (shared_rooms and any(
+                    overlaps(a, b) for a in units[i].inputs[4] for b in units[j].inputs[4])):
+                graph[i].add(j)
+                graph[j].add(i)
+    return graph
+
+
+def components(graph: Dict[int, Set[int]]) -> List[List[int]]:
+    """Connected components of the conflict graph, each sorted, in order of their first unit."""
+    seen = set()
+    result = []
+    for start in sorted(graph):
+        if start in seen:
+            continue
+        seen.add(start)
+        component, stack = [], [start]
+        while stack:
+            node = stack.pop()
+            component.append(node)
+            for neighbour in graph[node] - seen:
+                seen.add(neighbour)
+                stack.append(neighbour)
+        result.append(sorted(component))
+    return result
+
+
+def block_overlaps(tracker: Tracker, time_slots: List[TimeSlot], placed: List[Assignment]):
+    """Blocks the slots overlapping the placed assignments in time, for their teacher and room."""
+    slots_by_day = defaultdict(list)
+    for slot in time_slots:
+        slots_by_day[slot.day].append(slot)
+
+    for assignment in placed:
+        mask = 0
+        for placed_slot in assignment.slot_group:
+            for slot in slots_by_day[placed_slot.day]:
+                if overlaps(slot, placed_slot):
+                    mask |= tracker.slot_bit(slot.id)
+        if mask:
+            tracker.block(mask, teacher_id=assignment.teacher.id, room_id=assignment.room.id)
+
+
+def run_component(units: List[Unit], seeds: List[Optional[int]], **options) -> List[UnitResult]:
+    """
+    Runs coupled units one after the other in this process. Every generator starts with the teachers' and rooms'
+    slots taken by the earlier units blocked, and the shared teacher objects carry their load over.
+    """
+    placed = []
+    results = []
+    for unit, seed in zip(units, seeds):
+        generator = ScheduleGenerator(*unit.inputs, seed=seed, **options)
+        block_overlaps(generator.tracker, generator.time_slots, placed)
+        assignments, _ = generator.generate()
+        placed.extend(assignments)
+        results.append(UnitResult(
+            shift=unit.shift, department=unit.department, assignments=assignments,
+            unassigned_sessions=generator.count_unassigned_sessions(), total_score=sum(a.score for a in assignments),
+        ))
+    return results
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _run_component_in_worker(units: List[Unit], seeds: List[Optional[int]], options: dict) -> List[UnitResult]:
+    return run_component(units, seeds, **options)
+
+
+def run_coordinated(inputs_by_shift: Dict[str, tuple], by_department: bool = False, workers: int = 1, seed: int = None,
+                    **options) -> Tuple[List[UnitResult], List[List[int]]]:
+    """
+    Schedules several shifts, or the departments within them, in one run. Units sharing a teacher, or a room at
+    overlapping times, form a component that runs sequentially on shared occupancy. Independent components run
+    in parallel over a process pool when workers > 1. Unit i is seeded with seed + i.
+    returns: (results in unit order, the components as lists of unit indices)
+    """
+    units = split_units(copy.deepcopy(inputs_by_shift), by_department=by_department)
+    groups = components(conflict_graph(units))
+    seeds = [None if seed is None else seed + i for i in range(len(units))]
+
+    jobs = [([units[i] for i in group], [seeds[i] for i in group]) for group in groups]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            outputs = list(pool.map(_run_component_in_worker, *zip(*jobs), [options] * len(jobs)))
+    else:
+        outputs = [run_component(group_units, group_seeds, **options) for group_units, group_seeds in jobs]
+
+    results = [None] * len(units)
+    for group, output in zip(groups, outputs):
+        for i, result in zip(group, output):
+            results[i] = result
+    return results, groups
@@ -0,0 +1,330 @@
+import copy
+import importlib.util
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from scheduler.models import Assignment, Course
+from scheduler.scheduleGenerator import ScheduleGenerator
+from scheduler.solvers import GreedySolver, Solver, SolverResult, SolverUnavailable
+
+# Soft terms are linear surrogates of the ScoreEngine ones, scaled to integer objective coefficients
+SCALE = 1000
+
+
+class CpSatSolver(Solver):
+    """
+    Exact backend on OR-Tools CP-SAT, an optional dependency imported on use.
+    The generator's inputs become one model:
+    - x[course, section, slot group] places a session, every course section gets exactly sessions_per_week of them,
+      at most one a day unless no_course_repeat_same_day is set,
+    - y[course, section, teacher] picks the one teacher of a course section among its department's,
+    - sections and teachers hold at most one session per slot, teachers at most max_classes_per_week sessions,
+    - per slot, the sessions of a room kind (theory rooms, a department's labs) never outnumber its rooms. Sessions are
+      runs of slots, so rooms are then given by interval colouring without any conflict.
+    The objective minimises the ScoreEngine terms' surrogates, each by its term weight: idle slots between classes of
+    a teacher or section day, the spread between the most and least loaded teacher, and a section's distance from
+    slots per day proportional to the slots available. A greedy routine is used as the solver's hint with warm_start.
+    The routine found is scored with the real ScoreEngine, every assignment with all the others placed. The surrogates
+    are linear where the terms are ratios, so the optimum of the model is not always the best routine by that score.
+    workers defaults to OR-Tools' own choice, every core.
+    """
+    name = 'cp-sat'
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec('ortools') is not None
+
+    def solve(self, inputs: tuple, seed: int = None, time_limit: float = 60.0, warm_start: bool = True,
+              workers: int = None, **options) -> SolverResult:
+        try:
+            from ortools.sat.python import cp_model
+        except ImportError as exc:
+            raise SolverUnavailable('The cp-sat solver needs OR-Tools, pip install ortools') from exc
+
+        started = time.perf_counter()
+        hint = GreedySolver().solve(inputs, seed=seed, **options) if warm_start else None
+
+        generator = ScheduleGenerator(*copy.deepcopy(inputs), seed=seed, **options)
+        model = cp_model.CpModel()
+        x, y, _ = self.build(model, generator)
+        if hint is not None:
+            remaining = None if time_limit is None else time_limit - (time.perf_counter() - started)
+            self.add_hint(cp_model, model, x, y, hint.assignments, workers, remaining)
+
+        solver = cp_model.CpSolver()
+        if time_limit is not None:
+            solver.parameters.max_time_in_seconds = max(0.0, time_limit - (time.perf_counter() - started))
+        if workers:
+            solver.parameters.num_workers = workers
+        solver.parameters.random_seed = seed or 0
+        status = solver.Solve(model)
+
+        status_name = {
+            cp_model.OPTIMAL: 'optimal', cp_model.FEASIBLE: 'feasible', cp_model.INFEASIBLE: 'infeasible',
+        }.get(status, 'unknown')
+        if status_name not in ('optimal', 'feasible'):
+            # Nothing better than the hint is known, it is returned as it is
+            assignments = hint.assignments if hint is not None else []
+            return SolverResult(
+                solver=self.name, status=status_name, assignments=assignments,
+                unassigned_sessions=hint.unassigned_sessions if hint is not None else self.sessions(generator),
+                total_score=sum(a.score for a in assignments), seconds=time.perf_counter() - started,
+                bound=None if status_name == 'infeasible' else solver.BestObjectiveBound(),
+            )
+
+        for assignment in self.extract(generator, solver, x, y):
+            generator.restore_assignment(assignment)
+        for assignment in list(generator.assignments):
+            assignment.score = generator.contribution(assignment)
+
+        objective, bound = solver.ObjectiveValue(), solver.BestObjectiveBound()
+        return SolverResult(
+            solver=self.name, status=status_name, assignments=generator.assignments,
+            unassigned_sessions=generator.count_unassigned_sessions(),
+            total_score=sum(a.score for a in generator.assignments), seconds=time.perf_counter() - started,
+            objective=objective, bound=bound, gap=abs(objective - bound) / max(1.0, abs(objective)),
+        )
+
+    @staticmethod
+    def sessions(generator: ScheduleGenerator) -> int:
+        return sum(c.sessions_per_week for c in generator.courses for _ in generator.get_sections_for_course(c))
+
+    @staticmethod
+    def groups(generator: ScheduleGenerator, course: Course) -> list:
+        return [
+            group for day in generator.catalogue.slots_by_day
+            for group in generator.catalogue.free_groups(day, course.duration_per_session, 0)
+        ]
+
+    def build(self, model, generator: ScheduleGenerator) -> Tuple[dict, dict, dict]:
+        """
+        Adds the variables, hard constraints and objective of the generator's inputs to the model.
+        returns: (x, y, z) keyed by (course id, section id, first slot id of the group), (course id, section id, teacher id)
+        and (course id, section id, first slot id, teacher id), z being the session taught by that teacher
+        """
+        config = generator.constraints.config
+        weights = {term.key: term.weight for term in generator.scorer.terms}
+        slots_by_day = generator.catalogue.slots_by_day
+
+        x, y, z = {}, {}, {}
+        section_slot = defaultdict(list)
+        teacher_slot = defaultdict(list)
+        teacher_sessions = defaultdict(list)
+        kind_slot = defaultdict(list)
+
+        for course in generator.courses:
+            groups = self.groups(generator, course)
+            teachers = [
+                t for t in generator.problem.teachers_for(course)
+                if not config.get('cross_department_teacher') or t.department.id == course.department.id
+            ]
+            kind = generator.problem.room_ids_for(course)
+            for section in generator.get_sections_for_course(course):
+                key = (course.id, section.id)
+                placed = [model.NewBoolVar(f'x{key}{group[0].id}') for group in groups]
+                for group, var in zip(groups, placed):
+                    x[key + (group[0].id,)] = var
+                model.Add(sum(placed) == course.sessions_per_week)
+
+                if not config.get('no_course_repeat_same_day'):
+                    for day in slots_by_day:
+                        model.Add(sum(var for var, group in zip(placed, groups) if group.day == day) <= 1)
+
+                chosen = [model.NewBoolVar(f'y{key}{t.id}') for t in teachers]
+                for teacher, var in zip(teachers, chosen):
+                    y[key + (teacher.id,)] = var
+                model.AddExactlyOne(chosen)
+
+                for g, group in enumerate(groups):
+                    for slot in group:
+                        section_slot[(section.id, slot.id)].append(placed[g])
+                        kind_slot[(kind, slot.id)].append(placed[g])
+                    for teacher, teaches in zip(teachers, chosen):
+                        # z = x and y, bounded both ways: a z set without its session would pad the teacher's
+                        # load and fill idle slots, the penalties would then score a routine that is not returned
+                        taught = model.NewBoolVar(f'z{key}{g}{teacher.id}')
+                        model.AddBoolOr([placed[g].Not(), teaches.Not(), taught])
+                        model.AddImplication(taught, placed[g])
+                        model.AddImplication(taught, teaches)
+                        z[key + (group[0].id, teacher.id)] = taught
+                        teacher_sessions[teacher.id].append(taught)
+                        for slot in group:
+                            teacher_slot[(teacher.id, slot.id)].append(taught)
+
+        for owner_slot in (section_slot, teacher_slot):
+            for variables in owner_slot.values():
+                model.Add(sum(variables) <= 1)
+        for (kind, _), variables in kind_slot.items():
+            model.Add(sum(variables) <= len(kind))
+        if config.get('enforce_teacher_max_weekly_load'):
+            for teacher in generator.teachers:
+                if teacher_sessions[teacher.id]:
+                    model.Add(sum(teacher_sessions[teacher.id]) <= teacher.max_classes_per_week)
+
+        # Expected sessions per owner, the ScoreEngine terms are summed over every assignment of the routine
+        total = self.sessions(generator)
+        section_sessions = defaultdict(int)
+        for course in generator.courses:
+            for section in generator.get_sections_for_course(course):
+                section_sessions[section.id] += course.sessions_per_week
+        loaded = [t for t in generator.teachers if teacher_sessions[t.id]]
+        teacher_sessions_each = total / max(1, len(loaded))
+
+        penalties = []
+        if 'minimize_teacher_slot_gap' in weights:
+            penalties += self.gap_penalties(
+                model, generator, teacher_slot, weights['minimize_teacher_slot_gap'],
+                {t.id: teacher_sessions_each for t in loaded},
+            )
+        if 'minimize_section_slot_gap' in weights:
+            penalties += self.gap_penalties(
+                model, generator, section_slot, weights['minimize_section_slot_gap'], section_sessions,
+            )
+        if 'load_balancing_between_teacher' in weights:
+            penalties += self.load_penalties(
+                model, loaded, teacher_sessions, total, weights['load_balancing_between_teacher'],
+            )
+        if 'day_balancing_slots_allocation' in weights:
+            penalties += self.day_penalties(
+                model, generator, section_slot, section_sessions, weights['day_balancing_slots_allocation'],
+            )
+        model.Minimize(sum(penalties))
+        return x, y, z
+
+    @staticmethod
+    def gap_penalties(model, generator: ScheduleGenerator, owner_slot: dict, weight: float, sessions: dict) -> list:
+        """
+        Idle slots between the first and last class of every owner day. The term gives each of the owner's sessions
+        1 - idle / the max possible gap of its busy days, so an idle slot costs about sessions / (busy days * bound).
+        """
+        days = len(generator.catalogue.slots_by_day)
+        penalties = []
+        for owner, owner_sessions in sessions.items():
+            for day, slots in generator.catalogue.slots_by_day.items():
+                busy = []
+                for slot in slots:
+                    variables = owner_slot.get((owner, slot.id))
+                    if variables:
+                        b = model.NewBoolVar('')
+                        model.Add(b == sum(variables))
+                        busy.append((slot.slot_number, b))
+                if len(busy) < 2:
+                    continue
+
+                low, high = busy[0][0], busy[-1][0]
+                first, last = model.NewIntVar(low, high, ''), model.NewIntVar(low, high, '')
+                active = model.NewBoolVar('')
+                for number, b in busy:
+                    model.Add(first <= number).OnlyEnforceIf(b)
+                    model.Add(last >= number).OnlyEnforceIf(b)
+                    model.AddImplication(b, active)
+                idle = model.NewIntVar(0, high - low, '')
+                model.Add(idle >= last - first + 1 - sum(b for _, b in busy)).OnlyEnforceIf(active)
+
+                bound = max(high - low - 1, 1) * max(1.0, min(owner_sessions, days))
+                penalties.append(round(weight * SCALE * owner_sessions / bound) * idle)
+        return penalties
+
+    @staticmethod
+    def load_penalties(model, teachers: list, teacher_sessions: dict, total: int, weight: float) -> list:
+        """
+        Distance of every teacher's load from the average. The term gives each session 1 - mean distance / average,
+        so a session of distance costs about the term weight. Scaled by the teacher count to stay integral.
+        """
+        if len(teachers) < 2:
+            return []
+        penalties = []
+        for teacher in teachers:
+            distance = model.NewIntVar(0, len(teachers) * teacher.max_classes_per_week + total, '')
+            load = sum(teacher_sessions[teacher.id])
+            model.Add(distance >= len(teachers) * load - total)
+            model.Add(distance >= total - len(teachers) * load)
+            penalties.append(max(1, round(weight * SCALE / len(teachers))) * distance)
+        return penalties
+
+    @staticmethod
+    def day_penalties(model, generator: ScheduleGenerator, section_slot: dict, sessions: dict, weight: float) -> list:
+        """
+        A section's distance from slots per day proportional to the day's slots. The term takes the squared error of
+        the day shares from each of the section's sessions, an L1 distance stands in for it. Scaled by the week's slots.
+        """
+        slots_by_day = generator.catalogue.slots_by_day
+        capacity = {day: len(slots) for day, slots in slots_by_day.items()}
+        week = sum(capacity.values())
+        totals = defaultdict(int)
+        for course in generator.courses:
+            for section in generator.get_sections_for_course(course):
+                totals[section.id] += course.sessions_per_week * course.duration_per_session
+
+        penalties = []
+        for section_id, total in totals.items():
+            coefficient = max(1, round(weight * SCALE * 2 * sessions[section_id] / (len(capacity) * week * total)))
+            for day, slots in slots_by_day.items():
+                count = sum(sum(section_slot.get((section_id, slot.id), [])) for slot in slots)
+                # |slots - total * capacity / week| * week
+                distance = model.NewIntVar(0, week * total, '')
+                model.Add(distance >= week * count - total * capacity[day])
+                model.Add(distance >= total * capacity[day] - week * count)
+                penalties.append(coefficient * distance)
+        return penalties
+
+    @staticmethod
+    def add_hint(cp_model, model, x: dict, y: dict, assignments: List[Assignment], workers: int,
+                 time_limit: Optional[float] = None):
+        """
+        The routine as the solver's starting point. Its placements and teachers are fixed in a copy of the model,
+        solving that copy within time_limit gives the values of every other variable, so the hint is complete and
+        the search starts from the routine's objective. A routine the model rejects, e.g. a partial one, or a copy
+        not solved in time only hints its own variables.
+        """
+        placed = {(a.course.id, a.section.id, a.slot_group[0].id) for a in assignments}
+        teachers = {(a.course.id, a.section.id, a.teacher.id) for a in assignments}
+
+        fixed = model.Clone()
+        for variables, chosen in ((x, placed), (y, teachers)):
+            for key, var in variables.items():
+                fixed.Add(fixed.GetBoolVarFromProtoIndex(var.Index()) == (key in chosen))
+        solver = cp_model.CpSolver()
+        if time_limit is not None:
+            solver.parameters.max_time_in_seconds = max(0.0, time_limit)
+        if workers:
+            solver.parameters.num_workers = workers
+        if solver.Solve(fixed) in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            hint = model.Proto().solution_hint
+            hint.vars.extend(range(len(model.Proto().variables)))
+            hint.values.extend(solver.ResponseProto().solution)
+            return
+
+        for variables, chosen in ((x, placed), (y, teachers)):
+            for key, var in variables.items():
+                model.AddHint(var, key in chosen)
+
+    def extract(self, generator: ScheduleGenerator, solver, x: dict, y: dict) -> List[Assignment]:
+        """The solved sessions as assignments, rooms of each kind handed out by interval colouring per day."""
+        sessions = []
+        for course in generator.courses:
+            groups = self.groups(generator, course)
+            for section in generator.get_sections_for_course(course):
+                key = (course.id, section.id)
+                teacher = next(
+                    t for t in generator.problem.teachers_for(course)
+                    if key + (t.id,) in y and solver.Value(y[key + (t.id,)])
+                )
+                for group in groups:
+                    if solver.Value(x[key + (group[0].id,)]):
+                        sessions.append((course, section, teacher, group))
+
+        rooms_by_id = {r.id: r for r in generator.rooms}
+        free_from: Dict[Tuple, int] = {}
+        assignments = []
+        for course, section, teacher, group in sorted(sessions, key=lambda s: (s[3].day, s[3][0].slot_number)):
+            room_ids = sorted(generator.problem.room_ids_for(course))
+            room_id = next(
+                r for r in room_ids if free_from.get((r, group.day), 0) <= group[0].slot_number
+            )
+            free_from[(room_id, group.day)] = group[-1].slot_number + 1
+            assignments.append(Assignment(
+                course=course, teacher=teacher, slot_group=group, room=rooms_by_id[room_id],
+                shift=generator.shift, section=section,
+            ))
+        return assignments
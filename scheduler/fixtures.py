@@ -0,0 +1,152 @@
+# builds scheduling inputs straight from Django fixture files, without touching the database.
+
+import copy
+import json
+from collections import defaultdict
+from datetime import time
+from typing import Dict, List
+
+from scheduler.models import (
+    Department, Shift, Section, TimeSlot, Room, Course, Teacher, Constrains,
+)
+
+# Keys of the constraints active in the bundled database, used when a fixture has none
+DEFAULT_CONSTRAINTS = (
+    ('Soft', 'minimize teacher slot gap'),
+    ('Soft', 'minimize section slot gap'),
+    ('Soft', 'day balancing slots allocation'),
+    ('Hard', 'one teacher per course'),
+    ('Hard', 'cross department teacher'),
+    ('Hard', 'enforce teacher max weekly load'),
+)
+DEFAULT_SHIFT = 'Evening'
+
+
+def _key(condition: str) -> str:
+    return '_'.join(condition.lower().split())
+
+
+def _time(value) -> time:
+    return value if isinstance(value, time) else time.fromisoformat(value)
+
+
+def load_fixture(path: str, shift: str = None) -> tuple:
+    with open(path) as f:
+        return inputs_from_records(json.load(f), shift=shift)
+
+
+def inputs_from_records(records: List[dict], shift: str = None) -> tuple:
+    """
+    Same tuple as Command.initialize_data, from fixture records of the `university` app or the older `scheduler` one.
+    Fixtures without shifts get a single DEFAULT_SHIFT, without sections one section per department and semester.
+    """
+    rows: Dict[str, Dict[int, dict]] = defaultdict(dict)
+    for record in records:
+        fields = record['fields']
+        if not fields.get('is_active', True):
+            continue
+        rows[record['model'].split('.')[-1]][record['pk']] = fields
+
+    departments = {pk: Department(id=pk, name=f['name']) for pk, f in rows['department'].items()}
+    default_department = next(iter(departments.values()))
+
+    shifts = {pk: Shift(id=pk, name=f['name']) for pk, f in rows['shift'].items()}
+    if not shifts:
+        shifts = {1: Shift(id=1, name=DEFAULT_SHIFT)}
+    shift_obj = next((s for s in shifts.values() if s.name == shift), None) if shift else next(iter(shifts.values()))
+    if shift_obj is None:
+        raise ValueError(f'Shift {shift} is not in the fixture')
+
+    types = {pk: f['name'] for pk, f in rows['constraintype'].items()}
+    constrains = [
+        Constrains(
+            id=pk, type=types[f['type']], condition=f['condition'], severity=f['severity'],
+            score_weight=f['score_weight'], key=_key(f['condition']),
+        )
+        for pk, f in rows['constrain'].items()
+    ] or [
+        Constrains(id=i, type=kind, condition=condition, severity='High', score_weight=1.0, key=_key(condition))
+        for i, (kind, condition) in enumerate(DEFAULT_CONSTRAINTS, start=1)
+    ]
+
+    all_slots = {
+        pk: TimeSlot(
+            id=pk, day=f['day'], slot_number=f['slot_number'], start_time=_time(f['start_time']),
+            end_time=_time(f['end_time']), shift=shifts.get(f.get('shift'), shift_obj),
+        )
+        for pk, f in rows['timeslot'].items()
+    }
+    time_slots = sorted((ts for ts in all_slots.values() if ts.shift.id == shift_obj.id), key=lambda ts: ts.id)
+
+    rooms = [
+        Room(id=pk, name=f['name'], department=departments.get(f.get('department'), default_department), is_lab=f['is_lab'])
+        for pk, f in rows['room'].items()
+    ]
+
+    preferred_teachers = defaultdict(list)
+    teachers = []
+    for pk, f in rows['teacher'].items():
+        preferred_courses = [c for c in f.get('preferred_courses', []) if c in rows['course']]
+        for course_id in preferred_courses:
+            preferred_teachers[course_id].append(pk)
+        teachers.append(Teacher(
+            id=pk, name=f['name'], initial=f['initial'], department=departments[f['department']],
+            max_classes_per_week=f['max_classes_per_week'],
+            preferred_time_slots=[all_slots[ts] for ts in f.get('preferred_time_slots', []) if ts in all_slots],
+            preferred_courses=preferred_courses, minimum_classes_per_day=f['minimum_classes_per_day'],
+        ))
+
+    courses = []
+    for pk, f in rows['course'].items():
+        course_shifts = [shifts[s] for s in f['shifts'] if s in shifts] if 'shifts' in f else list(shifts.values())
+        if shift_obj not in course_shifts:
+            continue
+        courses.append(Course(
+            id=pk, code=f['code'], name=f['name'], department=departments[f['department']], semester=f['semester'],
+            credit=f['credit'], sessions_per_week=f['sessions_per_week'], duration_per_session=f['duration_per_session'],
+            preferred_teachers=preferred_teachers[pk], is_lab=f['is_lab'], shifts=course_shifts,
+        ))
+
+    sections = [
+        Section(
+            id=pk, name=f['name'], semester=f['semester'], shift=shifts[f['shift']], department=departments[f['department']],
+        )
+        for pk, f in rows['section'].items()
+    ]
+    if not sections:
+        semesters = sorted({(c.department.id, c.semester) for c in courses})
+        sections = [
+            Section(id=i, name='A', semester=semester, shift=shift_obj, department=departments[department_id])
+            for i, (department_id, semester) in enumerate(semesters, start=1)
+        ]
+
+    return constrains, courses, teachers, rooms, time_slots, shift_obj, sections
+
+
+def scale_inputs(inputs: tuple, factor: int) -> tuple:
+    """
+    Scaled-up copy of a problem: every section, room and teacher is cloned `factor` times, the courses and time
+    slots stay the same. Clones of a preferred teacher stay preferred for the course.
+    """
+    constrains, courses, teachers, rooms, time_slots, shift, sections = copy.deepcopy(inputs)
+    if factor <= 1:
+        return constrains, courses, teachers, rooms, time_slots, shift, sections
+
+    def clones(items, update):
+        step = max(item.id for item in items)
+        result = list(items)
+        for copy_number in range(1, factor):
+            result.extend(item.model_copy(update={'id': item.id + copy_number * step, **update(item, copy_number)})
+                          for item in items)
+        return result, step
+
+    sections, _ = clones(sections, lambda s, n: {'name': f'{s.name}{n + 1}'})
+    rooms, _ = clones(rooms, lambda r, n: {'name': f'{r.name}-{n + 1}'})
+    teachers, teacher_step = clones(teachers, lambda t, n: {'name': f'{t.name} {n + 1}', 'initial': f'{t.initial}{n + 1}'})
+
+    for course in courses:
+        course.preferred_teachers = [
+            teacher_id + copy_number * teacher_step
+            for copy_number in range(factor) for teacher_id in course.preferred_teachers
+        ]
+    return constrains, courses, teachers, rooms, time_slots, shift, sections
@@ -0,0 +1,225 @@
+import math
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+from scheduler.models import Assignment, Candidate
+
+MOVES = ('move', 'swap', 'teacher')
+
+
+class LocalSearch:
+    """
+    Simulated annealing over the routine greedy construction and repair left, under the same hard constraints.
+    The routine's score is the sum of every assignment's soft score with all the others placed. A step tries one
+    neighbour of a random session:
+    - move: the session to another free slot group, in its room when that is free there or in another free room,
+    - swap: the slot groups of two sessions of the section with the same duration,
+    - teacher: every session of the course for the section to another teacher of its department.
+    The neighbour is scored as a delta over the assignments sharing its teachers or sections, over every assignment
+    when teacher loads change and load balancing is scored. A worse neighbour is kept with probability exp(delta / T),
+    T cooling geometrically from start_temperature to end_temperature over the budget. Course sections just changed
+    are tabu for tabu_tenure steps. The best routine seen is the one left in place, pinned assignments never move.
+    """
+    def __init__(self, generator, time_budget: float = 5.0, max_steps: Optional[int] = None,
+                 start_temperature: float = 0.05, end_temperature: float = 0.0005, tabu_tenure: int = 8):
+        self.generator = generator
+        self.tracker = generator.tracker
+        self.scorer = generator.scorer
+        self.random = generator.random
+        self.time_budget = time_budget
+        self.max_steps = max_steps
+        self.start_temperature = start_temperature
+        self.end_temperature = end_temperature
+
+        self.scores_loads = any(term.key == 'load_balancing_between_teacher' for term in self.scorer.terms)
+
+        # id() of an assignment -> its score with all the others placed
+        self.scores: Dict[int, float] = {}
+        self.total = 0.0
+        self.tabu = deque(maxlen=tabu_tenure)
+        self.journal = []
+        self.stats = Counter()
+
+    def run(self) -> dict:
+        """
+        Searches until the time budget or max_steps runs out.
+        returns: steps, accepted and improving steps, start and best score, seconds and score gained per second
+        """
+        started = time.perf_counter()
+        deadline = started + self.time_budget
+        self.scores = self.rescore(self.generator.assignments)
+        self.total = sum(self.scores.values())
+        start_score = best_score = self.total
+        best = self.snapshot()
+
+        steps = 0
+        while self.generator.assignments:
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.time_budget or (self.max_steps is not None and steps >= self.max_steps):
+                break
+            progress = elapsed / self.time_budget if self.time_budget else 1.0
+            if self.max_steps:
+                progress = max(progress, steps / self.max_steps)
+            temperature = self.start_temperature * (self.end_temperature / self.start_temperature) ** progress
+
+            steps += 1
+            kind = self.random.choice(MOVES)
+            if self.step(kind, temperature) and self.total > best_score + 1e-9:
+                best_score = self.total
+                best = self.snapshot()
+            if time.perf_counter() > deadline:
+                break
+
+        if self.total < best_score - 1e-9:
+            self.restore(best)
+        for assignment in self.generator.assignments:
+            assignment.score = self.scores[id(assignment)]
+
+        seconds = time.perf_counter() - started
+        return {
+            'steps': steps,
+            'accepted': self.stats['accepted'],
+            'improved': self.stats['improved'],
+            'moves': {kind: self.stats[kind] for kind in MOVES},
+            'start_score': start_score,
+            'best_score': best_score,
+            'seconds': seconds,
+            'score_per_second': (best_score - start_score) / seconds if seconds else 0.0,
+        }
+
+    def rescore(self, assignments: List[Assignment]) -> Dict[int, float]:
+        return {id(a): self.generator.contribution(a) for a in assignments}
+
+    def affected(self, assignments: List, loads_change: bool) -> List[Assignment]:
+        """Placed assignments whose score can depend on the given ones."""
+        if loads_change and self.scores_loads:
+            return list(self.generator.assignments)
+        teachers = {a.teacher.id for a in assignments}
+        sections = {a.section.id for a in assignments}
+        return [a for a in self.generator.assignments if a.teacher.id in teachers or a.section.id in sections]
+
+    def step(self, kind: str, temperature: float) -> bool:
+        """Tries one neighbour of the given kind. returns: True when it was kept"""
+        movable = [a for a in self.generator.assignments if not self.generator.is_pinned(a)
+                   and (a.course.id, a.section.id) not in self.tabu]
+        if not movable:
+            return False
+        neighbour = getattr(self, f'neighbour_{kind}')(self.random.choice(movable))
+        if neighbour is None:
+            return False
+        removed, candidates = neighbour
+
+        loads_change = Counter(a.teacher.id for a in removed) != Counter(c.teacher.id for c in candidates)
+        before = self.affected(removed + candidates, loads_change)
+        checkpoint = len(self.journal)
+        for assignment in removed:
+            self.remove(assignment)
+        for candidate in candidates:
+            if not self.generator.constraints.is_valid_assignment(candidate, self.generator.assignments):
+                self.rollback(checkpoint)
+                return False
+            self.add(candidate)
+
+        after = self.rescore(self.affected(removed + candidates, loads_change))
+        delta = sum(after.values()) - sum(self.scores[id(a)] for a in before)
+        if delta < 0 and self.random.random() >= math.exp(delta / temperature):
+            self.rollback(checkpoint)
+            return False
+
+        del self.journal[checkpoint:]
+        for assignment in removed:
+            del self.scores[id(assignment)]
+        self.scores.update(after)
+        self.total += delta
+        self.tabu.append((removed[0].course.id, removed[0].section.id))
+        self.stats['accepted'] += 1
+        self.stats[kind] += 1
+        if delta > 0:
+            self.stats['improved'] += 1
+        return True
+
+    def neighbour_move(self, assignment: Assignment) -> Optional[Tuple[List[Assignment], List[Candidate]]]:
+        generator = self.generator
+        own = self.tracker.group_mask(assignment.slot_group)
+        busy = self.tracker.busy_mask(teacher_id=assignment.teacher.id, section_id=assignment.section.id) & ~own
+
+        day = self.random.choice(list(generator.catalogue.slots_by_day))
+        groups = [
+            group for group in generator.catalogue.free_groups(day, assignment.course.duration_per_session, busy)
+            if group[0].id != assignment.slot_group[0].id
+        ]
+        if not groups:
+            return None
+        slot_group = self.random.choice(groups)
+
+        room_mask = self.tracker.room_mask
+        if not room_mask.get(assignment.room.id, 0) & ~own & slot_group.mask:
+            room = assignment.room
+        else:
+            rooms = [r for r in generator.get_compatible_rooms(assignment.course) if not room_mask.get(r.id, 0) & slot_group.mask]
+            if not rooms:
+                return None
+            room = self.random.choice(rooms)
+        return [assignment], [self.candidate(assignment, slot_group=slot_group, room=room)]
+
+    def neighbour_swap(self, assignment: Assignment) -> Optional[Tuple[List[Assignment], List[Candidate]]]:
+        others = [
+            a for a in self.generator.assignments
+            if a.section.id == assignment.section.id and a is not assignment and not self.generator.is_pinned(a)
+            and len(a.slot_group) == len(assignment.slot_group) and a.slot_group[0].id != assignment.slot_group[0].id
+        ]
+        if not others:
+            return None
+        other = self.random.choice(others)
+        return [assignment, other], [
+            self.candidate(assignment, slot_group=other.slot_group), self.candidate(other, slot_group=assignment.slot_group),
+        ]
+
+    def neighbour_teacher(self, assignment: Assignment) -> Optional[Tuple[List[Assignment], List[Candidate]]]:
+        generator = self.generator
+        sessions = [
+            a for a in generator.assignments
+            if a.course.id == assignment.course.id and a.section.id == assignment.section.id
+        ]
+        teachers = [t for t in generator.problem.teachers_for(assignment.course) if t.id != assignment.teacher.id]
+        if not teachers or any(map(generator.is_pinned, sessions)):
+            return None
+        teacher = self.random.choice(teachers)
+        return sessions, [self.candidate(a, teacher=teacher) for a in sessions]
+
+    def candidate(self, assignment: Assignment, **changes) -> Candidate:
+        fields = {
+            'teacher': assignment.teacher, 'slot_group': assignment.slot_group, 'room': assignment.room, **changes,
+        }
+        return self.generator.make_combination(
+            assignment.course, fields['teacher'], fields['slot_group'], fields['room'], assignment.shift, assignment.section,
+        )
+
+    def add(self, candidate: Candidate) -> Assignment:
+        assignment = self.generator.make_assignment([candidate])
+        self.journal.append(('add', assignment))
+        return assignment
+
+    def remove(self, assignment: Assignment):
+        self.generator.remove_assignment(assignment)
+        self.journal.append(('remove', assignment))
+
+    def rollback(self, checkpoint: int):
+        while len(self.journal) > checkpoint:
+            action, assignment = self.journal.pop()
+            if action == 'add':
+                self.generator.remove_assignment(assignment)
+            else:
+                self.generator.restore_assignment(assignment)
+
+    def snapshot(self) -> List[Tuple[Assignment, float]]:
+        return [(a, self.scores[id(a)]) for a in self.generator.assignments]
+
+    def restore(self, snapshot: List[Tuple[Assignment, float]]):
+        """Puts back the assignments of a snapshot, with their scores, in place of the current ones."""
+        for assignment in list(self.generator.assignments):
+            self.generator.remove_assignment(assignment)
+        for assignment, score in snapshot:
+            self.generator.restore_assignment(assignment)
+        self.scores = {id(a): score for a, score in snapshot}
+        self.total = sum(self.scores.values())
@@ -97,6 +97,47 @@ class Assignment(OrmBaseModel):
     score: Optional[float] = 0.0
 
 
+class Candidate:
+    """
+    Lightweight stand-in for Assignment inside the generate/validate/score loop, skips pydantic validation.
+    Only the winning candidate is promoted to an Assignment.
+    """
+    __slots__ = ('course', 'teacher', 'slot_group', 'room', 'shift', 'section', 'score')
+
+    def __init__(self, course: Course, teacher: Teacher, slot_group: List[TimeSlot], room: Room,
+                 shift: Optional[Shift] = None, section: Optional[Section] = None, score: float = 0.0):
+        self.course = course
+        self.teacher = teacher
+        self.slot_group = slot_group
+        self.room = room
+        self.shift = shift
+        self.section = section
+        self.score = score
+
+    def to_assignment(self) -> Assignment:
+        return Assignment(
+            course=self.course, teacher=self.teacher, slot_group=self.slot_group, room=self.room,
+            shift=self.shift, section=self.section, score=self.score,
+        )
+
+
+class SlotGroup(tuple):
+    """
+    A run of consecutive time slots on one day, built once by the SlotGroupCatalogue.
+    Carries its day and occupancy mask so lookups don't have to recompute them.
+    """
+    day: str
+    mask: int
+
+
+# Multiplier of a constraint's score_weight per severity
+SEVERITY_SCORE = {
+    'High': 3.0,
+    'Medium': 1.5,
+    'Low': 1.0,
+}
+
+
 class Constrains(OrmBaseModel):
     id: int
     type: str
@@ -105,4 +146,9 @@ class Constrains(OrmBaseModel):
     score_weight: float
     key: str
 
+    @property
+    def weight(self) -> float:
+        """Weight of the constraint's term in a weighted score, score_weight scaled by the severity."""
+        return self.score_weight * SEVERITY_SCORE[self.severity]
+
 
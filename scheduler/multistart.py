@@ -0,0 +1,69 @@
+import copy
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+from scheduler.models import Assignment
+from scheduler.scheduleGenerator import ScheduleGenerator
+
+
+class RunResult(NamedTuple):
+    seed: int
+    assignments: List[Assignment]
+    unassigned_sessions: int
+    total_score: float
+
+    @property
+    def rank(self) -> Tuple[int, float]:
+        """Fewest unassigned sessions first, then the highest total score."""
+        return self.unassigned_sessions, -self.total_score
+
+
+# Scheduling inputs of the worker process, shipped once by the pool initializer
+_inputs: Optional[tuple] = None
+
+
+def _init_worker(inputs: tuple):
+    import django
+    django.setup()
+
+    global _inputs
+    _inputs = inputs
+
+
+def run_once(inputs: tuple, seed: int, **options) -> RunResult:
+    """One seeded generation on a private copy of the inputs, the generator mutates courses and teacher loads."""
+    constrains, courses, teachers, rooms, time_slots, shift, sections = copy.deepcopy(inputs)
+
+    scheduler = ScheduleGenerator(constrains, courses, teachers, rooms, time_slots, shift, sections, seed=seed, **options)
+    assignments, _ = scheduler.generate()
+
+    return RunResult(
+        seed=seed,
+        assignments=assignments,
+        unassigned_sessions=scheduler.count_unassigned_sessions(),
+        total_score=sum(a.score for a in assignments),
+    )
+
+
+def _run_in_worker(seed: int, options: dict) -> RunResult:
+    return run_once(_inputs, seed, **options)
+
+
+def run_multistart(inputs: tuple, restarts: int, workers: int = 1, seed: int = None, **options) -> Tuple[RunResult, List[RunResult]]:
+    """
+    Runs the generator `restarts` times with distinct seeds, across a process pool when workers > 1.
+    Seeds are seed, seed + 1, ... so a multi-start run can be replayed, random ones when seed is None.
+    returns: (best run, every run in seed order)
+    """
+    if seed is None:
+        seeds = random.SystemRandom().sample(range(2 ** 31), restarts)
+    else:
+        seeds = [seed + i for i in range(restarts)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(inputs,)) as pool:
+            results = list(pool.map(_run_in_worker, seeds, [options] * len(seeds)))
+    else:
+        results = [run_once(inputs, seed, **options) for seed in seeds]
+
+    return min(results, key=lambda r: r.rank), results
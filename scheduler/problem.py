@@ -0,0 +1,72 @@
+from typing import Dict, FrozenSet, List
+import numpy as np
+from scheduler.models import Course, Room, Section, Shift, Teacher, TimeSlot
+
+
+class Problem:
+    """
+    Eligibility matrices of the scheduling inputs, compiled once per generator.
+    Teachers, rooms, sections, courses and slots get an index in input order and the department / lab / semester
+    rules become boolean matrices over them. The generator answers its "who may teach / where / for whom" questions
+    from these instead of comparing pydantic objects field by field, the placement loop itself stays on objects.
+    """
+    def __init__(self, courses: List[Course], teachers: List[Teacher], rooms: List[Room], time_slots: List[TimeSlot],
+                 shift: Shift, sections: List[Section]):
+        self.courses = list(courses)
+        self.teachers = list(teachers)
+        self.rooms = list(rooms)
+        self.sections = list(sections)
+        self.time_slots = list(time_slots)
+        self.shift = shift
+
+        self.course_index: Dict[int, int] = {c.id: i for i, c in enumerate(self.courses)}
+        self.teacher_index: Dict[int, int] = {t.id: i for i, t in enumerate(self.teachers)}
+        self.room_index: Dict[int, int] = {r.id: i for i, r in enumerate(self.rooms)}
+        self.section_index: Dict[int, int] = {s.id: i for i, s in enumerate(self.sections)}
+        self.slot_index: Dict[int, int] = {s.id: i for i, s in enumerate(self.time_slots)}
+
+        self.course_department = np.array([c.department.id for c in self.courses], dtype=np.int64)
+        self.course_semester = np.array([c.semester for c in self.courses], dtype=np.int64)
+        self.course_is_lab = np.array([c.is_lab for c in self.courses], dtype=bool)
+
+        self.teacher_department = np.array([t.department.id for t in self.teachers], dtype=np.int64)
+
+        self.room_department = np.array([r.department.id for r in self.rooms], dtype=np.int64)
+        self.room_is_lab = np.array([r.is_lab for r in self.rooms], dtype=bool)
+
+        self.section_semester = np.array([s.semester for s in self.sections], dtype=np.int64)
+        self.section_shift = np.array([s.shift.id for s in self.sections], dtype=np.int64)
+
+        # teacher x course: same department, the pool get_available_teachers draws from
+        self.teacher_course = self.teacher_department[:, None] == self.course_department[None, :]
+
+        # room x course: lab rooms for lab courses and theory rooms otherwise, labs only within the course's department
+        same_kind = self.room_is_lab[:, None] == self.course_is_lab[None, :]
+        same_department = self.room_department[:, None] == self.course_department[None, :]
+        self.room_course = same_kind & (~self.course_is_lab[None, :] | same_department)
+
+        # section x course: the course's semester, sections of the generated shift only
+        self.section_course = (
+            (self.section_semester[:, None] == self.course_semester[None, :]) & (self.section_shift == shift.id)[:, None]
+        )
+
+        # Per course lookups the generator hits for every session, objects kept in input order
+        self.course_teachers: List[List[Teacher]] = [
+            [self.teachers[t] for t in np.flatnonzero(self.teacher_course[:, c])] for c in range(len(self.courses))
+        ]
+        self.course_room_ids: List[FrozenSet[int]] = [
+            frozenset(self.rooms[r].id for r in np.flatnonzero(self.room_course[:, c])) for c in range(len(self.courses))
+        ]
+        self.course_sections: List[List[Section]] = [
+            [self.sections[s] for s in np.flatnonzero(self.section_course[:, c])] for c in range(len(self.courses))
+        ]
+
+    def teachers_for(self, course: Course) -> List[Teacher]:
+        """Teachers of the course's department, a fresh list the caller may shuffle."""
+        return list(self.course_teachers[self.course_index[course.id]])
+
+    def room_ids_for(self, course: Course) -> FrozenSet[int]:
+        return self.course_room_ids[self.course_index[course.id]]
+
+    def sections_for(self, course: Course) -> List[Section]:
+        return list(self.course_sections[self.course_index[course.id]])
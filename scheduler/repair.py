@@ -0,0 +1,130 @@
+import time
+from typing import List
+from scheduler.models import Assignment, Course, Section
+
+
+class RepairBudgetExceeded(Exception):
+    pass
+
+
+class RepairEngine:
+    """
+    Bounded repair for the sessions greedy placement could not fit, pinned assignments are never ejected.
+    For a missing session it looks for a (teacher, slot_group, room) whose slots are held by only a few assignments,
+    found through the Tracker slot owner indexes, ejects those blockers, places the session and then re-places every
+    blocker with the same procedure one level deeper. Any failure rolls the whole attempt back through a journal.
+    """
+    def __init__(self, generator, max_depth: int = 2, max_blockers: int = 2, max_attempts: int = 20,
+                 time_budget: float = 5.0, node_budget: int = 5000):
+        self.generator = generator
+        self.tracker = generator.tracker
+        self.max_depth = max_depth
+        self.max_blockers = max_blockers
+        self.max_attempts = max_attempts
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+
+        self.journal = []
+        self.nodes = 0
+        self.deadline = None
+
+    def repair(self, course: Course, section: Section) -> bool:
+        """
+        Tries to place every missing session of the course for the section.
+        returns: True if the course is complete afterwards, sessions that could be placed are kept either way.
+        """
+        if self.deadline is None:
+            self.deadline = time.perf_counter() + self.time_budget
+
+        missing = course.sessions_per_week - self.tracker.placed_sessions(course.id, section.id)
+        for _ in range(missing):
+            checkpoint = len(self.journal)
+            try:
+                placed = self.place_session(course, section, self.max_depth, locked=[])
+            except RepairBudgetExceeded:
+                placed = False
+            if not placed:
+                self.rollback(checkpoint)
+                return False
+        return True
+
+    def place_session(self, course: Course, section: Section, depth: int, locked: List[Assignment]) -> bool:
+        self.spend()
+
+        best = self.generator.find_best_assignment(course, section)
+        if best is not None:
+            self.add(best)
+            return True
+
+        if depth == 0:
+            return False
+
+        for candidate, blockers in self.blocked_candidates(course, section, locked)[:self.max_attempts]:
+            self.spend()
+            checkpoint = len(self.journal)
+
+            for blocker in blockers:
+                self.remove(blocker)
+
+            if self.generator.constraints.is_valid_assignment(candidate, self.generator.assignments):
+                candidate.score = self.generator.scorer.score_assignment(candidate, self.generator.assignments)
+                placed = self.add(candidate)
+                if all(
+                    self.place_session(blocker.course, blocker.section, depth - 1, locked + [placed])
+                    for blocker in blockers
+                ):
+                    return True
+
+            self.rollback(checkpoint)
+        return False
+
+    def blocked_candidates(self, course: Course, section: Section, locked: List[Assignment]):
+        """Candidates that are only blocked by a few movable assignments, fewest blockers first."""
+        generator = self.generator
+        tracker = self.tracker
+
+        days = None
+        if not generator.constraints.config.get('no_course_repeat_same_day'):
+            used_days = tracker.day_used_by_course_section[course.id][section.id]
+            days = [day for day in generator.catalogue.slots_by_day if day not in used_days]
+
+        rooms = generator.get_compatible_rooms(course)
+        found = []
+        for teacher in generator.get_available_teachers(course, section):
+            if not generator.constraints.teacher_fits(course, teacher):
+                continue
+            for day in days if days is not None else generator.catalogue.slots_by_day:
+                for slot_group in generator.catalogue.free_groups(day, course.duration_per_session, 0):
+                    for room in rooms:
+                        blockers = tracker.blocking_assignments(slot_group, teacher.id, section.id, room.id)
+                        if not blockers or len(blockers) > self.max_blockers:
+                            continue
+                        if any(b is l for b in blockers for l in locked) or any(map(generator.is_pinned, blockers)):
+                            continue
+                        candidate = generator.make_combination(course, teacher, slot_group, room, generator.shift, section)
+                        found.append((candidate, blockers))
+
+        found.sort(key=lambda item: len(item[1]))
+        return found
+
+    def spend(self):
+        self.nodes += 1
+        if self.nodes > self.node_budget or time.perf_counter() > self.deadline:
+            raise RepairBudgetExceeded()
+
+    def add(self, candidate) -> Assignment:
+        assignment = self.generator.make_assignment([candidate])
+        self.journal.append(('add', assignment))
+        return assignment
+
+    def remove(self, assignment: Assignment):
+        self.generator.remove_assignment(assignment)
+        self.journal.append(('remove', assignment))
+
+    def rollback(self, checkpoint: int):
+        while len(self.journal) > checkpoint:
+            action, assignment = self.journal.pop()
+            if action == 'add':
+                self.generator.remove_assignment(assignment)
+            else:
+                self.generator.restore_assignment(assignment)
@@ -1,15 +1,27 @@
 from scheduler.tracker import Tracker
-from scheduler.validation import ConstraintCheckerEngine
-from scheduler.score import ScoreEngine
-from collections import defaultdict
+from scheduler.catalogue import SlotGroupCatalogue
+from scheduler.problem import Problem
+from scheduler.repair import RepairEngine
+from scheduler.localsearch import LocalSearch
+from scheduler.validation import ConstraintCheckerEngine, IndexedConstraintCheckerEngine
+from scheduler.score import ScoreEngine, IncrementalScoreEngine, BatchScoreEngine
+from collections import defaultdict, Counter
 from typing import List, Dict
-from scheduler.models import Assignment, Course, Teacher, TimeSlot, Room, Shift, Section, Constrains
+from scheduler.models import Assignment, Candidate, Course, Teacher, TimeSlot, Room, Shift, Section, Constrains
 from university.models import Assignment as DjangoAssignment, Teacher as DTeacher, Room as DRoom, Course as DCourse, Shift as DShift, Section as DSection
 import random
+import time
 
 
 class ScheduleGenerator:
-    def __init__(self, constrains, courses, teachers, rooms, time_slots, shift, sections):
+    def __init__(self, constrains, courses, teachers, rooms, time_slots, shift, sections, indexed_validation=True, incremental_scoring=True,
+                 streaming=True, score_bound=False, batch_scoring=True, weighted_scoring=False, profile_scoring=False, repair_depth=2, repair_time_budget=5.0, repair_node_budget=5000,
+                 local_search_budget=0.0, local_search_steps=None, seed=None, progress=None, progress_interval=1.0):
+        # Every shuffle goes through this RNG, so the same seed and inputs always give the same routine
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.stats = Counter()
+
         self.soft_constrains = [cs for cs in constrains if cs.type == 'Soft']
         self.hard_constrains = [cs for cs in constrains if cs.type == 'Hard']
         self.time_slots = time_slots
@@ -18,27 +30,54 @@ class ScheduleGenerator:
         self.shift = shift
         self.sections = sections
 
-        random.shuffle(courses)
+        self.random.shuffle(courses)
         courses.sort(key=self.get_course_priority, reverse=True)
 
         self.courses = courses
-
-        self.tracker = Tracker()
-
-        self.constraints = ConstraintCheckerEngine(self.hard_constrains)
-        self.scorer = ScoreEngine(self.soft_constrains, time_slots, self.tracker)
+        self.problem = Problem(courses, teachers, rooms, time_slots, shift, sections)
+
+        self.tracker = Tracker(time_slots)
+        self.catalogue = SlotGroupCatalogue(
+            time_slots, shift, self.tracker.slot_bit, durations=[c.duration_per_session for c in courses]
+        )
+
+        if indexed_validation:
+            self.constraints = IndexedConstraintCheckerEngine(self.hard_constrains, self.tracker)
+        else:
+            self.constraints = ConstraintCheckerEngine(self.hard_constrains)
+        # Weighted scoring honours the constraints' score_weight and severity, profiling times every soft term
+        scoring = {'weighted': weighted_scoring, 'profile': profile_scoring}
+        if incremental_scoring and batch_scoring:
+            self.scorer = BatchScoreEngine(self.soft_constrains, time_slots, self.tracker, **scoring)
+        elif incremental_scoring:
+            self.scorer = IncrementalScoreEngine(self.soft_constrains, time_slots, self.tracker, **scoring)
+        else:
+            self.scorer = ScoreEngine(self.soft_constrains, time_slots, self.tracker, **scoring)
 
         self.assignments : List[Assignment] = []
-
-    def get_filtered_timeslots(self, time_slots: List[TimeSlot], section: Section, teacher: Teacher) -> defaultdict[str, List[TimeSlot]]:
-        all_slots_by_day = defaultdict(list)
-        for slot in time_slots:
-            # if slot.id not in self.tracker.slot_used_by_section.get(section.id, set()) and slot.id not in self.tracker.slot_used_by_teacher.get(teacher.id, set()):
-            all_slots_by_day[slot.day].append(slot)
-
-        for slots in all_slots_by_day.values():
-            slots.sort(key=lambda s: s.slot_number)
-        return all_slots_by_day
+        # id() of the assignments kept from an earlier run, placed by pin() and never moved by the repair
+        self.pinned = set()
+
+        # Streaming keeps only the running best candidate, score_bound stops as soon as it can't be beaten
+        self.streaming = streaming
+        self.score_bound = self.scorer.max_score() if score_bound else None
+        # Batch scoring validates every candidate of a session first, then scores them all in one NumPy pass.
+        # The score bound needs the candidates one at a time, so it keeps the streaming loop
+        self.batch_scoring = isinstance(self.scorer, BatchScoreEngine) and self.score_bound is None
+
+        self.repair_depth = repair_depth
+        self.repair_time_budget = repair_time_budget
+        self.repair_node_budget = repair_node_budget
+
+        # Seconds of local search after construction and repair, none by default. The steps cap makes it reproducible
+        self.local_search_budget = local_search_budget
+        self.local_search_steps = local_search_steps
+        self.local_search_report = None
+
+        # Called with a progress dict at most every progress_interval seconds, and once at the end
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.last_progress = 0.0
 
     @staticmethod
     def get_course_priority(course: Course):
@@ -52,15 +91,45 @@ class ScheduleGenerator:
 
     def generate(self):
         unassigned_courses = defaultdict(list)
-        for idx, course in enumerate(self.courses):
-            for section in self.get_sections_for_course(course):
-                if not self.try_assign_course(course, section):
-                    unassigned_courses[section].append(course)
+        work = [(course, section) for course in self.courses for section in self.get_sections_for_course(course)]
+        failed = 0
+        for done, (course, section) in enumerate(work, start=1):
+            if not self.try_assign_course(course, section):
+                unassigned_courses[section].append(course)
+                failed += 1
+            self.report_progress('greedy', done - failed, len(work))
 
         backtracking_failed_courses = self.try_backtracking(unassigned_courses)
+        failed = sum(len(courses) for courses in backtracking_failed_courses.values())
+        if self.local_search_budget:
+            self.local_search_report = LocalSearch(
+                self, time_budget=self.local_search_budget, max_steps=self.local_search_steps,
+            ).run()
+        self.report_progress('done', len(work) - failed, len(work), force=True)
 
         return self.assignments, backtracking_failed_courses
 
+    def report_progress(self, phase: str, placed: int, total: int, force: bool = False):
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_progress < self.progress_interval:
+            return
+        self.last_progress = now
+        self.progress({
+            'phase': phase,
+            'courses_placed': placed,
+            'courses_total': total,
+            'candidates': self.stats['candidates'],
+            'best_score': sum(a.score for a in self.assignments),
+        })
+
+    def count_unassigned_sessions(self) -> int:
+        return sum(
+            max(0, course.sessions_per_week - self.tracker.placed_sessions(course.id, section.id))
+            for course in self.courses for section in self.get_sections_for_course(course)
+        )
+
     def try_backtracking(self, unassigned_courses: Dict[Section, List[Course]]) -> Dict[Section, List[Course]]:
         """
         Its try to backtrack to the assigned schedule for that section and find the blocking courses and try to
@@ -70,17 +139,80 @@ class ScheduleGenerator:
         returns: Dict[Section, List[Course]] Failed courses by section even after backtracking.
         """
 
-        failed_courses = dict()
+        failed_courses = defaultdict(list)
+        if not self.repair_depth:
+            return dict(unassigned_courses)
+
+        repair = RepairEngine(
+            self, max_depth=self.repair_depth, time_budget=self.repair_time_budget, node_budget=self.repair_node_budget
+        )
         for section, courses in unassigned_courses.items():
             for course in courses:
-                pass
-                # if not self.solve_issue(course, section):
-                #     failed_courses[section].append(course)
-        return failed_courses
+                if not repair.repair(course, section):
+                    failed_courses[section].append(course)
+        return dict(failed_courses)
+
+    def pin(self, assignments: List[Assignment]) -> List[Assignment]:
+        """
+        Places assignments kept from an earlier run as they are, generate() then only fills in the missing sessions.
+        One the current inputs no longer allow is left out: a course, teacher, room or section that is gone or no longer
+        eligible, a session beyond sessions_per_week, or a clash with those pinned before it.
+        returns: the assignments that were not pinned
+        """
+        rejected = []
+        for assignment in assignments:
+            if self.fits_inputs(assignment) and self.constraints.is_valid_assignment(assignment, self.assignments):
+                self.restore_assignment(assignment)
+                self.pinned.add(id(assignment))
+            else:
+                rejected.append(assignment)
+        return rejected
+
+    def fits_inputs(self, assignment: Assignment) -> bool:
+        """The assignment only uses current inputs, with the eligibility rules candidates are generated by."""
+        problem = self.problem
+        course, teacher, room, section = assignment.course, assignment.teacher, assignment.room, assignment.section
+        if course.id not in problem.course_index or teacher.id not in problem.teacher_index or section is None or \
+                section.id not in problem.section_index:
+            return False
+        if any(slot.id not in problem.slot_index for slot in assignment.slot_group):
+            return False
+
+        c = problem.course_index[course.id]
+        return (
+            problem.teacher_course[problem.teacher_index[teacher.id], c]
+            and problem.section_course[problem.section_index[section.id], c]
+            and room.id in problem.room_ids_for(course)
+            and self.tracker.placed_sessions(course.id, section.id) < course.sessions_per_week
+        )
+
+    def contribution(self, assignment: Assignment) -> float:
+        """The placed assignment's soft score as if it were placed last, every other assignment in place."""
+        self.tracker.remove_assignment(assignment)
+        others = self.assignments if isinstance(self.scorer, IncrementalScoreEngine) else \
+            [a for a in self.assignments if a is not assignment]
+        score = self.scorer.score_assignment(assignment, others)
+        self.tracker.add_assignment(assignment)
+        return score
+
+    def is_pinned(self, assignment: Assignment) -> bool:
+        return id(assignment) in self.pinned
+
+    def new_assignments(self) -> List[Assignment]:
+        """The assignments this run placed, without the pinned ones."""
+        return [a for a in self.assignments if not self.is_pinned(a)]
 
     def try_assign_course(self, course: Course, section: Section):
         schedule = []
-        for class_count in range(course.sessions_per_week):
+        # Every session when generating from scratch, the ones pin() left missing otherwise
+        missing = course.sessions_per_week - self.tracker.placed_sessions(course.id, section.id)
+        for class_count in range(missing):
+            if self.streaming:
+                best = self.find_best_assignment(course, section)
+                if best is not None:
+                    schedule.append(self.make_assignment([best]))
+                continue
+
             combinations = []
             teachers = self.get_available_teachers(course, section)
             for teacher in teachers:
@@ -93,32 +225,84 @@ class ScheduleGenerator:
                         combinations.append(self.make_combination(course, teacher, slot_group, room, self.shift, section))
 
             valid_combinations = []
+            self.stats['candidates'] += len(combinations)
             for combination in combinations:
                 if self.constraints.is_valid_assignment(combination, self.assignments):
+                    self.stats['valid_candidates'] += 1
                     combination.score = self.scorer.score_assignment(combination, self.assignments)
                     valid_combinations.append(combination)
 
             if valid_combinations:
                 schedule.append(self.make_assignment(valid_combinations)) # finalize the top scored one
 
-        if len(schedule) != course.sessions_per_week:
+        if len(schedule) != missing:
             print(f'Invalid combination: {course.code} - {course.name}')
             # raise Exception(f'Invalid combination: {course.code} - {course.name}')
             return False
         return True
 
+    def iter_candidates(self, course: Course, section: Section):
+        """
+        Lazily yields (teacher, slot_group, room) for one session of the course. Teachers and slot groups that fail
+        the checks not depending on placed assignments are dropped before any room lookup or Assignment is built.
+        """
+        for teacher in self.get_available_teachers(course, section):
+            if not self.constraints.teacher_fits(course, teacher):
+                continue
+            for slot_group in self.get_available_slots(course, teacher, section):
+                if not self.constraints.slot_group_fits(course, slot_group, self.shift):
+                    continue
+                for room in self.get_available_rooms(course, slot_group, teacher):
+                    yield teacher, slot_group, room
+
+    def find_best_assignment(self, course: Course, section: Section):
+        """
+        Validates and scores the streamed candidates keeping only the running best, first one wins on ties like max().
+        returns: the best valid Candidate or None.
+        """
+        if self.batch_scoring:
+            return self.find_best_assignment_batch(course, section)
+
+        best = None
+        for teacher, slot_group, room in self.iter_candidates(course, section):
+            combination = self.make_combination(course, teacher, slot_group, room, self.shift, section)
+            self.stats['candidates'] += 1
+            if not self.constraints.is_valid_assignment(combination, self.assignments):
+                continue
+            self.stats['valid_candidates'] += 1
+            combination.score = self.scorer.score_assignment(combination, self.assignments)
+            if best is None or combination.score > best.score:
+                best = combination
+                if self.score_bound is not None and best.score >= self.score_bound:
+                    break
+        return best
+
+    def find_best_assignment_batch(self, course: Course, section: Section):
+        """find_best_assignment with the valid candidates scored together, the score bound does not apply."""
+        valid = []
+        for teacher, slot_group, room in self.iter_candidates(course, section):
+            combination = self.make_combination(course, teacher, slot_group, room, self.shift, section)
+            self.stats['candidates'] += 1
+            if self.constraints.is_valid_assignment(combination, self.assignments):
+                valid.append(combination)
+        if not valid:
+            return None
+
+        self.stats['valid_candidates'] += len(valid)
+        scores = self.scorer.score_candidates(valid)
+        # argmax returns the first of equal scores, like the streaming loop
+        best = valid[int(scores.argmax())]
+        best.score = float(scores.max())
+        return best
+
     def get_sections_for_course(self, course: Course):
-        return [
-            sec for sec in self.sections
-            if course.semester == sec.semester and
-               sec.shift == self.shift
-        ]
+        return self.problem.sections_for(course)
 
     def get_available_teachers(self, course: Course, section: Section):
         preferred = course.preferred_teachers
-        ts = [t for t in self.teachers if t.department == course.department]
-        random.shuffle(ts)
-        random.shuffle(preferred)
+        ts = self.problem.teachers_for(course)
+        self.random.shuffle(ts)
+        self.random.shuffle(preferred)
         found_teachers = [t for t in ts if t.id in preferred] + [item for item in ts if item not in preferred]
 
         # if a teacher was already taken this course, then check no other teacher
@@ -140,54 +324,33 @@ class ScheduleGenerator:
         return found_teachers
 
     def get_available_slots(self, course: Course, teacher: Teacher, section: Section):
-        all_slots_by_day = self.get_filtered_timeslots([ts for ts in self.time_slots if ts.id not in self.tracker.slot_used_by_section[section.id] and ts.id not in self.tracker.slot_used_by_teacher[teacher.id]], section, teacher)
-
-        to_del = []
-        for day, day_sl in all_slots_by_day.items():
-            # check course for the same day
-            if day in self.tracker.day_used_by_course_section[course.id] and day in self.tracker.day_used_by_course_section[course.id][section.id]:
-                to_del.append(day)
-            # day_slots_map[day].extend(day_sl)
+        busy = self.tracker.busy_mask(teacher_id=teacher.id, section_id=section.id)
 
-        for day in to_del:
-            all_slots_by_day.pop(day)
+        # Skip the days where this course already has a class for the section, when validate_slot would reject them
+        days = self.catalogue.free_days(busy)
+        if not self.constraints.config.get('no_course_repeat_same_day'):
+            used_days = self.tracker.day_used_by_course_section[course.id][section.id]
+            days = [day for day in days if day not in used_days]
 
-        day_slots_map = all_slots_by_day
-
-        # Filter by consecutiveness
-        days = list(day_slots_map.keys())
-
-        random.shuffle(days)
+        self.random.shuffle(days)
 
         found_slots = []
         for day in days:
-            for i, slot in enumerate(day_slots_map[day]):
-                if i + course.duration_per_session > len(day_slots_map[day]):
-                    continue
-                slot_group = day_slots_map[day][i:i + course.duration_per_session]
-                for s in slot_group:
-                    if s.id in self.tracker.slot_used_by_teacher[teacher.id]:
-                        continue
-                if all([s.id not in self.tracker.slot_used_by_teacher[teacher.id] for s in slot_group]):
-                    found_slots.append(slot_group)
+            found_slots.extend(self.catalogue.free_groups(day, course.duration_per_session, busy))
 
         return found_slots
 
+    def get_compatible_rooms(self, course: Course):
+        room_ids = self.problem.room_ids_for(course)
+        return [r for r in self.rooms if r.id in room_ids]
+
     def get_available_rooms(self, course: Course, slot_group: List[TimeSlot], teacher: Teacher):
-        random.shuffle(self.rooms)
-        rooms = [r for r in self.rooms if r.is_lab == course.is_lab]
-        if course.is_lab:
-            rooms = [r for r in rooms if r.department == course.department]
-
-        found_rooms = []
-
-        for room in rooms:
-            if (
-                room.id in self.tracker.used_slots_by_room and
-                any(slot.id in self.tracker.used_slots_by_room[room.id] for slot in slot_group)
-            ):
-                continue
-            found_rooms.append(room)
+        self.random.shuffle(self.rooms)
+        rooms = self.get_compatible_rooms(course)
+
+        group_mask = self.tracker.group_mask(slot_group)
+        room_mask = self.tracker.room_mask
+        found_rooms = [room for room in rooms if not room_mask.get(room.id, 0) & group_mask]
 
         # found_rooms = [
         #     room for room in rooms
@@ -207,12 +370,12 @@ class ScheduleGenerator:
         return found_rooms
 
     @staticmethod
-    def make_combination(course, teacher, slot_group, room, shift, section):
-        return Assignment(course=course, teacher=teacher, slot_group=slot_group, room=room, shift=shift, section=section)
+    def make_combination(course, teacher, slot_group, room, shift, section) -> Candidate:
+        return Candidate(course=course, teacher=teacher, slot_group=slot_group, room=room, shift=shift, section=section)
 
-    def make_assignment(self, combinations: List[Assignment]):
+    def make_assignment(self, combinations: List[Candidate]):
 
-        top_score_assignment = max(combinations, key=lambda x: x.score)
+        top_score_assignment = max(combinations, key=lambda x: x.score).to_assignment()
 
         self.assignments.append(top_score_assignment)
 
@@ -224,6 +387,16 @@ class ScheduleGenerator:
 
         return top_score_assignment
 
+    def remove_assignment(self, assignment: Assignment):
+        # by identity, pydantic equality would compare every field of every assignment
+        index = next(i for i, a in enumerate(self.assignments) if a is assignment)
+        del self.assignments[index]
+        self.tracker.remove_assignment(assignment)
+
+    def restore_assignment(self, assignment: Assignment):
+        self.assignments.append(assignment)
+        self.tracker.add_assignment(assignment)
+
     def save_routine(self, assignments: List[Assignment]):
         """
         Only for testing purpose, Don't call in main or development branch. Only call locally
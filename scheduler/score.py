@@ -1,32 +1,102 @@
-from typing import List
-from scheduler.models import Assignment
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from scheduler.models import Assignment, Candidate
 from collections import defaultdict, Counter
 
 
+class CandidateColumns(NamedTuple):
+    """Per candidate day index, first and last slot number and slot count of a batch, as aligned arrays."""
+    day: np.ndarray
+    first: np.ndarray
+    last: np.ndarray
+    size: np.ndarray
+
+
+def sequential_sum(rows: np.ndarray) -> np.ndarray:
+    """
+    Row sums added left to right like the builtin sum, ndarray.sum adds pairwise and can differ in the last bit.
+    Batch scores then equal the scalar ones exactly, so ties between candidates break the same way.
+    """
+    return rows.cumsum(axis=1)[:, -1]
+
+
+class ScoringTerm(NamedTuple):
+    """One soft constraint compiled for scoring: its key, its weight and the bound method scoring it."""
+    key: str
+    weight: float
+    score: Callable[[Assignment, List[Assignment]], float]
+    # Scores a whole batch of candidates at once, on engines that have a batch version of the term
+    batch: Optional[Callable] = None
+
+
 class ScoreEngine:
-    def __init__(self, constraints, slots, tracker):
+    """
+    Soft constraint scoring. The active constraints with a `_score_<key>` method are compiled once into a tuple of
+    ScoringTerms, constraints without one are ignored. A candidate's score is the sum of its terms, each within [0, 1],
+    or with weighted=True the sum weighted by the constraints' score_weight and severity.
+    With profile=True the seconds and calls spent per term are counted in term_seconds and term_calls.
+    """
+    def __init__(self, constraints, slots, tracker, weighted: bool = False, profile: bool = False):
         self.constraints = {
             cs.key : cs for cs in constraints
         }
         self.time_slots = slots
         self.tracker = tracker
-
-    def score_assignment(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
-        scores = {}
-        if assignment.teacher.initial == 'MR' and assignment.teacher.load >= 3 and assignment.course.code == 'CSE-345':
-            pass
-        for key, value in self.constraints.items():
+        self.weighted = weighted
+        self.profile = profile
+        self.term_seconds = Counter()
+        self.term_calls = Counter()
+        self.terms: Tuple[ScoringTerm, ...] = self.compile_terms()
+
+    def compile_terms(self) -> Tuple[ScoringTerm, ...]:
+        terms = []
+        for key, constraint in self.constraints.items():
             score_func = getattr(self, f'_score_{key}', None)
-            if not score_func:
+            if score_func is None:
                 continue
+            weight = constraint.weight if self.weighted else 1.0
+            if weight < 0:
+                # max_score and the generator's score_bound rely on every term adding at most its weight
+                raise ValueError(f'Soft constraint {key} has a negative weight {weight:g}, score_weight must be >= 0')
+            terms.append(ScoringTerm(key, weight, score_func, getattr(self, f'_batch_{key}', None)))
+        return tuple(terms)
+
+    def max_score(self) -> float:
+        """
+        Upper bound of score_assignment: every soft term scores within [0, 1] before its weight, so the bound is the
+        number of terms, or with weighted=True the sum of their weights. compile_terms rejects negative weights.
+        """
+        return float(sum(term.weight for term in self.terms))
 
-            scores[key] = score_func(assignment, current_assignments)
+    def score_assignment(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
+        if self.profile:
+            return self._score_assignment_profiled(assignment, current_assignments)
 
-        # total_score = sum(self.constraints[key].score_weight * scores[key] for key in scores)
-        total_score = sum(scores[key] for key in scores)
+        total_score = 0
+        for term in self.terms:
+            total_score += term.weight * term.score(assignment, current_assignments)
         assignment.score = total_score
         return total_score
 
+    def _score_assignment_profiled(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
+        total_score = 0
+        for term in self.terms:
+            started = time.perf_counter()
+            total_score += term.weight * term.score(assignment, current_assignments)
+            self.term_seconds[term.key] += time.perf_counter() - started
+            self.term_calls[term.key] += 1
+        assignment.score = total_score
+        return total_score
+
+    def term_report(self) -> List[dict]:
+        """Per term weight, calls and seconds, the slowest term first. Empty unless profiling."""
+        report = [
+            {'key': term.key, 'weight': term.weight, 'calls': self.term_calls[term.key], 'seconds': self.term_seconds[term.key]}
+            for term in self.terms if self.term_calls[term.key]
+        ]
+        return sorted(report, key=lambda row: row['seconds'], reverse=True)
+
     def _score_minimize_teacher_slot_gap(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
         # 1. Preferred time slot
         teacher_id = assignment.teacher.id
@@ -115,13 +185,13 @@ class ScoreEngine:
 
     def _score_load_balancing_between_teacher(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
         # Calculate the current load for each teacher
-        teacher_loads = {t.id: t.load for t in current_assignments}
+        teacher_loads = {a.teacher.id: a.teacher.load for a in current_assignments}
 
         # Add the current assignment to the teacher's load
         if assignment.teacher.id in teacher_loads:
             teacher_loads[assignment.teacher.id] += 1  # Adjust based on assignment
 
-        if len(teacher_loads) == 1:
+        if len(teacher_loads) <= 1:
             return 1.0  # Perfect load balancing since there is only one teacher
 
         # Calculate the average load across all teachers
@@ -170,3 +240,269 @@ class ScoreEngine:
 
         # Normalize error to keep the score between 0 and 1
         return max(0.0, 1.0 - min(error, 1.0))
+
+
+class IncrementalScoreEngine(ScoreEngine):
+    """
+    Scores exactly like ScoreEngine, but from running aggregates instead of rescanning current_assignments.
+    The per-day slot lists live in the Tracker, this engine subscribes to it and keeps per teacher/section gap totals,
+    slot totals and teacher loads up to date on every add/remove. A candidate is then scored as a delta on its own day.
+    """
+    def __init__(self, constraints, slots, tracker, **options):
+        super().__init__(constraints, slots, tracker, **options)
+
+        all_slots_by_day = defaultdict(list)
+        for ts in self.time_slots:
+            all_slots_by_day[ts.day].append(ts.slot_number)
+
+        # Max possible gap per day and slot count per day (kept in time slot order)
+        self.day_bounds = {day: max(max(slots) - min(slots) - 1, 1) for day, slots in all_slots_by_day.items()}
+        self.slots_per_day = {day: len(slots) for day, slots in all_slots_by_day.items()}
+
+        # [total gap, gap count, total max possible gap] per teacher / section, and their per-day contribution
+        self.teacher_gaps = defaultdict(lambda: [0, 0, 0])
+        self.section_gaps = defaultdict(lambda: [0, 0, 0])
+        self.day_gaps = {}
+
+        self.section_slot_count = defaultdict(int)
+        # teacher id -> [teacher, assignment count], in order of first assignment
+        self.loaded_teachers = {}
+
+        tracker.subscribe(self)
+
+    def on_add(self, assignment: Assignment):
+        self._refresh_day(assignment)
+        self.section_slot_count[assignment.section.id] += len(assignment.slot_group)
+
+        entry = self.loaded_teachers.setdefault(assignment.teacher.id, [assignment.teacher, 0])
+        entry[1] += 1
+
+    def on_remove(self, assignment: Assignment):
+        self._refresh_day(assignment)
+        self.section_slot_count[assignment.section.id] -= len(assignment.slot_group)
+
+        entry = self.loaded_teachers[assignment.teacher.id]
+        entry[1] -= 1
+        if not entry[1]:
+            del self.loaded_teachers[assignment.teacher.id]
+
+    def _refresh_day(self, assignment: Assignment):
+        day = assignment.slot_group[0].day
+        for totals, owner, slots in (
+            (self.teacher_gaps, ('teacher', assignment.teacher.id), self.tracker.teacher_day_slots[(assignment.teacher.id, day)]),
+            (self.section_gaps, ('section', assignment.section.id), self.tracker.section_day_slots[(assignment.section.id, day)]),
+        ):
+            total = totals[owner[1]]
+            old = self.day_gaps.pop((owner, day), None)
+            if old:
+                for i in range(3):
+                    total[i] -= old[i]
+            new = self._day_gap(slots, day)
+            if new:
+                self.day_gaps[(owner, day)] = new
+                for i in range(3):
+                    total[i] += new[i]
+
+    def _day_gap(self, slots, day):
+        """(total gap, gap count, max possible gap) of one sorted day of slot numbers, None below two slots."""
+        if len(slots) < 2:
+            return None
+        return slots[-1] - slots[0] - (len(slots) - 1), len(slots) - 1, self.day_bounds[day]
+
+    def _gap_score(self, totals, day_slots, assignment: Assignment) -> float:
+        day = assignment.slot_group[0].day
+        numbers = [ts.slot_number for ts in assignment.slot_group]
+        total_gap, count, total_max_possible_gap = totals
+
+        old = self._day_gap(day_slots, day)
+        if old:
+            total_gap, count, total_max_possible_gap = total_gap - old[0], count - old[1], total_max_possible_gap - old[2]
+
+        size = len(day_slots) + len(numbers)
+        if size > 1:
+            first = min(day_slots[0], min(numbers)) if day_slots else min(numbers)
+            last = max(day_slots[-1], max(numbers)) if day_slots else max(numbers)
+            total_gap += last - first - (size - 1)
+            count += size - 1
+            total_max_possible_gap += self.day_bounds[day]
+
+        if count == 0 or total_max_possible_gap == 0:
+            return 1.0
+
+        avg_gap_ratio = total_gap / total_max_possible_gap
+        return max(0.0, 1.0 - avg_gap_ratio)
+
+    def _score_minimize_teacher_slot_gap(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
+        teacher_id = assignment.teacher.id
+        day_slots = self.tracker.teacher_day_slots.get((teacher_id, assignment.slot_group[0].day), [])
+        return self._gap_score(self.teacher_gaps.get(teacher_id, (0, 0, 0)), day_slots, assignment)
+
+    def _score_minimize_section_slot_gap(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
+        section_id = assignment.section.id
+        day_slots = self.tracker.section_day_slots.get((section_id, assignment.slot_group[0].day), [])
+        return self._gap_score(self.section_gaps.get(section_id, (0, 0, 0)), day_slots, assignment)
+
+    def _score_load_balancing_between_teacher(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
+        teacher_loads = {teacher_id: entry[0].load for teacher_id, entry in self.loaded_teachers.items()}
+
+        if assignment.teacher.id in teacher_loads:
+            teacher_loads[assignment.teacher.id] += 1
+
+        if len(teacher_loads) <= 1:
+            return 1.0
+
+        avg_load = sum(teacher_loads.values()) / len(teacher_loads)
+        imbalance = sum(abs(load - avg_load) for load in teacher_loads.values()) / len(teacher_loads)
+        return max(0.0, 1.0 - (imbalance / avg_load))
+
+    def _score_day_balancing_slots_allocation(self, assignment: Assignment, current_assignments: List[Assignment]) -> float:
+        used_days = self.tracker.day_used_by_course_section[assignment.course.id][assignment.section.id]
+        slot_count_by_day = {day: count for day, count in self.slots_per_day.items() if day not in used_days}
+        total_available = sum(slot_count_by_day.values())
+
+        section_id = assignment.section.id
+        day_count = Counter()
+        for day in slot_count_by_day:
+            day_count[day] = len(self.tracker.section_day_slots.get((section_id, day), ()))
+        for ts in assignment.slot_group:
+            day_count[ts.day] += 1
+
+        total_assigned = self.section_slot_count.get(section_id, 0) + len(assignment.slot_group)
+        if total_assigned == 0 or total_available == 0:
+            return 1.0
+
+        ideal = {day: slot_count_by_day[day] / total_available for day in slot_count_by_day}
+        actual = {day: day_count[day] / total_assigned for day in slot_count_by_day}
+
+        error = sum((actual.get(day, 0.0) - ideal[day]) ** 2 for day in ideal)
+        return max(0.0, 1.0 - min(error, 1.0))
+
+
+class BatchScoreEngine(IncrementalScoreEngine):
+    """
+    IncrementalScoreEngine that also scores a whole batch of candidates at once.
+    The candidates of one session share the course, the section and the tracker state, they only differ in teacher,
+    slot group and room. score_candidates gathers per teacher/section and day occupancy arrays once per batch and
+    evaluates every soft term for all candidates with NumPy, agreeing with score_assignment to float tolerance.
+    """
+    def __init__(self, constraints, slots, tracker, **options):
+        super().__init__(constraints, slots, tracker, **options)
+        self.days = list(self.slots_per_day)
+        self.day_index = {day: i for i, day in enumerate(self.days)}
+        self.day_bound_array = np.array([self.day_bounds[day] for day in self.days], dtype=np.int64)
+        self.day_slot_array = np.array([self.slots_per_day[day] for day in self.days], dtype=np.int64)
+
+    def score_candidates(self, batch: List[Candidate]) -> np.ndarray:
+        """Scores of candidates sharing one course and section, in batch order. Candidates' own score is left alone."""
+        scores = np.zeros(len(batch))
+        if not batch:
+            return scores
+
+        # Slot groups are consecutive runs in slot number order, so the first and last slot bound the group
+        columns = CandidateColumns(
+            day=np.fromiter((self.day_index[c.slot_group[0].day] for c in batch), dtype=np.int64, count=len(batch)),
+            first=np.fromiter((c.slot_group[0].slot_number for c in batch), dtype=np.int64, count=len(batch)),
+            last=np.fromiter((c.slot_group[-1].slot_number for c in batch), dtype=np.int64, count=len(batch)),
+            size=np.fromiter((len(c.slot_group) for c in batch), dtype=np.int64, count=len(batch)),
+        )
+        for term in self.terms:
+            started = time.perf_counter() if self.profile else None
+            if term.batch is not None:
+                scores += term.weight * term.batch(batch, columns)
+            else:
+                scores += term.weight * np.array([term.score(c, None) for c in batch])
+            if self.profile:
+                self.term_seconds[term.key] += time.perf_counter() - started
+                self.term_calls[term.key] += len(batch)
+        return scores
+
+    def _day_arrays(self, index, owner_ids: List[int]):
+        """(slot count, first slot, last slot) per owner and day, from the tracker's sorted per-day slot lists."""
+        shape = (len(owner_ids), len(self.days))
+        count, first, last = np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64)
+        for o, owner_id in enumerate(owner_ids):
+            for d, day in enumerate(self.days):
+                slots = index.get((owner_id, day))
+                if slots:
+                    count[o, d], first[o, d], last[o, d] = len(slots), slots[0], slots[-1]
+        return count, first, last
+
+    def _batch_gap_scores(self, totals: np.ndarray, day_arrays, owner: np.ndarray, columns) -> np.ndarray:
+        """Vectorised _gap_score, totals holds [total gap, gap count, total max possible gap] per owner."""
+        day = columns.day
+        day_count, day_first, day_last = (a[owner, day] for a in day_arrays)
+        bound = self.day_bound_array[day]
+        total_gap, count, total_max = (totals[owner, i].copy() for i in range(3))
+
+        # Take the day's current contribution out, put the day with the candidate back in
+        had = day_count >= 2
+        total_gap -= np.where(had, day_last - day_first - (day_count - 1), 0)
+        count -= np.where(had, day_count - 1, 0)
+        total_max -= np.where(had, bound, 0)
+
+        size = day_count + columns.size
+        first = np.where(day_count > 0, np.minimum(day_first, columns.first), columns.first)
+        last = np.where(day_count > 0, np.maximum(day_last, columns.last), columns.last)
+        grows = size > 1
+        total_gap += np.where(grows, last - first - (size - 1), 0)
+        count += np.where(grows, size - 1, 0)
+        total_max += np.where(grows, bound, 0)
+
+        scored = (count != 0) & (total_max != 0)
+        ratio = total_gap / np.where(scored, total_max, 1)
+        return np.where(scored, np.maximum(0.0, 1.0 - ratio), 1.0)
+
+    def _batch_minimize_teacher_slot_gap(self, batch: List[Candidate], columns) -> np.ndarray:
+        teacher_ids = list(dict.fromkeys(c.teacher.id for c in batch))
+        position = {teacher_id: i for i, teacher_id in enumerate(teacher_ids)}
+        owner = np.fromiter((position[c.teacher.id] for c in batch), dtype=np.int64, count=len(batch))
+        totals = np.array([self.teacher_gaps.get(teacher_id, (0, 0, 0)) for teacher_id in teacher_ids], dtype=np.int64)
+        day_arrays = self._day_arrays(self.tracker.teacher_day_slots, teacher_ids)
+        return self._batch_gap_scores(totals, day_arrays, owner, columns)
+
+    def _batch_minimize_section_slot_gap(self, batch: List[Candidate], columns) -> np.ndarray:
+        section_id = batch[0].section.id
+        owner = np.zeros(len(batch), dtype=np.int64)
+        totals = np.array([self.section_gaps.get(section_id, (0, 0, 0))], dtype=np.int64)
+        day_arrays = self._day_arrays(self.tracker.section_day_slots, [section_id])
+        return self._batch_gap_scores(totals, day_arrays, owner, columns)
+
+    def _batch_load_balancing_between_teacher(self, batch: List[Candidate], columns) -> np.ndarray:
+        loaded_ids = list(self.loaded_teachers)
+        if len(loaded_ids) <= 1:
+            return np.ones(len(batch))
+        loads = np.array([entry[0].load for entry in self.loaded_teachers.values()], dtype=np.float64)
+
+        # One row of loads per distinct candidate teacher, with the candidate's session added when already loaded
+        teacher_ids = list(dict.fromkeys(c.teacher.id for c in batch))
+        loaded_position = {teacher_id: i for i, teacher_id in enumerate(loaded_ids)}
+        rows = np.repeat(loads[None, :], len(teacher_ids), axis=0)
+        for u, teacher_id in enumerate(teacher_ids):
+            if teacher_id in loaded_position:
+                rows[u, loaded_position[teacher_id]] += 1
+
+        avg = sequential_sum(rows) / len(loaded_ids)
+        imbalance = sequential_sum(np.abs(rows - avg[:, None])) / len(loaded_ids)
+        per_teacher = np.maximum(0.0, 1.0 - imbalance / avg)
+
+        position = {teacher_id: i for i, teacher_id in enumerate(teacher_ids)}
+        return per_teacher[np.fromiter((position[c.teacher.id] for c in batch), dtype=np.int64, count=len(batch))]
+
+    def _batch_day_balancing_slots_allocation(self, batch: List[Candidate], columns) -> np.ndarray:
+        course_id, section_id = batch[0].course.id, batch[0].section.id
+        used_days = self.tracker.day_used_by_course_section[course_id][section_id]
+        available = np.array([d for d, day in enumerate(self.days) if day not in used_days], dtype=np.int64)
+        total_available = self.day_slot_array[available].sum()
+        if total_available == 0:
+            return np.ones(len(batch))
+
+        ideal = self.day_slot_array[available] / total_available
+        day_count = np.array(
+            [len(self.tracker.section_day_slots.get((section_id, self.days[d]), ())) for d in available], dtype=np.int64,
+        )
+        total_assigned = self.section_slot_count.get(section_id, 0) + columns.size
+
+        counts = day_count[None, :] + columns.size[:, None] * (available[None, :] == columns.day[:, None])
+        actual = counts / total_assigned[:, None]
+        error = sequential_sum((actual - ideal[None, :]) ** 2)
+        return np.maximum(0.0, 1.0 - np.minimum(error, 1.0))
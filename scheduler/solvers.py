@@ -0,0 +1,76 @@
+import copy
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+from scheduler.models import Assignment
+from scheduler.scheduleGenerator import ScheduleGenerator
+
+
+class SolverUnavailable(ImportError):
+    """The backend's optional dependency is not installed."""
+
+
+class SolverResult(NamedTuple):
+    solver: str
+    # optimal / feasible / infeasible / unknown for the exact backends, complete / partial for the greedy one
+    status: str
+    assignments: List[Assignment]
+    unassigned_sessions: int
+    total_score: float
+    seconds: float
+    # Objective of the exact model, the proven bound on it and their relative gap, None for the greedy backend
+    objective: Optional[float] = None
+    bound: Optional[float] = None
+    gap: Optional[float] = None
+
+
+class Solver(ABC):
+    """
+    A scheduling backend. solve() takes the inputs tuple of Command.initialize_data / load_inputs and never mutates it,
+    options are the ScheduleGenerator ones (weighted_scoring, ...), the exact backends read the rules and weights
+    from a generator built with them.
+    """
+    name = None
+
+    @classmethod
+    def available(cls) -> bool:
+        """Whether the backend's dependencies are installed, solve() raises SolverUnavailable otherwise."""
+        return True
+
+    @abstractmethod
+    def solve(self, inputs: tuple, seed: int = None, time_limit: float = None, warm_start: bool = True,
+              **options) -> SolverResult:
+        ...
+
+
+class GreedySolver(Solver):
+    """ScheduleGenerator's greedy construction and repair, time_limit and warm_start do not apply."""
+    name = 'greedy'
+
+    def solve(self, inputs: tuple, seed: int = None, time_limit: float = None, warm_start: bool = True,
+              **options) -> SolverResult:
+        started = time.perf_counter()
+        generator = ScheduleGenerator(*copy.deepcopy(inputs), seed=seed, **options)
+        assignments, _ = generator.generate()
+        unassigned = generator.count_unassigned_sessions()
+        return SolverResult(
+            solver=self.name, status='partial' if unassigned else 'complete', assignments=assignments,
+            unassigned_sessions=unassigned, total_score=sum(a.score for a in assignments),
+            seconds=time.perf_counter() - started,
+        )
+
+
+def _solvers() -> Dict[str, Type[Solver]]:
+    from scheduler.cpsat import CpSatSolver
+    return {GreedySolver.name: GreedySolver, CpSatSolver.name: CpSatSolver}
+
+
+def solver_names() -> Tuple[str, ...]:
+    return tuple(_solvers())
+
+
+def get_solver(name: str) -> Solver:
+    solvers = _solvers()
+    if name not in solvers:
+        raise ValueError(f'Unknown solver {name}, expected one of {", ".join(solvers)}')
+    return solvers[name]()
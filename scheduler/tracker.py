@@ -1,43 +1,182 @@
-from collections import defaultdict
-from scheduler.models import Assignment
+from bisect import insort
+from collections import defaultdict, Counter
+from typing import Iterable, List
+from scheduler.models import Assignment, TimeSlot, SlotGroup
 
 class Tracker:
-    def __init__(self):
+    def __init__(self, time_slots: Iterable[TimeSlot] = ()):
+        # Dense slot index: every slot id owns one bit of the occupancy masks
+        self.slot_bits = {}
+        for slot in time_slots:
+            self.slot_bit(slot.id)
+
+        # Occupancy masks, one int bitmask per section / teacher / room
+        self.section_mask = defaultdict(int)
+        self.teacher_mask = defaultdict(int)
+        self.room_mask = defaultdict(int)
+
         # Tracker
-        self.slot_used_by_section = defaultdict(set)
-        self.slot_used_by_teacher = defaultdict(set)
-        self.used_slots_by_room = defaultdict(set)
         self.teacher_occupied_courses = defaultdict(lambda : defaultdict(set))
         self.day_used_by_course_section = defaultdict(lambda : defaultdict(set))
 
+        # Sorted slot numbers per (teacher|section|room id, day)
+        self.teacher_day_slots = defaultdict(list)
+        self.section_day_slots = defaultdict(list)
+        self.room_day_slots = defaultdict(list)
+
+        # Session counts per (course, section, shift) by teacher and per (course, section) by day
+        self.course_section_teachers = defaultdict(Counter)
+        self.course_section_days = defaultdict(Counter)
+
+        # Assignment holding a slot, per (teacher|section|room id, slot id)
+        self.teacher_slot_owner = {}
+        self.section_slot_owner = {}
+        self.room_slot_owner = {}
+
+        # Slots taken outside this tracker, e.g. by another shift's routine at the same time, per teacher / room.
+        # Also set in the occupancy masks, local assignments never cover them so removing one keeps them set
+        self.blocked_teacher_mask = defaultdict(int)
+        self.blocked_room_mask = defaultdict(int)
+
+        # Objects with on_add/on_remove hooks, notified after the indexes are updated
+        self.listeners = []
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def slot_bit(self, slot_id: int) -> int:
+        """Return the bit of a slot id, indexing slots not seen before on the fly."""
+        bit = self.slot_bits.get(slot_id)
+        if bit is None:
+            bit = 1 << len(self.slot_bits)
+            self.slot_bits[slot_id] = bit
+        return bit
+
+    def group_mask(self, slot_group: List[TimeSlot]) -> int:
+        if isinstance(slot_group, SlotGroup):
+            return slot_group.mask
+        mask = 0
+        for slot in slot_group:
+            mask |= self.slot_bit(slot.id)
+        return mask
+
+    def busy_mask(self, teacher_id: int = None, section_id: int = None, room_id: int = None) -> int:
+        """Union of the slots already taken by the given teacher, section and room."""
+        return (
+            self.teacher_mask.get(teacher_id, 0) |
+            self.section_mask.get(section_id, 0) |
+            self.room_mask.get(room_id, 0)
+        )
+
+    def block(self, mask: int, teacher_id: int = None, room_id: int = None):
+        """Marks slots of the teacher and/or room as taken by something this tracker does not schedule."""
+        if teacher_id is not None:
+            self.blocked_teacher_mask[teacher_id] |= mask
+            self.teacher_mask[teacher_id] |= mask
+        if room_id is not None:
+            self.blocked_room_mask[room_id] |= mask
+            self.room_mask[room_id] |= mask
+
+    def is_blocked(self, mask: int, teacher_id: int = None, room_id: int = None) -> bool:
+        return bool((self.blocked_teacher_mask.get(teacher_id, 0) | self.blocked_room_mask.get(room_id, 0)) & mask)
+
+    def is_free(self, mask: int, teacher_id: int = None, section_id: int = None, room_id: int = None) -> bool:
+        return not self.busy_mask(teacher_id, section_id, room_id) & mask
+
+    def blocking_assignments(self, slot_group: List[TimeSlot], teacher_id: int, section_id: int, room_id: int) -> List[Assignment]:
+        """Placed assignments that hold any slot of the group for the teacher, the section or the room."""
+        blockers = []
+        for slot in slot_group:
+            for owners, key in (
+                (self.teacher_slot_owner, teacher_id), (self.section_slot_owner, section_id), (self.room_slot_owner, room_id)
+            ):
+                owner = owners.get((key, slot.id))
+                if owner is not None and not any(owner is b for b in blockers):
+                    blockers.append(owner)
+        return blockers
+
+    def placed_sessions(self, course_id: int, section_id: int) -> int:
+        return sum(self.course_section_days.get((course_id, section_id), {}).values())
+
+    @staticmethod
+    def course_section_key(assignment: Assignment):
+        shift = assignment.shift
+        return assignment.course.id, assignment.section.id, shift.id if shift else None
+
     def add_assignment(self, assignment: Assignment):
         course = assignment.course
         teacher = assignment.teacher
+        section = assignment.section
         slot_group = assignment.slot_group
         room = assignment.room
         day = slot_group[0].day
+        mask = self.group_mask(slot_group)
+
+        self.section_mask[section.id] |= mask
+        self.teacher_mask[teacher.id] |= mask
+        self.room_mask[room.id] |= mask
 
         for slot in slot_group:
-            self.slot_used_by_section[assignment.section.id].add(slot.id)
+            self.teacher_slot_owner[(teacher.id, slot.id)] = assignment
+            self.section_slot_owner[(section.id, slot.id)] = assignment
+            self.room_slot_owner[(room.id, slot.id)] = assignment
+
+        for number in (s.slot_number for s in slot_group):
+            insort(self.teacher_day_slots[(teacher.id, day)], number)
+            insort(self.section_day_slots[(section.id, day)], number)
+            insort(self.room_day_slots[(room.id, day)], number)
 
-            self.slot_used_by_teacher[teacher.id].add(slot.id)
-            self.used_slots_by_room[room.id].add(slot.id)
-            self.teacher_occupied_courses[course.id][teacher.id].add(assignment.section.id)
-            self.day_used_by_course_section[course.id][assignment.section.id].add(day)
+        self.course_section_teachers[self.course_section_key(assignment)][teacher.id] += 1
+        self.course_section_days[(course.id, section.id)][day] += 1
+
+        self.teacher_occupied_courses[course.id][teacher.id].add(section.id)
+        self.day_used_by_course_section[course.id][section.id].add(day)
         assignment.teacher.load += 1
 
+        for listener in self.listeners:
+            listener.on_add(assignment)
+
     def remove_assignment(self, assignment: Assignment):
         course = assignment.course
         teacher = assignment.teacher
+        section = assignment.section
         slot_group = assignment.slot_group
         room = assignment.room
         day = slot_group[0].day
+        mask = self.group_mask(slot_group)
+
+        self.section_mask[section.id] &= ~mask
+        self.teacher_mask[teacher.id] &= ~mask
+        self.room_mask[room.id] &= ~mask
 
         for slot in slot_group:
-            self.slot_used_by_section[assignment.section.id].remove(slot.id)
+            self.teacher_slot_owner.pop((teacher.id, slot.id), None)
+            self.section_slot_owner.pop((section.id, slot.id), None)
+            self.room_slot_owner.pop((room.id, slot.id), None)
+
+        for number in (s.slot_number for s in slot_group):
+            self.teacher_day_slots[(teacher.id, day)].remove(number)
+            self.section_day_slots[(section.id, day)].remove(number)
+            self.room_day_slots[(room.id, day)].remove(number)
+
+        # A course/section can hold several sessions, only release the flags with the last one
+        if self._decrement(self.course_section_teachers, self.course_section_key(assignment), teacher.id):
+            self.teacher_occupied_courses[course.id][teacher.id].discard(section.id)
+        if self._decrement(self.course_section_days, (course.id, section.id), day):
+            self.day_used_by_course_section[course.id][section.id].discard(day)
+        assignment.teacher.load -= 1
+
+        for listener in self.listeners:
+            listener.on_remove(assignment)
 
-            self.slot_used_by_teacher[teacher.id].remove(slot.id)
-            self.used_slots_by_room[room.id].remove(slot.id)
-            self.teacher_occupied_courses[course.id][teacher.id].remove(assignment.section.id)
-            self.day_used_by_course_section[course.id][assignment.section.id].remove(day)
-        assignment.teacher.load -= 1
\ No newline at end of file
+    @staticmethod
+    def _decrement(index, key, item) -> bool:
+        """Decrease a counted index entry, returns True once its count drops to zero."""
+        counter = index[key]
+        counter[item] -= 1
+        if counter[item] > 0:
+            return False
+        del counter[item]
+        if not counter:
+            del index[key]
+        return True
@@ -1,5 +1,5 @@
 from typing import List
-from scheduler.models import Assignment
+from scheduler.models import Assignment, Course, Teacher, TimeSlot, Shift, SlotGroup
 
 
 class ConstraintCheckerEngine:
@@ -15,15 +15,8 @@ class ConstraintCheckerEngine:
         room = assignment.room
 
         # No overlapping
-        for a in current_assignments:
-            same_time = a.slot_group[0].day == slot_group[0].day and any(
-                num in [s.slot_number for s in a.slot_group] for num in [s.slot_number for s in slot_group]
-            )
-
-            param_match = (a.teacher == teacher or a.room == room or a.section == section)
-
-            if same_time and param_match:
-                return False
+        if self.has_overlap(assignment, current_assignments):
+            return False
 
         teacher = self.validate_teacher(assignment, current_assignments)
         slot = self.validate_slot(assignment, current_assignments)
@@ -38,13 +31,15 @@ class ConstraintCheckerEngine:
         shift = assignment.shift
 
         # 1. One teacher per course [ Already checked in teacher ]
-        if self.config.get('one_teacher_per_course') and any(
-                a.course == course and a.section == section and shift == a.shift and a.teacher != teacher for a in current_assignments
-        ):
+        if self.config.get('one_teacher_per_course') and self.has_other_teacher(assignment, current_assignments):
             return False
 
+        return self.teacher_fits(course, teacher)
+
+    def teacher_fits(self, course: Course, teacher: Teacher) -> bool:
+        """Teacher rules that don't depend on the placed assignments, cheap enough to run before building a candidate."""
         # 2. cross department teacher class
-        if self.config.get('cross_department_teacher') and course.department != teacher.department:
+        if self.config.get('cross_department_teacher') and course.department.id != teacher.department.id:
             return False
 
         # 6. Teacher class count does not exceed weekly max
@@ -63,30 +58,41 @@ class ConstraintCheckerEngine:
         slot_group = assignment.slot_group
         room = assignment.room
 
+        if not self.slot_group_fits(course, slot_group, shift):
+            return False
+
+        # No course repeats on same day
+        if not self.config.get('no_course_repeat_same_day'):
+            if self.repeats_on_same_day(assignment, current_assignments):
+                return False
+        return True
+
+    @classmethod
+    def slot_group_fits(cls, course: Course, slot_group: List[TimeSlot], shift: Shift) -> bool:
+        """Slot rules that don't depend on the placed assignments, cheap enough to run before building a candidate."""
         if course.duration_per_session != len(slot_group):
             return False
 
+        # Catalogue groups are consecutive by construction
+        if isinstance(slot_group, SlotGroup):
+            return True
+
         # 1 Ensure constructiveness of multiple duration classes
-        if course.duration_per_session > 1:
-            for j in range(1, len(slot_group)):
-                prev_slot = slot_group[j - 1]
-                current_slot = slot_group[j]
+        return cls.is_consecutive(slot_group, shift)
 
-                # Check if slot numbers are consecutive
-                if current_slot.slot_number != prev_slot.slot_number + 1:
-                    return False
+    @staticmethod
+    def is_consecutive(slot_group: List[TimeSlot], shift: Shift) -> bool:
+        for j in range(1, len(slot_group)):
+            prev_slot = slot_group[j - 1]
+            current_slot = slot_group[j]
 
-                # Check if the end time of the previous slot matches the start time of the current slot
-                if prev_slot.end_time != current_slot.start_time:
-                    if not assignment.shift.name == 'Morning':
-                        return False
+            # Check if slot numbers are consecutive
+            if current_slot.slot_number != prev_slot.slot_number + 1:
+                return False
 
-        # No course repeats on same day
-        if not self.config.get('no_course_repeat_same_day'):
-            for a in current_assignments:
-                if a.course.id == course.id and a.section.id == section.id and any(
-                        day in [s.day for s in a.slot_group] for day in [s.day for s in slot_group]
-                ):
+            # Check if the end time of the previous slot matches the start time of the current slot
+            if prev_slot.end_time != current_slot.start_time:
+                if not shift.name == 'Morning':
                     return False
         return True
 
@@ -101,4 +107,77 @@ class ConstraintCheckerEngine:
 
         if course.is_lab != room.is_lab:
             return False
-        return True
\ No newline at end of file
+        return True
+
+    @staticmethod
+    def has_overlap(assignment: Assignment, current_assignments: List[Assignment]) -> bool:
+        teacher = assignment.teacher
+        section = assignment.section
+        slot_group = assignment.slot_group
+        room = assignment.room
+
+        for a in current_assignments:
+            same_time = a.slot_group[0].day == slot_group[0].day and any(
+                num in [s.slot_number for s in a.slot_group] for num in [s.slot_number for s in slot_group]
+            )
+
+            param_match = (a.teacher == teacher or a.room == room or a.section == section)
+
+            if same_time and param_match:
+                return True
+        return False
+
+    @staticmethod
+    def has_other_teacher(assignment: Assignment, current_assignments: List[Assignment]) -> bool:
+        return any(
+            a.course == assignment.course and a.section == assignment.section and assignment.shift == a.shift and
+            a.teacher != assignment.teacher for a in current_assignments
+        )
+
+    @staticmethod
+    def repeats_on_same_day(assignment: Assignment, current_assignments: List[Assignment]) -> bool:
+        days = [s.day for s in assignment.slot_group]
+        return any(
+            a.course.id == assignment.course.id and a.section.id == assignment.section.id and
+            any(day in [s.day for s in a.slot_group] for day in days)
+            for a in current_assignments
+        )
+
+
+class IndexedConstraintCheckerEngine(ConstraintCheckerEngine):
+    """
+    Same rules as ConstraintCheckerEngine, but the checks that depend on the already placed assignments are answered
+    from the Tracker indexes instead of scanning current_assignments, so each check costs O(slots-per-day).
+    The tracker must hold exactly the assignments passed as current_assignments.
+    """
+    def __init__(self, constraints, tracker):
+        super().__init__(constraints)
+        self.tracker = tracker
+
+    def has_overlap(self, assignment: Assignment, current_assignments: List[Assignment]) -> bool:
+        tracker = self.tracker
+        if (tracker.blocked_teacher_mask or tracker.blocked_room_mask) and tracker.is_blocked(
+                tracker.group_mask(assignment.slot_group), teacher_id=assignment.teacher.id, room_id=assignment.room.id):
+            return True
+
+        day = assignment.slot_group[0].day
+        numbers = [s.slot_number for s in assignment.slot_group]
+        for index, key in (
+            (self.tracker.teacher_day_slots, assignment.teacher.id),
+            (self.tracker.room_day_slots, assignment.room.id),
+            (self.tracker.section_day_slots, assignment.section.id),
+        ):
+            used = index.get((key, day))
+            if used and any(num in used for num in numbers):
+                return True
+        return False
+
+    def has_other_teacher(self, assignment: Assignment, current_assignments: List[Assignment]) -> bool:
+        teachers = self.tracker.course_section_teachers.get(self.tracker.course_section_key(assignment))
+        if not teachers:
+            return False
+        return len(teachers) > 1 or assignment.teacher.id not in teachers
+
+    def repeats_on_same_day(self, assignment: Assignment, current_assignments: List[Assignment]) -> bool:
+        days = self.tracker.course_section_days.get((assignment.course.id, assignment.section.id))
+        return bool(days) and any(s.day in days for s in assignment.slot_group)
\ No newline at end of file
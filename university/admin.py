@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.db.models import Count, Q, Value, CharField, F
 from django.db.models.functions import Concat
-from .models import Teacher, Course, Room, TimeSlot, Assignment, Department, Constrain, ConstrainType, Shift, Section
+from .models import Teacher, Course, Room, TimeSlot, Assignment, Department, Constrain, ConstrainType, Shift, Section, \
+    GenerationJob
+from .timetable import bump_routine_version
 
 
 @admin.register(Department)
@@ -97,6 +99,23 @@ class AssignmentAdmin(admin.ModelAdmin):
 
     filter_horizontal = ('time_slot',)
 
+    # Deletes bump the routine version here, the signals leave post_delete out to keep bulk deletes fast
+    def delete_model(self, request, obj):
+        shift_id = obj.shift_id
+        super().delete_model(request, obj)
+        if shift_id:
+            bump_routine_version(shift_id)
+        else:
+            bump_routine_version()
+
+    def delete_queryset(self, request, queryset):
+        shift_ids = set(queryset.values_list('shift_id', flat=True))
+        super().delete_queryset(request, queryset)
+        if None in shift_ids:
+            bump_routine_version()
+        elif shift_ids:
+            bump_routine_version(*shift_ids)
+
 
 @admin.register(ConstrainType)
 class ConstrainTypeAdmin(admin.ModelAdmin):
@@ -126,4 +145,9 @@ class ShiftAdmin(admin.ModelAdmin):
 @admin.register(Section)
 class SectionAdmin(admin.ModelAdmin):
     list_display = ('name', 'semester', 'shift', 'department', 'is_active')
-    list_filter = ('semester', 'shift', 'department', 'is_active')
\ No newline at end of file
+    list_filter = ('semester', 'shift', 'department', 'is_active')
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('shift', 'status', 'phase', 'courses_placed', 'courses_total', 'best_score', 'created_at', 'finished_at')
+    list_filter = ('status', 'shift')
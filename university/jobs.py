@@ -0,0 +1,100 @@
+# database-backed queue of routine generation jobs, run by the run_generation_jobs worker.
+
+import os
+import subprocess
+import sys
+import traceback
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from scheduler.scheduleGenerator import ScheduleGenerator
+from university.management.commands.generate import Command as GenerateCommand
+from university.models import GenerationJob, Shift
+
+
+def enqueue_generation(shift: Shift, seed: int = None) -> GenerationJob:
+    """
+    Queues a generation for the shift, or returns the job already queued or running for it.
+    The partial unique constraint on active jobs settles concurrent clicks, the loser gets the winner's job.
+    """
+    active = GenerationJob.objects.filter(shift=shift, status__in=GenerationJob.ACTIVE_STATUSES).first()
+    if active is not None:
+        return active
+    try:
+        with transaction.atomic():
+            return GenerationJob.objects.create(shift=shift, seed=seed)
+    except IntegrityError:
+        return GenerationJob.objects.get(shift=shift, status__in=GenerationJob.ACTIVE_STATUSES)
+
+
+def claim_next_job() -> Optional[GenerationJob]:
+    """Oldest queued job, flipped to running with a conditional update so two workers never claim the same one."""
+    for job in GenerationJob.objects.filter(status=GenerationJob.QUEUED).order_by('created_at', 'id'):
+        claimed = GenerationJob.objects.filter(pk=job.pk, status=GenerationJob.QUEUED).update(
+            status=GenerationJob.RUNNING, worker_pid=os.getpid(), started_at=timezone.now(), updated_at=timezone.now(),
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def reap_stale_jobs() -> int:
+    """Fails running jobs whose worker process is gone, they would block their shift forever otherwise."""
+    stale = []
+    for job in GenerationJob.objects.filter(status=GenerationJob.RUNNING):
+        try:
+            os.kill(job.worker_pid, 0)
+        except (OSError, TypeError):
+            stale.append(job.pk)
+    return GenerationJob.objects.filter(pk__in=stale, status=GenerationJob.RUNNING).update(
+        status=GenerationJob.FAILED, error='Worker process exited before finishing', finished_at=timezone.now(),
+    )
+
+
+def update_progress(job: GenerationJob, progress: dict):
+    GenerationJob.objects.filter(pk=job.pk).update(
+        phase=progress['phase'], courses_placed=progress['courses_placed'], courses_total=progress['courses_total'],
+        candidates=progress['candidates'], best_score=progress['best_score'], updated_at=timezone.now(),
+    )
+
+
+def run_job(job: GenerationJob, progress_interval: float = 1.0, stdout=None) -> GenerationJob:
+    """
+    Generates and saves the routine of a claimed job, failures are stored on the job instead of raised.
+    The previous routine is only replaced once the new one is ready, in the same transaction.
+    """
+    command = GenerateCommand(stdout=stdout)
+    try:
+        constrains, courses, teachers, rooms, time_slots, shift, sections = command.initialize_data(shift=job.shift.name)
+        scheduler = ScheduleGenerator(
+            constrains, courses, teachers, rooms, time_slots, shift, sections, seed=job.seed,
+            progress=lambda progress: update_progress(job, progress), progress_interval=progress_interval,
+        )
+        assignments, _ = scheduler.generate()
+
+        with transaction.atomic():
+            command.clear_previous_assignments(job.shift)
+            command.save_routine(assignments)
+
+        job.status = GenerationJob.DONE
+        job.unassigned_sessions = scheduler.count_unassigned_sessions()
+        job.best_score = sum(a.score for a in assignments)
+    except Exception:
+        job.status = GenerationJob.FAILED
+        job.error = traceback.format_exc()
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'unassigned_sessions', 'best_score', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def spawn_worker():
+    """Starts a detached worker that drains the queue and exits, so the web request returns right away."""
+    subprocess.Popen(
+        [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'run_generation_jobs', '--until-empty'],
+        cwd=settings.BASE_DIR, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
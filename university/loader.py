@@ -0,0 +1,147 @@
+# loads the scheduling inputs of a shift from the database in a fixed number of queries.
+
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from university.models import Assignment, Constrain, Course, Department, Room, Section, Shift, Teacher, TimeSlot
+from scheduler.models import (
+    Assignment as DAssignment, Department as DDepartment, Course as DCourse, Teacher as DTeacher,
+    Room as DRoom, TimeSlot as DTimeSlot, Constrains as DConstrains,
+    Shift as DShift, Section as DSection,
+)
+
+TIME_SLOT_FIELDS = ('id', 'day', 'slot_number', 'start_time', 'end_time', 'shift_id')
+
+
+def load_inputs(shift: str) -> tuple:
+    """
+    Scheduling inputs of a shift, shaped like the generator expects them, built from values() rows: one query
+    per table and per many-to-many through table (12 in total) however many teachers and courses there are.
+    Related rows are joined in Python by id, in the order the per-object lookups used to return them.
+    """
+    shift_row = Shift.objects.values('id', 'name').get(name=shift)
+
+    departments: Dict[int, DDepartment] = {
+        row['id']: DDepartment(**row) for row in Department.objects.values('id', 'name')
+    }
+    shifts: Dict[int, DShift] = {row['id']: DShift(**row) for row in Shift.objects.values('id', 'name')}
+    current_shift = shifts[shift_row['id']]
+
+    def time_slot(row: dict, prefix: str = '') -> DTimeSlot:
+        return DTimeSlot(
+            id=row[prefix + 'id'], day=row[prefix + 'day'], slot_number=row[prefix + 'slot_number'],
+            start_time=row[prefix + 'start_time'], end_time=row[prefix + 'end_time'],
+            shift=shifts.get(row[prefix + 'shift_id']),
+        )
+
+    constrains: List[DConstrains] = [
+        DConstrains(
+            id=row['id'], type=row['type__name'], condition=row['condition'], severity=row['severity'],
+            score_weight=row['score_weight'], key='_'.join(row['condition'].lower().split()),
+        )
+        for row in Constrain.objects.filter(is_active=True).values(
+            'id', 'type__name', 'condition', 'severity', 'score_weight',
+        )
+    ]
+
+    time_slots: List[DTimeSlot] = [
+        time_slot(row)
+        for row in TimeSlot.objects.filter(is_active=True, shift_id=current_shift.id).order_by('id').values(*TIME_SLOT_FIELDS)
+    ]
+
+    rooms: List[DRoom] = [
+        DRoom(id=row['id'], name=row['name'], department=departments[row['department_id']], is_lab=row['is_lab'])
+        for row in Room.objects.filter(is_active=True).values('id', 'name', 'department_id', 'is_lab')
+    ]
+
+    # Teacher <-> course preferences, one through table read serves both sides
+    teacher_courses = defaultdict(list)
+    course_teachers = defaultdict(list)
+    for row in Teacher.preferred_courses.through.objects.values('teacher_id', 'course_id', 'course__is_active').order_by(
+            'teacher_id', 'course_id'):
+        course_teachers[row['course_id']].append(row['teacher_id'])
+        if row['course__is_active']:
+            teacher_courses[row['teacher_id']].append(row['course_id'])
+
+    teacher_slots = defaultdict(list)
+    slot_fields = [f'timeslot__{field}' for field in TIME_SLOT_FIELDS]
+    for row in Teacher.preferred_time_slots.through.objects.values('teacher_id', *slot_fields).order_by(
+            'timeslot__day', 'timeslot__slot_number'):
+        teacher_slots[row['teacher_id']].append(time_slot(row, prefix='timeslot__'))
+
+    teachers: List[DTeacher] = [
+        DTeacher(
+            id=row['id'], name=row['name'], initial=row['initial'], department=departments[row['department_id']],
+            max_classes_per_week=row['max_classes_per_week'], preferred_time_slots=teacher_slots[row['id']],
+            preferred_courses=teacher_courses[row['id']], minimum_classes_per_day=row['minimum_classes_per_day'],
+        )
+        for row in Teacher.objects.filter(is_active=True).values(
+            'id', 'name', 'initial', 'department_id', 'max_classes_per_week', 'minimum_classes_per_day',
+        )
+    ]
+
+    sections: List[DSection] = [
+        DSection(
+            id=row['id'], name=row['name'], semester=row['semester'],
+            shift=shifts[row['shift_id']], department=departments[row['department_id']],
+        )
+        for row in Section.objects.filter(is_active=True).values('id', 'name', 'semester', 'shift_id', 'department_id')
+    ]
+
+    course_shifts = defaultdict(list)
+    for row in Course.shifts.through.objects.values('course_id', 'shift_id').order_by('shift_id'):
+        course_shifts[row['course_id']].append(shifts[row['shift_id']])
+
+    courses: List[DCourse] = [
+        DCourse(
+            id=row['id'], code=row['code'], name=row['name'], semester=row['semester'], credit=row['credit'],
+            department=departments[row['department_id']], sessions_per_week=row['sessions_per_week'],
+            duration_per_session=row['duration_per_session'], preferred_teachers=course_teachers[row['id']],
+            is_lab=row['is_lab'], shifts=course_shifts[row['id']],
+        )
+        for row in Course.objects.filter(is_active=True, shifts=current_shift.id).values(
+            'id', 'code', 'name', 'semester', 'credit', 'department_id', 'sessions_per_week',
+            'duration_per_session', 'is_lab',
+        )
+    ]
+
+    return constrains, courses, teachers, rooms, time_slots, current_shift, sections
+
+
+def load_routine(inputs: tuple) -> Tuple[Dict[int, DAssignment], Dict[int, str]]:
+    """
+    The shift's saved assignment rows, built on the objects of `inputs` (load_inputs of the same shift) so the
+    generator can pin them. Two queries. A row pointing at a course, teacher, room, section or time slot the inputs
+    no longer have, e.g. one deactivated since, is stale.
+    returns: ({row id: assignment}, {stale row id: what is gone})
+    """
+    constrains, courses, teachers, rooms, time_slots, shift, sections = inputs
+    by_id = {
+        'course': {c.id: c for c in courses},
+        'teacher': {t.id: t for t in teachers},
+        'room': {r.id: r for r in rooms},
+        'section': {s.id: s for s in sections},
+    }
+    slots = {s.id: s for s in time_slots}
+
+    slot_ids = defaultdict(list)
+    for row in Assignment.time_slot.through.objects.filter(assignment__shift_id=shift.id).values(
+            'assignment_id', 'timeslot_id').order_by('timeslot__day', 'timeslot__slot_number'):
+        slot_ids[row['assignment_id']].append(row['timeslot_id'])
+
+    kept, stale = {}, {}
+    for row in Assignment.objects.filter(shift_id=shift.id).order_by('id').values(
+            'id', 'course_id', 'teacher_id', 'room_id', 'section_id', 'score'):
+        gone = next((name for name, objects in by_id.items() if row[f'{name}_id'] not in objects), None)
+        if gone is None and (not slot_ids[row['id']] or any(pk not in slots for pk in slot_ids[row['id']])):
+            gone = 'time slot'
+        if gone is not None:
+            stale[row['id']] = gone
+            continue
+
+        kept[row['id']] = DAssignment(
+            course=by_id['course'][row['course_id']], teacher=by_id['teacher'][row['teacher_id']],
+            room=by_id['room'][row['room_id']], section=by_id['section'][row['section_id']],
+            slot_group=[slots[pk] for pk in slot_ids[row['id']]], shift=shift, score=row['score'],
+        )
+    return kept, stale
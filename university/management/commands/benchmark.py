@@ -0,0 +1,112 @@
+import copy
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from scheduler.fixtures import load_fixture, scale_inputs
+from scheduler.scheduleGenerator import ScheduleGenerator
+
+DEFAULT_DATASETS = ['university_dataset.json', 'uni.json']
+METRICS = ['wall_time', 'candidates', 'peak_memory_kb', 'unassigned_sessions', 'total_score']
+
+
+class Command(BaseCommand):
+    help = 'Seeded generation benchmark over fixture datasets, optionally compared against a saved JSON baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--datasets', nargs='+', default=DEFAULT_DATASETS, help='Fixture files, relative to BASE_DIR')
+        parser.add_argument('--scales', nargs='+', type=int, default=[1, 3], help='Scale-up factors of every dataset')
+        parser.add_argument('--seeds', nargs='+', type=int, default=[0, 1, 2], help='Generator seeds')
+        parser.add_argument('--shift', type=str, default=None, help='Shift name, the first shift of the fixture by default')
+        parser.add_argument('--no-memory', action='store_true', help='Skip the traced run that measures peak memory')
+        parser.add_argument('--output', type=str, default=None, help='Write the results to this JSON file')
+        parser.add_argument('--compare', type=str, default=None, help='JSON baseline to diff the results against')
+
+    def handle(self, *args, **options):
+        cases = []
+        for dataset in options['datasets']:
+            inputs = load_fixture(settings.BASE_DIR / dataset, shift=options['shift'])
+            for scale in options['scales']:
+                scaled = scale_inputs(inputs, scale)
+                for seed in options['seeds']:
+                    case = {'dataset': dataset, 'scale': scale, 'seed': seed}
+                    case.update(self.measure(scaled, seed, trace_memory=not options['no_memory']))
+                    cases.append(case)
+                    self.stdout.write(self.format_case(case))
+
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'cases': cases,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), report)
+
+    @staticmethod
+    def measure(inputs: tuple, seed: int, trace_memory: bool = True) -> dict:
+        """
+        Times one seeded run, then replays the same seed under tracemalloc for the peak memory, tracing would
+        otherwise inflate the wall time. Seeded runs are deterministic so both runs do the same work.
+        """
+        run_inputs = copy.deepcopy(inputs)
+        started = time.perf_counter()
+        scheduler = ScheduleGenerator(*run_inputs, seed=seed)
+        assignments, _ = scheduler.generate()
+        wall_time = time.perf_counter() - started
+
+        result = {
+            'wall_time': round(wall_time, 4),
+            'candidates': scheduler.stats['candidates'],
+            'valid_candidates': scheduler.stats['valid_candidates'],
+            'peak_memory_kb': None,
+            'assignments': len(assignments),
+            'unassigned_sessions': scheduler.count_unassigned_sessions(),
+            'total_score': round(sum(a.score for a in assignments), 6),
+        }
+
+        if trace_memory:
+            run_inputs = copy.deepcopy(inputs)
+            tracemalloc.start()
+            ScheduleGenerator(*run_inputs, seed=seed).generate()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result['peak_memory_kb'] = round(peak / 1024)
+
+        return result
+
+    @staticmethod
+    def format_case(case: dict) -> str:
+        memory = f"{case['peak_memory_kb']} KiB" if case['peak_memory_kb'] is not None else '-'
+        return (
+            f"{case['dataset']} x{case['scale']} seed {case['seed']}: {case['wall_time']:.3f}s, "
+            f"{case['candidates']} candidates, {memory}, {case['unassigned_sessions']} unassigned, "
+            f"score {case['total_score']:.3f}"
+        )
+
+    def compare(self, baseline: dict, report: dict):
+        previous = {(c['dataset'], c['scale'], c['seed']): c for c in baseline['cases']}
+        self.stdout.write(f"Compared with baseline from {baseline.get('created_at', '?')}:")
+        for case in report['cases']:
+            old = previous.get((case['dataset'], case['scale'], case['seed']))
+            if old is None:
+                self.stdout.write(f"{case['dataset']} x{case['scale']} seed {case['seed']}: not in baseline")
+                continue
+
+            deltas = []
+            for metric in METRICS:
+                before, after = old.get(metric), case.get(metric)
+                if before is None or after is None:
+                    continue
+                change = f'{(after - before) / before * 100:+.1f}%' if before else f'{after - before:+g}'
+                deltas.append(f'{metric} {before} -> {after} ({change})')
+            self.stdout.write(f"{case['dataset']} x{case['scale']} seed {case['seed']}: " + ', '.join(deltas))
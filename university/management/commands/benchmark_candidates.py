@@ -0,0 +1,42 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from university.management.commands.generate import Command as GenerateCommand
+from scheduler.scheduleGenerator import ScheduleGenerator
+from scheduler.models import Assignment, Candidate
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark of the per-candidate cost, pydantic Assignment vs __slots__ Candidate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shift', type=str, required=True, help='A valid shift name required!')
+        parser.add_argument('--count', type=int, default=100000, help='Candidates built per measurement')
+        parser.add_argument('--repeat', type=int, default=5, help='Measurements, the best one is reported')
+
+    def handle(self, *args, **options):
+        constrains, courses, teachers, rooms, time_slots, shift, sections = GenerateCommand.initialize_data(shift=options['shift'])
+        scheduler = ScheduleGenerator(constrains, courses, teachers, rooms, time_slots, shift, sections)
+
+        course = scheduler.courses[0]
+        section = scheduler.get_sections_for_course(course)[0]
+        teacher, slot_group, room = next(scheduler.iter_candidates(course, section))
+
+        def build(model):
+            return lambda: model(course=course, teacher=teacher, slot_group=slot_group, room=room, shift=shift, section=section)
+
+        def build_and_check(model):
+            def run():
+                candidate = model(course=course, teacher=teacher, slot_group=slot_group, room=room, shift=shift, section=section)
+                if scheduler.constraints.is_valid_assignment(candidate, scheduler.assignments):
+                    scheduler.scorer.score_assignment(candidate, scheduler.assignments)
+            return run
+
+        count, repeat = options['count'], options['repeat']
+        for label, factory in (('construct', build), ('construct+validate+score', build_and_check)):
+            before = min(timeit.repeat(factory(Assignment), number=count, repeat=repeat)) / count
+            after = min(timeit.repeat(factory(Candidate), number=count, repeat=repeat)) / count
+            self.stdout.write(
+                f'{label:<26} Assignment {before * 1e6:8.3f} us   Candidate {after * 1e6:8.3f} us   '
+                f'speedup x{before / after:.1f}'
+            )
@@ -0,0 +1,130 @@
+import json
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from university.models import Assignment, Course, TimeSlot
+
+# The Meta.indexes the plans are compared with and without
+INDEXED_MODELS = [Assignment, TimeSlot, Course]
+
+
+def view_queries(params: dict) -> dict:
+    """Querysets shaped like the ones the routine views, the snapshot builder, the loader and the generator run."""
+    shift_id, section_id, teacher_id, course_id = params['shift'], params['section'], params['teacher'], params['course']
+    return {
+        'shift assignments': Assignment.objects.filter(shift_id=shift_id).order_by('id'),
+        'section assignments': Assignment.objects.filter(shift_id=shift_id, section_id=section_id),
+        'teacher assignments': Assignment.objects.filter(shift_id=shift_id, teacher_id=teacher_id),
+        'course section count': Assignment.objects.filter(course_id=course_id, section_id=section_id).values('id'),
+        'assigned counts': Assignment.objects.filter(section__shift_id=shift_id).values('course_id', 'section_id')
+        .annotate(count=Count('id')),
+        'assignment slots': TimeSlot.objects.filter(assignments__shift_id=shift_id),
+        'shift slots': TimeSlot.objects.filter(shift_id=shift_id).order_by('day', 'slot_number'),
+        'day slots': TimeSlot.objects.filter(shift_id=shift_id, day='Sunday').order_by('slot_number'),
+        'semester courses': Course.objects.filter(is_active=True, semester=params['semester']),
+    }
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN and time the routine queries, with and without the scheduler indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query, the fastest one counts')
+        parser.add_argument('--without-indexes', action='store_true',
+                            help='Also measure with the indexes dropped, inside a transaction that is rolled back. '
+                                 'Only on databases with transactional DDL, not MySQL')
+        parser.add_argument('--output', type=str, default=None, help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        params = self.pick_params()
+        self.stdout.write(f'{Assignment.objects.count()} assignments, parameters {params}')
+
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'vendor': connection.vendor,
+            'params': params,
+        }
+        if options['without_indexes']:
+            report['unindexed'] = self.measure_without_indexes(params, options['repeat'])
+        report['indexed'] = self.measure(params, options['repeat'])
+
+        for name, indexed in report['indexed'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            unindexed = report.get('unindexed', {}).get(name)
+            if unindexed:
+                self.stdout.write(f"  without indexes: {unindexed['ms']:.3f} ms\n    " + '\n    '.join(unindexed['plan']))
+            self.stdout.write(f"  with indexes: {indexed['ms']:.3f} ms\n    " + '\n    '.join(indexed['plan']))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    @staticmethod
+    def pick_params() -> dict:
+        """The busiest shift, and its busiest section, teacher and course, so the plans run on real data."""
+        row = Assignment.objects.values('shift_id').annotate(count=Count('id')).order_by('-count').first()
+        if row is None:
+            raise CommandError('No assignments to explain, synthesize a university and generate a routine first')
+
+        shift_assignments = Assignment.objects.filter(shift_id=row['shift_id'])
+
+        def top(field: str):
+            return shift_assignments.values(field).annotate(count=Count('id')).order_by('-count')[0][field]
+
+        section_id = top('section_id')
+        return {
+            'shift': row['shift_id'],
+            'section': section_id,
+            'teacher': top('teacher_id'),
+            'course': shift_assignments.filter(section_id=section_id).values_list('course_id', flat=True)[0],
+            'semester': shift_assignments.filter(section_id=section_id).values_list('section__semester', flat=True)[0],
+        }
+
+    @staticmethod
+    def measure(params: dict, repeat: int) -> dict:
+        results = {}
+        for name, queryset in view_queries(params).items():
+            best = float('inf')
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                best = min(best, time.perf_counter() - started)
+            results[name] = {'ms': round(best * 1000, 4), 'plan': queryset.explain().splitlines()}
+        return results
+
+    def measure_without_indexes(self, params: dict, repeat: int) -> dict:
+        """
+        Drops the indexes in a transaction, measures and rolls back. Only on backends with transactional DDL
+        (SQLite, PostgreSQL), where the rollback brings the indexes back. On MySQL DROP INDEX commits implicitly
+        and the indexes would be lost, so it raises CommandError there before touching anything.
+        Runs on a fresh connection each way, sqlite3 would otherwise reuse statements prepared against the other schema.
+        """
+        if not connection.features.can_rollback_ddl:
+            raise CommandError(
+                f'--without-indexes needs a database that can roll back DROP INDEX, {connection.vendor} cannot '
+                f'and would lose the indexes. Run it without --without-indexes.'
+            )
+        self.reconnect()
+        quote = connection.ops.quote_name
+        # Plain DROP INDEX statements, the SQLite schema editor refuses to run inside a transaction
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for model in INDEXED_MODELS:
+                    for index in model._meta.indexes:
+                        cursor.execute(connection.SchemaEditorClass.sql_delete_index % {
+                            'name': quote(index.name), 'table': quote(model._meta.db_table),
+                        })
+            results = self.measure(params, repeat)
+            transaction.set_rollback(True)
+        self.reconnect()
+        return results
+
+    @staticmethod
+    def reconnect():
+        # Closing inside an outer transaction would end it, e.g. when called from a test
+        if not connection.in_atomic_block:
+            connection.close()
@@ -0,0 +1,28 @@
+import shutil
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from university.pdf import KINDS, all_documents, render_documents
+
+
+class Command(BaseCommand):
+    help = 'Renders the routine pdfs of every shift, section and teacher, skipping the ones already rendered'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS))
+        parser.add_argument('--workers', type=int, default=1, help='Rendering processes')
+        parser.add_argument('--output', type=str, default=None, help='Directory to copy the pdfs to under readable names')
+
+    def handle(self, *args, **options):
+        documents = all_documents(options['kinds'])
+        start = time.perf_counter()
+        rendered = render_documents(documents, workers=options['workers'])
+        self.stdout.write(f'{len(rendered)} pdfs ready in {time.perf_counter() - start:.2f}s')
+
+        if options['output']:
+            output = Path(options['output'])
+            output.mkdir(parents=True, exist_ok=True)
+            for filename, path in rendered:
+                shutil.copyfile(path, output / filename)
+            self.stdout.write(self.style.SUCCESS(f'Copied to {output}'))
@@ -1,16 +1,32 @@
-from django.core.management.base import BaseCommand
-from university.models import Course, Teacher, Room, TimeSlot, Constrain, Shift, Section  # Django models
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from university.loader import load_inputs, load_routine
+from university.models import Course, Teacher, Shift  # Django models
 from university.models import Assignment as DjangoAssignment
+from university.timetable import bump_routine_version
 from scheduler.scheduleGenerator import ScheduleGenerator
-from scheduler.models import (
-    Department as DDepartment, Course as DCourse, Teacher as DTeacher,
-    Room as DRoom, TimeSlot as DTimeSlot, Constrains as DConstrains,
-    Assignment as DAssignment, Shift as DShift, Section as DSection,
-)
+from scheduler.multistart import run_multistart
+from scheduler.coordinator import run_coordinated
+from scheduler.solvers import SolverUnavailable, get_solver, solver_names
+from scheduler.models import Assignment as DAssignment
 
 from typing import List, Dict
 
 
+class QueryCounter:
+    """connection.execute_wrapper counting the queries run through it."""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
 class Command(BaseCommand):
     help = 'Generates the optimal class schedule and stores it in the database'
 
@@ -20,139 +36,262 @@ class Command(BaseCommand):
         DjangoAssignment.objects.filter(shift=shift).delete()
         Course.objects.all().update(is_assigned=False)
         Teacher.objects.all().update(is_assigned=False)
+        bump_routine_version(shift.id)
 
     def add_arguments(self, parser):
-        parser.add_argument('--shift', type=str, required=True, help='A valid shift name required!')
+        parser.add_argument('--shift', type=str, nargs='+', required=True,
+                            help='A valid shift name required! Several shifts are generated in one coordinated run')
+        parser.add_argument('--by-department', action='store_true',
+                            help='One generator run per department of each shift. Departments sharing teachers or '
+                                 'rooms, e.g. the theory rooms within a shift, run one after the other, only units '
+                                 'sharing nothing run in parallel over --workers')
+        parser.add_argument('--restarts', type=int, default=1, help='Independent randomized runs, the best one is saved')
+        parser.add_argument('--workers', type=int, default=1, help='Processes the restarts are spread over')
+        parser.add_argument('--seed', type=int, default=None, help='Seed of the (first) run, for reproducible routines')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Keep the saved routine, only replace what no longer fits and place what is missing')
+        parser.add_argument('--weighted', action='store_true', help='Weigh the soft constraints by score_weight and severity')
+        parser.add_argument('--profile-scoring', action='store_true', help='Report the time spent per soft constraint')
+        parser.add_argument('--solver', choices=solver_names(), default='greedy',
+                            help='Scheduling backend, cp-sat is exact and needs OR-Tools installed')
+        parser.add_argument('--time-limit', type=float, default=60.0, help='Seconds the exact solver may search')
+        parser.add_argument('--no-warm-start', action='store_true',
+                            help='Do not start the exact solver from the greedy routine')
+        parser.add_argument('--local-search', type=float, default=0.0, metavar='SECONDS',
+                            help='Improve the routine by local search for this many seconds after construction')
 
     def handle(self, *args, **options):
-        shift = Shift.objects.get(name=options['shift'])
-        self.clear_previous_assignments(shift)
-
-        constrains, courses, teachers, rooms, time_slots, shift, sections = self.initialize_data(shift=options['shift'])
-
-        scheduler = ScheduleGenerator(constrains, courses, teachers, rooms, time_slots, shift, sections)
-        assignments, unassigned_courses_section = scheduler.generate()
-
-        self.save_routine(assignments)
-
-    def save_routine(self, assignments: List[DAssignment]):
-        for assignment in assignments:
-            course = Course.objects.get(id=assignment.course.id)
-            teacher = Teacher.objects.get(id=assignment.teacher.id)
-            room = Room.objects.get(id=assignment.room.id)
-            shift = Shift.objects.get(id=assignment.shift.id)
-            section = Section.objects.get(id=assignment.section.id)
-            ass = DjangoAssignment.objects.create(
-                course=course,
-                teacher=teacher,
-                room=room,
-                score=assignment.score,
-                shift=shift,
-                section=section,
-            )
-            ass.time_slot.set([s.id for s in assignment.slot_group])
+        if options['solver'] != 'greedy':
+            if len(options['shift']) > 1 or options['by_department'] or options['incremental'] or options['restarts'] > 1:
+                raise CommandError(f"--solver {options['solver']} schedules one shift from scratch, without "
+                                   f"--restarts, --incremental or --by-department")
+            if not get_solver(options['solver']).available():
+                raise CommandError(f"--solver {options['solver']} needs OR-Tools, pip install ortools")
 
-            course.is_assigned = True
-            course.save()
+        if options['profile_scoring'] and (len(options['shift']) > 1 or options['by_department'] or options['incremental']
+                                           or options['restarts'] > 1 or options['solver'] != 'greedy'):
+            raise CommandError('--profile-scoring only profiles a single greedy run, without --restarts, --incremental, '
+                               '--by-department, several shifts or another --solver')
 
-            teacher.is_assigned = True
-            teacher.save()
+        if len(options['shift']) > 1 or options['by_department']:
+            return self.handle_coordinated(options)
 
-        self.stdout.write(self.style.SUCCESS('Schedule generated and saved successfully.'))
+        shift = Shift.objects.get(name=options['shift'][0])
+        if options['incremental']:
+            return self.handle_incremental(shift, options)
 
-    @staticmethod
-    def initialize_data(shift, *args, **kwargs):
-        # convert constrain models to constrains
-        constrains: List[DConstrains] = [
-            DConstrains(
-                id=cs.id,
-                type=cs.type.name,
-                condition=cs.condition,
-                severity=cs.severity,
-                score_weight=cs.score_weight,
-                key=cs.key
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            constrains, courses, teachers, rooms, time_slots, shift_data, sections = self.initialize_data(shift=shift.name)
+        self.stdout.write(f'Loaded {len(courses)} courses, {len(teachers)} teachers, {len(sections)} sections in {queries.count} queries')
+
+        generation = self.generator_options(options)
+        if options['restarts'] > 1:
+            best, runs = run_multistart(
+                (constrains, courses, teachers, rooms, time_slots, shift_data, sections),
+                restarts=options['restarts'], workers=options['workers'], seed=options['seed'], **generation,
             )
-            for cs in Constrain.objects.filter(is_active=True)
-        ]
-
-        shift = Shift.objects.get(name=shift)
-        Dshift: DShift = DShift.model_validate(shift)
-
-        # Convert Django TimeSlot to dataclass
-        time_slots: List[DTimeSlot] = [
-            DTimeSlot(
-                id=ts.id,
-                day=ts.day,
-                slot_number=ts.slot_number,
-                start_time=ts.start_time,
-                end_time=ts.end_time,
-                shift=DShift(id=ts.shift.id, name=ts.shift.name),
+            for run in runs:
+                self.stdout.write(f'seed {run.seed}: {run.unassigned_sessions} unassigned sessions, score {run.total_score:.3f}')
+            self.stdout.write(f'Keeping seed {best.seed} out of {len(runs)} runs.')
+            assignments = best.assignments
+        elif options['solver'] != 'greedy':
+            assignments = self.run_solver(
+                (constrains, courses, teachers, rooms, time_slots, shift_data, sections), options, generation,
             )
-            for ts in TimeSlot.objects.filter(is_active=True, shift=shift).order_by('id')
-        ]
-
-        # Convert Django Room to dataclass
-        rooms: List[DRoom] = [
-            DRoom(
-                id=r.id,
-                name=r.name,
-                department=DDepartment(id=r.department.id, name=r.department.name),
-                is_lab=r.is_lab
+        else:
+            scheduler = ScheduleGenerator(
+                constrains, courses, teachers, rooms, time_slots, shift_data, sections, seed=options['seed'],
+                profile_scoring=options['profile_scoring'], **generation,
             )
-            for r in Room.objects.filter(is_active=True).select_related('department').all()
-        ]
-
-        # Convert Django Teacher to dataclass
-        teachers: List[DTeacher] = [
-            DTeacher(
-                id=t.id,
-                name=t.name,
-                initial=t.initial,
-                department=DDepartment.model_validate(t.department),
-                max_classes_per_week=t.max_classes_per_week,
-                preferred_time_slots=[
-                    DTimeSlot.model_validate(ts) for ts in t.preferred_time_slots.all()
-                ],
-                preferred_courses=[c.id for c in t.preferred_courses.filter(is_active=True)],
-                minimum_classes_per_day=t.minimum_classes_per_day
+            assignments, unassigned_courses_section = scheduler.generate()
+            for row in scheduler.scorer.term_report():
+                self.stdout.write(
+                    f"{row['key']}: {row['seconds']:.3f}s over {row['calls']} candidates, weight {row['weight']:g}"
+                )
+            self.report_local_search(scheduler)
+
+        # The saved routine is only replaced once there is a new one
+        with transaction.atomic():
+            self.clear_previous_assignments(shift)
+            self.save_routine(assignments)
+
+    def run_solver(self, inputs: tuple, options, generation: dict) -> List[DAssignment]:
+        try:
+            result = get_solver(options['solver']).solve(
+                inputs, seed=options['seed'], time_limit=options['time_limit'],
+                warm_start=not options['no_warm_start'], **generation,
             )
-            for t in Teacher.objects.filter(is_active=True).prefetch_related('preferred_courses', 'preferred_time_slots')
-        ]
-
-        sections: List[DSection] = [
-            DSection.model_validate(sec)
-            for sec in Section.objects.filter(is_active=True)
-        ]
-
-        courses: List[DCourse] = [
-            DCourse(
-                id=c.id,
-                code=c.code,
-                name=c.name,
-                semester=c.semester,
-                credit=c.credit,
-                department=DDepartment.model_validate(c.department),
-                sessions_per_week=c.sessions_per_week,
-                duration_per_session=c.duration_per_session,
-                preferred_teachers=[
-                    # DTeacher(
-                    #     id=t.id,
-                    #     name=t.name,
-                    #     initial=t.initial,
-                    #     department=DDepartment(id=t.id, name=t.department.name),
-                    #     max_classes_per_week=t.max_classes_per_week,
-                    #     preferred_time_slots=[
-                    #         DTimeSlot.model_validate(ts) for ts in t.preferred_time_slots.all()
-                    #     ],
-                    #     preferred_courses=[cs.id for cs in t.preferred_courses.filter(is_active=True)],
-                    #     minimum_classes_per_day=t.minimum_classes_per_day
-                    # )
-                    t.id for t in c.preferred_teachers.all()
-                ],
-                is_lab=c.is_lab,
-                shifts=[DShift.model_validate(s) for s in c.shifts.all()]
+        except SolverUnavailable as exc:
+            raise CommandError(str(exc))
+
+        gap = 'unknown' if result.gap is None else f'{result.gap:.2%}'
+        self.stdout.write(
+            f'{result.solver}: {result.status} in {result.seconds:.1f}s, objective {result.objective}, '
+            f'bound {result.bound}, gap {gap}, {result.unassigned_sessions} unassigned sessions, '
+            f'score {result.total_score:.3f}'
+        )
+        if result.status in ('infeasible', 'unknown'):
+            reason = 'No routine meets every hard constraint' if result.status == 'infeasible' else 'No solution within the time limit'
+            if not result.assignments:
+                raise CommandError(f'{reason}, the saved routine is left as it was.')
+            self.stdout.write(self.style.WARNING(f'{reason}, keeping the greedy one.'))
+        return result.assignments
+
+    @staticmethod
+    def generator_options(options) -> dict:
+        """ScheduleGenerator options every generation mode passes on."""
+        return {'weighted_scoring': options['weighted'], 'local_search_budget': options['local_search']}
+
+    def report_local_search(self, scheduler: ScheduleGenerator):
+        report = scheduler.local_search_report
+        if report is None:
+            return
+        self.stdout.write(
+            f"Local search: {report['steps']} steps, {report['accepted']} kept ({report['improved']} improving), "
+            f"score {report['start_score']:.3f} -> {report['best_score']:.3f} in {report['seconds']:.1f}s, "
+            f"{report['score_per_second']:.4f} per second"
+        )
+
+    def handle_coordinated(self, options):
+        """
+        Every given shift in one run, on one occupancy index: a teacher or room busy in one shift is busy at the
+        overlapping times of the others and teacher loads count across shifts. Units sharing nothing run in parallel.
+        """
+        if options['restarts'] > 1 or options['incremental']:
+            raise CommandError('--restarts and --incremental are not supported with several shifts or --by-department')
+
+        shifts = [Shift.objects.get(name=name) for name in dict.fromkeys(options['shift'])]
+        inputs_by_shift = {shift.name: self.initialize_data(shift=shift.name) for shift in shifts}
+        results, groups = run_coordinated(
+            inputs_by_shift, by_department=options['by_department'], workers=options['workers'], seed=options['seed'],
+            **self.generator_options(options),
+        )
+        for group in groups:
+            self.stdout.write('Run together: ' + ', '.join(results[i].label for i in group))
+        for result in results:
+            self.stdout.write(
+                f'{result.label}: {len(result.assignments)} assignments, '
+                f'{result.unassigned_sessions} unassigned sessions, score {result.total_score:.3f}'
             )
-            for c in Course.objects.filter(is_active=True, shifts=shift)
-        ]
 
-        return constrains, courses, teachers, rooms, time_slots, Dshift, sections
+        # The saved routines are only replaced once every shift has a new one
+        with transaction.atomic():
+            for shift in shifts:
+                self.clear_previous_assignments(shift)
+            self.save_routine([assignment for result in results for assignment in result.assignments])
+
+    def handle_incremental(self, shift, options):
+        """
+        Re-generation on top of the saved routine. Every saved row is checked against the current inputs and kept
+        in place when it still fits, the rest are deleted and only the sessions missing then are placed.
+        Nothing kept moves, so the timetables untouched by an edit stay exactly as they were.
+        """
+        if options['restarts'] > 1:
+            raise CommandError('--restarts is not supported with --incremental')
+
+        started = time.perf_counter()
+        inputs = self.initialize_data(shift=shift.name)
+        scheduler = ScheduleGenerator(*inputs, seed=options['seed'], **self.generator_options(options))
+
+        kept, stale = load_routine(inputs)
+        rejected = {id(assignment) for assignment in scheduler.pin(list(kept.values()))}
+        stale.update({row_id: 'constraints' for row_id, assignment in kept.items() if id(assignment) in rejected})
+        scheduler.generate()
+        self.report_local_search(scheduler)
+        new_assignments = scheduler.new_assignments()
+
+        reasons = Counter(stale.values())
+        self.stdout.write(
+            f'Kept {len(kept) - len(rejected)} assignments, dropped {len(stale)} '
+            f'({", ".join(f"{reason}: {count}" for reason, count in sorted(reasons.items())) or "none"}), '
+            f'placed {len(new_assignments)} sessions, {scheduler.count_unassigned_sessions()} still unassigned, '
+            f'in {time.perf_counter() - started:.3f}s'
+        )
+
+        with transaction.atomic():
+            self.delete_assignments(shift, list(stale))
+            self.save_routine(new_assignments)
+
+    @staticmethod
+    def delete_assignments(shift, ids: List[int]):
+        """Deletes the rows, the courses and teachers left without any assignment lose their is_assigned flag."""
+        rows = DjangoAssignment.objects.filter(shift=shift, id__in=ids)
+        course_ids = set(rows.values_list('course_id', flat=True))
+        teacher_ids = set(rows.values_list('teacher_id', flat=True))
+        rows.delete()
+
+        Course.objects.filter(id__in=course_ids).exclude(id__in=DjangoAssignment.objects.values('course_id'))\
+            .update(is_assigned=False)
+        Teacher.objects.filter(id__in=teacher_ids).exclude(id__in=DjangoAssignment.objects.values('teacher_id'))\
+            .update(is_assigned=False)
+        bump_routine_version(shift.id)
+
+    def save_routine(self, assignments: List[DAssignment]) -> Dict[str, float]:
+        """
+        Bulk save of the routine in one transaction: the assignment rows, their time slot rows and one
+        is_assigned update per model. Foreign keys are set by id. The new rows' ids come back from the insert, on
+        backends that cannot return them (MySQL) they are read back by one more query.
+        returns: row counts and the seconds spent per step
+        """
+        started = time.perf_counter()
+        shift_ids = {a.shift.id for a in assignments}
+        with transaction.atomic():
+            returns_ids = connection.features.can_return_rows_from_bulk_insert
+            if not returns_ids:
+                last_id = DjangoAssignment.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+            rows = DjangoAssignment.objects.bulk_create([
+                DjangoAssignment(
+                    course_id=assignment.course.id,
+                    teacher_id=assignment.teacher.id,
+                    room_id=assignment.room.id,
+                    score=assignment.score,
+                    shift_id=assignment.shift.id,
+                    section_id=assignment.section.id,
+                )
+                for assignment in assignments
+            ], batch_size=500)
+            if not returns_ids:
+                # Auto increment ids follow the insert order, the rows of the routine's shifts above the last id
+                # before it are the new ones
+                ids = list(DjangoAssignment.objects.filter(shift_id__in=shift_ids, id__gt=last_id)
+                           .order_by('id').values_list('id', flat=True))
+                if len(ids) != len(rows):
+                    raise CommandError(f'Expected {len(rows)} new assignment rows, found {len(ids)}')
+                for row, row_id in zip(rows, ids):
+                    row.id = row_id
+            assignments_saved = time.perf_counter()
+
+            TimeSlotThrough = DjangoAssignment.time_slot.through
+            slot_rows = TimeSlotThrough.objects.bulk_create([
+                TimeSlotThrough(assignment_id=row.id, timeslot_id=slot.id)
+                for row, assignment in zip(rows, assignments)
+                for slot in assignment.slot_group
+            ], batch_size=500)
+            slots_saved = time.perf_counter()
+
+            courses = Course.objects.filter(id__in={a.course.id for a in assignments}).update(is_assigned=True)
+            teachers = Teacher.objects.filter(id__in={a.teacher.id for a in assignments}).update(is_assigned=True)
+            bump_routine_version(*shift_ids)
+        finished = time.perf_counter()
+
+        stats = {
+            'assignments': len(rows),
+            'time_slots': len(slot_rows),
+            'courses': courses,
+            'teachers': teachers,
+            'assignments_seconds': assignments_saved - started,
+            'time_slots_seconds': slots_saved - assignments_saved,
+            'flags_seconds': finished - slots_saved,
+            'total_seconds': finished - started,
+        }
+        self.stdout.write(
+            f"Saved {stats['assignments']} assignments, {stats['time_slots']} time slots, {stats['courses']} courses "
+            f"and {stats['teachers']} teachers in {stats['total_seconds']:.3f}s"
+        )
+        self.stdout.write(self.style.SUCCESS('Schedule generated and saved successfully.'))
+        return stats
+
+    @staticmethod
+    def initialize_data(shift, *args, **kwargs):
+        return load_inputs(shift)
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from university.pdf import render_documents, shift_documents
+from university.jobs import claim_next_job, reap_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued routine generation jobs, polling the queue until stopped'
+    # Spawned per generate click, the web process already ran the checks
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until-empty', action='store_true', help='Exit once no job is queued')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between polls of an empty queue')
+        parser.add_argument('--progress-interval', type=float, default=1.0, help='Seconds between progress writes')
+        parser.add_argument('--no-pdfs', action='store_true', help='Do not pre-render the pdfs of a finished routine')
+
+    def handle(self, *args, **options):
+        reaped = reap_stale_jobs()
+        if reaped:
+            self.stdout.write(f'Failed {reaped} jobs left running by a dead worker')
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['until_empty']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Job {job.pk}: generating the {job.shift.name} routine')
+            job = run_job(job, progress_interval=options['progress_interval'], stdout=self.stdout)
+            if job.status == job.DONE:
+                self.stdout.write(self.style.SUCCESS(f'Job {job.pk}: done, {job.unassigned_sessions} unassigned sessions'))
+                if not options['no_pdfs']:
+                    self.render_pdfs(job)
+            else:
+                self.stderr.write(f'Job {job.pk}: failed\n{job.error}')
+
+    def render_pdfs(self, job):
+        """Renders the new routine's pdfs up front, so the first download does not wait on weasyprint."""
+        try:
+            rendered = render_documents(shift_documents(job.shift_id))
+        except Exception as e:
+            self.stderr.write(f'Job {job.pk}: pdfs not rendered, {e}')
+        else:
+            self.stdout.write(f'Job {job.pk}: {len(rendered)} pdfs rendered')
@@ -0,0 +1,93 @@
+import json
+from collections import defaultdict
+
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from university.models import (
+    Assignment, ConstrainType, Constrain, Shift, TimeSlot, Department, Room, Section, Course, Teacher,
+)
+from university.synthetic import generate_records
+
+# Dependency order of the inserts, deletes run the other way round
+MODELS = [ConstrainType, Constrain, Shift, TimeSlot, Department, Room, Section, Course, Teacher]
+
+
+class Command(BaseCommand):
+    help = 'Generates a synthetic university, written as a fixture file or bulk inserted into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=4, help='The first one owns the sections, the rest teach service courses')
+        parser.add_argument('--semesters', type=int, default=8)
+        parser.add_argument('--sections', type=int, default=1, help='Sections per semester and shift')
+        parser.add_argument('--courses', type=int, default=6, help='Courses per semester')
+        parser.add_argument('--service-ratio', type=float, default=0.25, help='Share of courses taught by other departments')
+        parser.add_argument('--lab-ratio', type=float, default=0.3, help='Share of lab courses')
+        parser.add_argument('--teachers', type=int, default=16, help='Teachers of the first department')
+        parser.add_argument('--service-teachers', type=int, default=2, help='Teachers of every other department')
+        parser.add_argument('--rooms', type=int, default=8, help='Theory rooms')
+        parser.add_argument('--labs', type=int, default=2, help='Lab rooms')
+        parser.add_argument('--shifts', nargs='+', default=['Morning', 'Evening'])
+        parser.add_argument('--slots-per-day', type=int, default=6)
+        parser.add_argument('--scale', type=int, default=1, help='Multiplies the sections, teachers and rooms')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', type=str, default=None, help='Fixture file to write')
+        parser.add_argument('--to-db', action='store_true', help='Bulk insert into the database instead')
+        parser.add_argument('--flush', action='store_true', help='Delete the existing scheduling data first')
+
+    def handle(self, *args, **options):
+        if not options['output'] and not options['to_db']:
+            raise CommandError('Pass --output and/or --to-db')
+
+        records = generate_records(
+            departments=options['departments'], semesters=options['semesters'],
+            sections_per_semester=options['sections'], courses_per_semester=options['courses'],
+            service_ratio=options['service_ratio'], lab_ratio=options['lab_ratio'], teachers=options['teachers'],
+            service_teachers=options['service_teachers'], rooms=options['rooms'], labs=options['labs'],
+            shifts=options['shifts'], slots_per_day=options['slots_per_day'], scale=options['scale'], seed=options['seed'],
+        )
+        counts = defaultdict(int)
+        for record in records:
+            counts[record['model'].split('.')[-1]] += 1
+        self.stdout.write(', '.join(f'{count} {model}' for model, count in counts.items()))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(records, f)
+            self.stdout.write(self.style.SUCCESS(f"Fixture written to {options['output']}"))
+
+        if options['to_db']:
+            self.insert(records, flush=options['flush'])
+            self.stdout.write(self.style.SUCCESS('Synthetic university inserted'))
+
+    @staticmethod
+    @transaction.atomic
+    def insert(records: list, flush: bool = False):
+        """
+        One bulk_create per model and per many-to-many through table, loaddata would save row by row.
+        The records carry explicit primary keys, so the scheduling tables have to be empty.
+        """
+        if flush:
+            Assignment.objects.all().delete()
+            for model in reversed(MODELS):
+                model.objects.all().delete()
+        elif any(model.objects.exists() for model in MODELS):
+            raise CommandError('The database already holds scheduling data, pass --flush to replace it')
+
+        objects = defaultdict(list)
+        through_rows = defaultdict(list)
+        for deserialized in serializers.deserialize('python', records):
+            instance = deserialized.object
+            objects[type(instance)].append(instance)
+            for field_name, related_ids in (deserialized.m2m_data or {}).items():
+                field = type(instance)._meta.get_field(field_name)
+                through = field.remote_field.through
+                source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+                through_rows[through].extend(
+                    through(**{f'{source}_id': instance.pk, f'{target}_id': related_id}) for related_id in related_ids
+                )
+
+        for model in MODELS:
+            model.objects.bulk_create(objects[model], batch_size=1000)
+        for through, rows in through_rows.items():
+            through.objects.bulk_create(rows, batch_size=1000)
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 00:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('university', '0008_alter_assignment_section_alter_assignment_shift_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('seed', models.IntegerField(blank=True, null=True)),
+                ('phase', models.CharField(blank=True, default='', max_length=20)),
+                ('courses_placed', models.PositiveIntegerField(default=0)),
+                ('courses_total', models.PositiveIntegerField(default=0)),
+                ('candidates', models.PositiveBigIntegerField(default=0)),
+                ('best_score', models.FloatField(blank=True, null=True)),
+                ('unassigned_sessions', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('worker_pid', models.PositiveIntegerField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('shift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_jobs', to='university.shift')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('shift',), name='one_active_generation_job_per_shift')],
+            },
+        ),
+    ]
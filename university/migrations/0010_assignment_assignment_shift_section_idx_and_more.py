@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('university', '0009_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['shift', 'section'], name='assignment_shift_section_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['shift', 'teacher'], name='assignment_shift_teacher_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['course', 'section'], name='assignment_course_section_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['is_active', 'semester'], name='course_active_semester_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['shift', 'day', 'slot_number'], name='timeslot_shift_day_slot_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from config.mixin import ModelMixin
+from scheduler.models import SEVERITY_SCORE
 
 DAYS = [
     ('Thursday', 'Thursday'),
@@ -59,6 +60,9 @@ class TimeSlot(ModelMixin):
     class Meta:
         unique_together = ('day', 'slot_number')
         ordering = ['day', 'slot_number']
+        indexes = [
+            models.Index(fields=['shift', 'day', 'slot_number'], name='timeslot_shift_day_slot_idx'),
+        ]
 
     def __str__(self):
         return f"{self.day} - Slot {self.slot_number}"
@@ -91,6 +95,11 @@ class Course(ModelMixin):
 
     shifts = models.ManyToManyField(Shift, related_name='courses')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'semester'], name='course_active_semester_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} (Sem {self.semester})"
 
@@ -108,6 +117,15 @@ class Assignment(ModelMixin):
     section = models.ForeignKey(Section, on_delete=models.CASCADE, null=True, blank=True)
     shift = models.ForeignKey(Shift, on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta:
+        # The routine views read a shift's assignments per section and per teacher, the generator counts
+        # them per course and section. The time_slot join is covered by the through table's unique index.
+        indexes = [
+            models.Index(fields=['shift', 'section'], name='assignment_shift_section_idx'),
+            models.Index(fields=['shift', 'teacher'], name='assignment_shift_teacher_idx'),
+            models.Index(fields=['course', 'section'], name='assignment_course_section_idx'),
+        ]
+
     def __str__(self):
         return f"{self.course.name} at {[slot for slot in self.time_slot.all()]} by {self.teacher.name}"
 
@@ -125,11 +143,7 @@ class Constrain(models.Model):
         ('Medium', 'Medium'),
         ('Low', 'Low')
     )
-    SEVERITY_SCORE = {
-        'High': 3.0,
-        'Medium': 1.5,
-        'Low': 1.0,
-    }
+    SEVERITY_SCORE = SEVERITY_SCORE
     type = models.ForeignKey(ConstrainType, on_delete=models.CASCADE)
     condition = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
@@ -140,10 +154,57 @@ class Constrain(models.Model):
     def __str__(self):
         return self.type.name
 
-    def save(self, *args, **kwargs):
-        self.score = self.SEVERITY_SCORE[self.severity]
-        super().save(*args, **kwargs)
+    @property
+    def weight(self) -> float:
+        """Same weight the scheduler gives the constraint's term when scoring is weighted."""
+        return self.score_weight * self.SEVERITY_SCORE[self.severity]
 
     @property
     def key(self):
         return '_'.join(self.condition.lower().split())
+
+
+class GenerationJob(ModelMixin):
+    """
+    A queued routine generation for one shift, picked up by the run_generation_jobs worker.
+    At most one job per shift can be queued or running, generate clicks while one is active reuse it.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    shift = models.ForeignKey(Shift, on_delete=models.CASCADE, related_name='generation_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    seed = models.IntegerField(null=True, blank=True)
+
+    # Progress, written by the worker while the generator runs
+    phase = models.CharField(max_length=20, blank=True, default='')
+    courses_placed = models.PositiveIntegerField(default=0)
+    courses_total = models.PositiveIntegerField(default=0)
+    candidates = models.PositiveBigIntegerField(default=0)
+    best_score = models.FloatField(null=True, blank=True)
+    unassigned_sessions = models.PositiveIntegerField(null=True, blank=True)
+
+    error = models.TextField(blank=True, default='')
+    worker_pid = models.PositiveIntegerField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['shift'], condition=models.Q(status__in=['queued', 'running']), name='one_active_generation_job_per_shift',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.shift.name} generation ({self.status})"
@@ -0,0 +1,191 @@
+# routine pdfs, rendered once per content and kept on disk under the digest of their html.
+
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.http import FileResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from university.models import Section, Shift, Teacher
+from university.timetable import get_snapshot, pdf_cell_text, render_rows, teacher_cell_text, teacher_routine
+
+KINDS = ('shift', 'section', 'teacher')
+
+
+class Document(NamedTuple):
+    kind: str
+    key: str
+    filename: str
+    html: str
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.html.encode()).hexdigest()
+
+
+def pdf_root() -> Path:
+    return Path(getattr(settings, 'ROUTINE_PDF_ROOT', settings.BASE_DIR / 'pdfs'))
+
+
+def _html(title: str, row_label: str, pages: list) -> str:
+    return render_to_string('pdf/routine_pdf.html', {'title': title, 'row_label': row_label, 'pages': pages})
+
+
+def _blank_row(slots: list) -> list:
+    return [{'colspan': 1, 'text': ''} for _ in slots]
+
+
+def shift_document(shift_id: int) -> Optional[Document]:
+    """Every semester of the shift, one page per day."""
+    snapshot = get_snapshot(shift_id)
+    if snapshot is None:
+        return None
+
+    rows = render_rows(snapshot['semester_rows'], snapshot['assignments'], pdf_cell_text)
+    pages = [
+        (day, slots, {sem: days[day] for sem, days in rows.items()})
+        for day, slots in snapshot['slots_by_day'].items()
+    ]
+    name = snapshot['shift']['name']
+    return Document('shift', str(shift_id), f'cse_{name.lower()}_routine.pdf', _html(f'{name} Shift', 'Semester', pages))
+
+
+def section_document(section_id: int) -> Optional[Document]:
+    """One section's week, one page per day."""
+    shift_id = Section.objects.filter(id=section_id).values_list('shift_id', flat=True).first()
+    snapshot = get_snapshot(shift_id) if shift_id else None
+    if snapshot is None or section_id not in snapshot['sections']:
+        return None
+
+    key = snapshot['sections'][section_id]
+    rows = render_rows(snapshot['section_rows'], snapshot['assignments'], pdf_cell_text).get(key, {})
+    pages = [
+        (day, slots, {key: rows.get(day) or _blank_row(slots)})
+        for day, slots in snapshot['slots_by_day'].items()
+    ]
+    name = snapshot['shift']['name']
+    return Document(
+        'section', str(section_id), f'cse_{name.lower()}_{key}_routine.pdf',
+        _html(f'{name} Shift, Section {key}', 'Section', pages),
+    )
+
+
+def teacher_document(initial: str) -> Optional[Document]:
+    """A teacher's classes in every shift, one page per shift and day."""
+    teacher = Teacher.objects.filter(initial=initial).values('id', 'name', 'initial').first()
+    if teacher is None:
+        return None
+
+    pages = []
+    for shift_id in Shift.objects.order_by('id').values_list('id', flat=True):
+        snapshot = get_snapshot(shift_id)
+        routine = teacher_routine(snapshot, teacher['id'], teacher_cell_text)
+        for day, slots in routine['slots_by_day'].items():
+            rows = {key: days[day] for key, days in routine['routine_data'].items()}
+            pages.append((f"{snapshot['shift']['name']}, {day}", slots, rows))
+    return Document(
+        'teacher', initial, f"teacher_{teacher['initial']}_routine.pdf", _html(teacher['name'], 'Section', pages),
+    )
+
+
+def get_document(kind: str, key) -> Optional[Document]:
+    if kind == 'shift':
+        return shift_document(int(key))
+    if kind == 'section':
+        return section_document(int(key))
+    if kind == 'teacher':
+        return teacher_document(str(key))
+    raise ValueError(f'Unknown document kind {kind}')
+
+
+def document_path(document: Document) -> Path:
+    digest = document.digest
+    return pdf_root() / digest[:2] / f'{digest}.pdf'
+
+
+def render(document: Document) -> Path:
+    """
+    The document's pdf, rendered only when no file with the same html digest exists yet.
+    Written to a temporary file first so a concurrent reader never sees half a pdf.
+    """
+    path = document_path(document)
+    if path.exists():
+        return path
+
+    from weasyprint import HTML
+    pdf = HTML(string=document.html).write_pdf()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+def pdf_response(request, document: Document):
+    """The rendered pdf with its digest as ETag, a 304 when the client already has this version."""
+    path = render(document)
+    etag = f'"{document.digest}"'
+    last_modified = int(path.stat().st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(open(path, 'rb'), content_type='application/pdf')
+        response['Content-Disposition'] = f'filename="{document.filename}"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def shift_documents(shift_id: int) -> List[Tuple[str, str]]:
+    """(kind, key) of every document showing the shift: the shift itself, its sections and its teachers."""
+    snapshot = get_snapshot(shift_id)
+    if snapshot is None:
+        return []
+    initials = dict.fromkeys(record['teacher_initial'] for record in snapshot['assignments'])
+    return [('shift', str(shift_id))] + [('section', str(pk)) for pk in snapshot['sections']] + \
+        [('teacher', initial) for initial in initials]
+
+
+def all_documents(kinds: Iterable[str] = KINDS) -> List[Tuple[str, str]]:
+    documents = []
+    if 'shift' in kinds:
+        documents += [('shift', str(pk)) for pk in Shift.objects.order_by('id').values_list('id', flat=True)]
+    if 'section' in kinds:
+        documents += [('section', str(pk)) for pk in Section.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)]
+    if 'teacher' in kinds:
+        documents += [('teacher', initial) for initial in Teacher.objects.filter(is_active=True).order_by('initial').values_list('initial', flat=True)]
+    return documents
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _render(kind: str, key: str) -> Optional[Tuple[str, Path]]:
+    document = get_document(kind, key)
+    if document is None:
+        return None
+    return document.filename, render(document)
+
+
+def render_documents(documents: List[Tuple[str, str]], workers: int = 1) -> List[Tuple[str, Path]]:
+    """Renders the (kind, key) documents, across a process pool when workers > 1. returns: (filename, path) pairs"""
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            results = list(pool.map(_render, *zip(*documents))) if documents else []
+    else:
+        results = [_render(kind, key) for kind, key in documents]
+    return [result for result in results if result is not None]
@@ -0,0 +1,33 @@
+# keeps the cached timetable snapshots in step with edits made outside the generator, e.g. in the admin.
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from university.models import Assignment, Course, Room, Section, Shift, Teacher, TimeSlot
+from university.timetable import bump_routine_version
+
+
+# No post_delete: a receiver would stop Django from fast-deleting, so every bulk delete of a routine would load its
+# rows and bump once per row. The code deleting assignments bumps once itself, AssignmentAdmin does for the admin.
+@receiver(post_save, sender=Assignment)
+def assignment_changed(sender, instance, **kwargs):
+    if instance.shift_id:
+        bump_routine_version(instance.shift_id)
+    else:
+        bump_routine_version()
+
+
+@receiver(m2m_changed, sender=Assignment.time_slot.through)
+def assignment_slots_changed(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Assignment) and instance.shift_id:
+        bump_routine_version(instance.shift_id)
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Room)
+@receiver([post_save, post_delete], sender=Section)
+@receiver([post_save, post_delete], sender=Shift)
+@receiver([post_save, post_delete], sender=Teacher)
+@receiver([post_save, post_delete], sender=TimeSlot)
+def schedule_data_changed(sender, **kwargs):
+    # Names and slots show up in every shift's snapshot
+    bump_routine_version()
@@ -0,0 +1,121 @@
+# parametrised synthetic universities, as fixture records of the university app.
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence
+
+SHIFT_DAYS = {
+    'Morning': ['Saturday', 'Sunday', 'Tuesday', 'Wednesday'],
+    'Evening': ['Thursday', 'Friday', 'Saturday'],
+}
+SHIFT_START = {'Morning': '09:00', 'Evening': '17:30'}
+SLOT_MINUTES = 50
+SECTION_NAMES = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Same condition texts as the bundled database, the generator keys them by their lowercase underscore form
+CONSTRAINTS = [
+    ('Soft', 'minimize teacher slot gap', 1.0),
+    ('Soft', 'minimize section slot gap', 3.0),
+    ('Soft', 'day balancing slots allocation', 3.0),
+    ('Hard', 'one teacher per course', 100.0),
+    ('Hard', 'cross department teacher', 100.0),
+    ('Hard', 'enforce teacher max weekly load', 1.0),
+]
+
+
+def section_name(index: int) -> str:
+    """A, B, ... Z, AA, AB, ... so any number of sections per semester gets distinct names."""
+    name = ''
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, len(SECTION_NAMES))
+        name = SECTION_NAMES[rest] + name
+    return name
+
+
+def generate_records(departments: int = 4, semesters: int = 8, sections_per_semester: int = 1,
+                     courses_per_semester: int = 6, service_ratio: float = 0.25, lab_ratio: float = 0.3,
+                     teachers: int = 16, service_teachers: int = 2, rooms: int = 8, labs: int = 2,
+                     preferred_courses: int = 3, preferred_slots: int = 4, shifts: Sequence[str] = ('Morning', 'Evening'),
+                     slots_per_day: int = 6, scale: int = 1, seed: int = 0) -> List[dict]:
+    """
+    Fixture records (loaddata format) of a synthetic university, shaped like the bundled database: the first
+    department runs the programme and owns every section, room and lab, the others teach service courses with
+    their own teachers. Every course is offered in every shift, labs take two or three consecutive slots.
+    `scale` multiplies the sections, teachers and rooms, the course plan and the time slots stay the same.
+    The same seed gives the same university.
+    """
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1).isoformat()
+    records: List[dict] = []
+    pks: Dict[str, int] = {}
+
+    def add(model: str, **fields) -> int:
+        pk = pks[model] = pks.get(model, 0) + 1
+        if model != 'constrain':
+            fields = {'created_at': now, 'updated_at': now, 'is_active': True, **fields}
+        else:
+            fields.setdefault('is_active', True)
+        records.append({'model': f'university.{model}', 'pk': pk, 'fields': fields})
+        return pk
+
+    types = {name: add('constraintype', name=name) for name in ('Hard', 'Soft')}
+    for kind, condition, weight in CONSTRAINTS:
+        add('constrain', type=types[kind], condition=condition, description='', severity='High', score_weight=weight)
+
+    shift_pks = {name: add('shift', name=name) for name in shifts}
+
+    # Slot numbers keep counting across the shifts sharing a day, (day, slot_number) is unique
+    slot_pks = []
+    next_number = {}
+    for name in shifts:
+        hour, minute = map(int, SHIFT_START.get(name, '09:00').split(':'))
+        for day in SHIFT_DAYS.get(name, SHIFT_DAYS['Morning']):
+            start = datetime(2025, 1, 1, hour, minute)
+            for _ in range(slots_per_day):
+                end = start + timedelta(minutes=SLOT_MINUTES)
+                next_number[day] = next_number.get(day, 0) + 1
+                slot_pks.append(add(
+                    'timeslot', day=day, slot_number=next_number[day], shift=shift_pks[name],
+                    start_time=start.time().isoformat(), end_time=end.time().isoformat(),
+                ))
+                start = end
+
+    department_pks = [add('department', name=f'D{number:02d}') for number in range(1, departments + 1)]
+    home = department_pks[0]
+
+    for number in range(1, (rooms + labs) * scale + 1):
+        add('room', name=f'R{number:03d}', capacity=40, is_lab=number > rooms * scale, department=home)
+
+    for semester in range(1, semesters + 1):
+        for shift in shifts:
+            for index in range(sections_per_semester * scale):
+                add('section', name=section_name(index), semester=semester, shift=shift_pks[shift], department=home)
+
+    course_pks = {pk: [] for pk in department_pks}
+    for semester in range(1, semesters + 1):
+        for index in range(1, courses_per_semester + 1):
+            department = home
+            if len(department_pks) > 1 and rng.random() < service_ratio:
+                department = rng.choice(department_pks[1:])
+            is_lab = department == home and rng.random() < lab_ratio
+            course_pks[department].append(add(
+                'course', code=f'C{department:02d}-{semester}{index:02d}', name=f'Course {semester}.{index}',
+                credit=1.5 if is_lab else 3.0, department=department, semester=semester,
+                sessions_per_week=1 if is_lab else 2, duration_per_session=rng.choice([2, 3]) if is_lab else 1,
+                is_lab=is_lab, is_assigned=False, shifts=list(shift_pks.values()),
+            ))
+
+    for department in department_pks:
+        count = (teachers if department == home else service_teachers) * scale
+        for index in range(1, count + 1):
+            candidates = course_pks[department]
+            add(
+                'teacher', name=f'Teacher {department}.{index}', initial=f'T{department:02d}{index:03d}',
+                department=department, max_classes_per_week=rng.randint(10, 14), is_assigned=False,
+                minimum_classes_per_day=2,
+                preferred_courses=rng.sample(candidates, min(preferred_courses, len(candidates))),
+                preferred_time_slots=rng.sample(slot_pks, min(preferred_slots, len(slot_pks))),
+            )
+
+    return records
@@ -15,13 +15,6 @@ def match_slot(assignments, args):
             return item
     return None
 
-@register.simple_tag
-def get_matched_assignment(assignments, semester, slot_number):
-    for item in assignments:
-        if item['assignment'].course.semester == semester and item['min_slot'] == slot_number:
-            return item
-    return None
-
 @register.filter
 def times(number):
     """Repeat filter for a given number."""
@@ -1,3 +1,746 @@
-from django.test import TestCase
+import contextlib
+import importlib.util
+import io
+import tempfile
+from datetime import time
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from scheduler.coordinator import components, conflict_graph, run_coordinated, split_units
+from scheduler.models import (
+    Department, Shift, Section, TimeSlot, Room, Course, Teacher, Constrains,
+)
+from scheduler.problem import Problem
+from scheduler.scheduleGenerator import ScheduleGenerator
+from scheduler.score import ScoreEngine
+from scheduler.solvers import SolverResult, SolverUnavailable, get_solver
+from scheduler.validation import ConstraintCheckerEngine
+from university import pdf
+from university.admin import AssignmentAdmin
+from university.management.commands.generate import Command as GenerateCommand
+from university.management.commands.synthesize import Command as SynthesizeCommand
+from university.jobs import claim_next_job, enqueue_generation, run_job, update_progress
+from university.loader import load_inputs
+from university.models import (
+    Assignment as DjangoAssignment, Course as DjangoCourse, GenerationJob, Shift as DjangoShift, Teacher as DjangoTeacher,
+)
+from university.synthetic import generate_records
+
+
+SOFT_KEYS = [
+    'minimize_teacher_slot_gap', 'minimize_section_slot_gap',
+    'load_balancing_between_teacher', 'day_balancing_slots_allocation',
+]
+HARD_KEYS = ['one_teacher_per_course', 'cross_department_teacher', 'enforce_teacher_max_weekly_load']
+
+
+def make_problem(shift_name='Evening', days=('Thursday', 'Friday', 'Saturday'), slots_per_day=6, semesters=4,
+                 sections_per_semester=2, courses_per_semester=4, teachers=10, rooms=5, labs=2):
+    """Small in-memory scheduling problem, shaped like Command.initialize_data output."""
+    department = Department(id=1, name='CSE')
+    shift = Shift(id=1, name=shift_name)
+
+    constrains = [
+        Constrains(id=i, type='Soft', condition=key.replace('_', ' '), severity='High', score_weight=1.0, key=key)
+        for i, key in enumerate(SOFT_KEYS, start=1)
+    ] + [
+        Constrains(id=i, type='Hard', condition=key.replace('_', ' '), severity='High', score_weight=100.0, key=key)
+        for i, key in enumerate(HARD_KEYS, start=len(SOFT_KEYS) + 1)
+    ]
+
+    time_slots = []
+    for day in days:
+        for number in range(1, slots_per_day + 1):
+            time_slots.append(TimeSlot(
+                id=len(time_slots) + 1, day=day, slot_number=number,
+                start_time=time(8 + number, 0), end_time=time(9 + number, 0), shift=shift,
+            ))
+
+    room_list = [
+        Room(id=i, name=f'R{i}', department=department, is_lab=i > rooms)
+        for i in range(1, rooms + labs + 1)
+    ]
+
+    teacher_list = [
+        Teacher(
+            id=i, name=f'Teacher {i}', initial=f'T{i}', department=department, max_classes_per_week=12,
+            preferred_time_slots=[], preferred_courses=[], minimum_classes_per_day=2,
+        )
+        for i in range(1, teachers + 1)
+    ]
+
+    courses, sections = [], []
+    for semester in range(1, semesters + 1):
+        for number in range(courses_per_semester):
+            is_lab = number == courses_per_semester - 1
+            course_id = len(courses) + 1
+            courses.append(Course(
+                id=course_id, code=f'CSE-{semester}{number}', name=f'Course {course_id}', department=department,
+                semester=semester, credit=1.5 if is_lab else 3.0, sessions_per_week=1 if is_lab else 2,
+                duration_per_session=2 if is_lab else 1, preferred_teachers=[1 + course_id % teachers],
+                is_lab=is_lab, shifts=[shift],
+            ))
+        for number in range(sections_per_semester):
+            sections.append(Section(
+                id=len(sections) + 1, name='ABCDEFGH'[number], department=department, shift=shift, semester=semester,
+            ))
+
+    return constrains, courses, teacher_list, room_list, time_slots, shift, sections
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DatabaseTestCase(TestCase):
+    """Database tests get a private in-memory cache, the timetable snapshots must not leak between tests."""
+    def setUp(self):
+        cache.clear()
+
+
+class IncrementalScoreEngineTest(SimpleTestCase):
+    def test_scores_match_reference_engine(self):
+        generator = ScheduleGenerator(*make_problem(), seed=7, batch_scoring=False)
+        reference = ScoreEngine(generator.soft_constrains, generator.time_slots, generator.tracker)
+
+        incremental_score = generator.scorer.score_assignment
+        scored = []
+
+        def score_both(assignment, current_assignments):
+            expected = reference.score_assignment(assignment, current_assignments)
+            actual = incremental_score(assignment, current_assignments)
+            self.assertAlmostEqual(actual, expected, places=12)
+            scored.append(actual)
+            return actual
+
+        generator.scorer.score_assignment = score_both
+        assignments, _ = generator.generate()
+
+        self.assertTrue(assignments)
+        self.assertGreater(len(scored), len(assignments))
+
+    def test_scores_match_after_remove(self):
+        generator = ScheduleGenerator(*make_problem(), seed=11)
+        assignments, _ = generator.generate()
+
+        for assignment in assignments[::3]:
+            generator.tracker.remove_assignment(assignment)
+            generator.assignments.remove(assignment)
+
+        reference = ScoreEngine(generator.soft_constrains, generator.time_slots, generator.tracker)
+        for assignment in assignments[::3]:
+            self.assertAlmostEqual(
+                generator.scorer.score_assignment(assignment, generator.assignments),
+                reference.score_assignment(assignment, generator.assignments),
+                places=12,
+            )
+
+
+class BatchScoreEngineTest(SimpleTestCase):
+    def test_batch_scores_match_reference_engine(self):
+        generator = ScheduleGenerator(*make_problem(), seed=3)
+        reference = ScoreEngine(generator.soft_constrains, generator.time_slots, generator.tracker)
+
+        score_candidates = generator.scorer.score_candidates
+        batches = []
+
+        def score_both(batch):
+            scores = score_candidates(batch)
+            for candidate, score in zip(batch, scores):
+                self.assertAlmostEqual(score, reference.score_assignment(candidate, generator.assignments), places=12)
+            batches.append(len(batch))
+            return scores
+
+        generator.scorer.score_candidates = score_both
+        assignments, _ = generator.generate()
+
+        self.assertTrue(assignments)
+        self.assertGreater(sum(batches), len(batches))
+
+    def test_same_routine_as_streaming(self):
+        routines = []
+        for batch_scoring in (True, False):
+            assignments, _ = ScheduleGenerator(*make_problem(), seed=5, batch_scoring=batch_scoring).generate()
+            routines.append([(a.course.id, a.section.id, a.teacher.id, a.room.id, [s.id for s in a.slot_group]) for a in assignments])
+        self.assertEqual(routines[0], routines[1])
+
+
+class WeightedScoringTest(SimpleTestCase):
+    def test_weighted_score_is_weighted_sum_of_terms(self):
+        constrains, *inputs = make_problem()
+        constrains = [
+            cs.model_copy(update={'score_weight': float(i), 'severity': ('High', 'Medium', 'Low')[i % 3]})
+            for i, cs in enumerate(constrains, start=1)
+        ] + [Constrains(id=99, type='Soft', condition='unknown rule', severity='Low', score_weight=5.0, key='unknown_rule')]
+        generator = ScheduleGenerator(constrains, *inputs, seed=2, weighted_scoring=True, profile_scoring=True)
+        assignments, _ = generator.generate()
+
+        weights = {cs.key: cs.score_weight * {'High': 3.0, 'Medium': 1.5, 'Low': 1.0}[cs.severity] for cs in constrains}
+        self.assertEqual([term.key for term in generator.scorer.terms], SOFT_KEYS)
+        self.assertEqual(generator.scorer.max_score(), sum(weights[key] for key in SOFT_KEYS))
+
+        plain = ScoreEngine(generator.soft_constrains, generator.time_slots, generator.tracker)
+        for assignment in assignments[:5]:
+            others = [a for a in assignments if a is not assignment]
+            generator.tracker.remove_assignment(assignment)
+            expected = sum(weights[term.key] * term.score(assignment, others) for term in plain.terms)
+            self.assertAlmostEqual(generator.scorer.score_assignment(assignment, others), expected, places=9)
+            generator.tracker.add_assignment(assignment)
+
+        report = generator.scorer.term_report()
+        self.assertEqual({row['key'] for row in report}, set(SOFT_KEYS))
+        self.assertTrue(all(row['calls'] > len(assignments) for row in report))
+
+    def test_negative_weight_is_rejected(self):
+        constrains, *inputs = make_problem()
+        constrains[0] = constrains[0].model_copy(update={'score_weight': -1.0})
+        with self.assertRaises(ValueError):
+            ScheduleGenerator(constrains, *inputs, weighted_scoring=True)
+
+
+class RepairEngineTest(SimpleTestCase):
+    def generate(self, seed, **kwargs):
+        generator = ScheduleGenerator(*make_problem(slots_per_day=4, rooms=4, teachers=8), seed=seed, **kwargs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            assignments, failed = generator.generate()
+        return generator, assignments, failed
+
+    def test_repair_places_sessions_greedy_dropped(self):
+        _, _, greedy_failed = self.generate(seed=0, repair_depth=0)
+        generator, assignments, failed = self.generate(seed=0)
+
+        self.assertTrue(greedy_failed)
+        self.assertEqual(failed, {})
+        for course in generator.courses:
+            for section in generator.get_sections_for_course(course):
+                self.assertEqual(generator.tracker.placed_sessions(course.id, section.id), course.sessions_per_week)
+
+        checker = ConstraintCheckerEngine(generator.hard_constrains)
+        for i, assignment in enumerate(assignments):
+            others = assignments[:i] + assignments[i + 1:]
+            self.assertFalse(checker.has_overlap(assignment, others))
+            self.assertFalse(checker.has_other_teacher(assignment, others))
+            self.assertFalse(checker.repeats_on_same_day(assignment, others))
+
+
+class LocalSearchTest(SimpleTestCase):
+    def test_search_keeps_the_routine_valid_and_scores_it_exactly(self):
+        generator = ScheduleGenerator(*make_problem(), seed=3, local_search_budget=60.0, local_search_steps=400)
+        with contextlib.redirect_stdout(io.StringIO()):
+            assignments, failed = generator.generate()
+        report = generator.local_search_report
+
+        self.assertEqual(report['steps'], 400)
+        self.assertGreater(report['accepted'], 0)
+        self.assertGreaterEqual(report['best_score'], report['start_score'])
+        self.assertEqual(generator.count_unassigned_sessions(), 0)
+
+        # Every kept score is the assignment's reference score with all the others placed
+        reference = ScoreEngine(generator.soft_constrains, generator.time_slots, generator.tracker)
+        checker = ConstraintCheckerEngine(generator.hard_constrains)
+        total = 0.0
+        for assignment in list(assignments):
+            others = [a for a in assignments if a is not assignment]
+            self.assertFalse(checker.has_overlap(assignment, others))
+            self.assertFalse(checker.has_other_teacher(assignment, others))
+            self.assertFalse(checker.repeats_on_same_day(assignment, others))
+
+            score = assignment.score
+            generator.tracker.remove_assignment(assignment)
+            self.assertAlmostEqual(reference.score_assignment(assignment, others), score, places=9)
+            generator.tracker.add_assignment(assignment)
+            total += score
+        self.assertAlmostEqual(total, report['best_score'], places=6)
+
+
+class SolverTest(SimpleTestCase):
+    def solve(self, problem, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return get_solver('cp-sat').solve(problem, seed=0, time_limit=30.0, workers=1, **kwargs)
+
+    def test_cp_sat_without_ortools(self):
+        with mock.patch.dict('sys.modules', {'ortools': None, 'ortools.sat': None, 'ortools.sat.python': None}):
+            with self.assertRaises(SolverUnavailable):
+                get_solver('cp-sat').solve(make_problem())
+
+    @skipUnless(importlib.util.find_spec('ortools'), 'OR-Tools is not installed')
+    def test_cp_sat_solves_small_problem_to_optimality(self):
+        result = self.solve(make_problem(semesters=1, sections_per_semester=1, teachers=4))
+
+        self.assertEqual(result.status, 'optimal')
+        self.assertAlmostEqual(result.gap, 0.0, places=6)
+        self.assertEqual(result.unassigned_sessions, 0)
+        self.assertAlmostEqual(result.total_score, sum(a.score for a in result.assignments), places=9)
+
+        checker = ConstraintCheckerEngine([])
+        assignments = result.assignments
+        for i, assignment in enumerate(assignments):
+            others = assignments[:i] + assignments[i + 1:]
+            self.assertFalse(checker.has_overlap(assignment, others))
+            self.assertFalse(checker.has_other_teacher(assignment, others))
+            self.assertFalse(checker.repeats_on_same_day(assignment, others))
+        for teacher in {a.teacher.id: a.teacher for a in assignments}.values():
+            self.assertLessEqual(sum(a.teacher.id == teacher.id for a in assignments), teacher.max_classes_per_week)
+
+    @skipUnless(importlib.util.find_spec('ortools'), 'OR-Tools is not installed')
+    def test_cp_sat_reports_infeasible_load(self):
+        problem = make_problem(semesters=1, sections_per_semester=1, teachers=2)
+        for teacher in problem[2]:
+            teacher.max_classes_per_week = 1
+
+        result = self.solve(problem, warm_start=False)
+        self.assertEqual(result.status, 'infeasible')
+        self.assertEqual(result.assignments, [])
+
+    @skipUnless(importlib.util.find_spec('ortools'), 'OR-Tools is not installed')
+    def test_cp_sat_teacher_sessions_are_the_placed_ones(self):
+        from ortools.sat.python import cp_model
+
+        for semesters in (1, 2):
+            generator = ScheduleGenerator(*make_problem(semesters=semesters, sections_per_semester=1, teachers=4), seed=0)
+            backend = get_solver('cp-sat')
+            model = cp_model.CpModel()
+            x, y, z = backend.build(model, generator)
+            solver = cp_model.CpSolver()
+            solver.parameters.num_workers = 1
+            solver.parameters.max_time_in_seconds = 30.0
+            self.assertIn(solver.Solve(model), (cp_model.OPTIMAL, cp_model.FEASIBLE))
+
+            assignments = backend.extract(generator, solver, x, y)
+            for teacher in generator.teachers:
+                self.assertEqual(
+                    sum(solver.Value(var) for key, var in z.items() if key[3] == teacher.id),
+                    sum(a.teacher.id == teacher.id for a in assignments),
+                )
+
+
+class ProblemTest(SimpleTestCase):
+    def test_eligibility_matches_object_rules(self):
+        constrains, courses, teachers, rooms, time_slots, shift, sections = make_problem()
+        other = Department(id=2, name='EEE')
+        teachers += [teachers[0].model_copy(update={'id': 100, 'initial': 'X', 'department': other})]
+        rooms += [rooms[-1].model_copy(update={'id': 100, 'department': other})]
+        courses += [courses[-1].model_copy(update={'id': 100, 'code': 'EEE-1', 'department': other})]
+        sections += [sections[0].model_copy(update={'id': 100, 'shift': Shift(id=2, name='Morning')})]
+        problem = Problem(courses, teachers, rooms, time_slots, shift, sections)
+
+        for course in courses:
+            self.assertEqual(problem.teachers_for(course), [t for t in teachers if t.department == course.department])
+            self.assertEqual(problem.room_ids_for(course), {
+                r.id for r in rooms if r.is_lab == course.is_lab and (not r.is_lab or r.department == course.department)
+            })
+            self.assertEqual(problem.sections_for(course), [
+                s for s in sections if s.semester == course.semester and s.shift == shift
+            ])
+            c = problem.course_index[course.id]
+            self.assertEqual(problem.teacher_course[:, c].sum(), len(problem.teachers_for(course)))
+            self.assertEqual(problem.section_course[:, c].sum(), len(problem.sections_for(course)))
+
+
+class CoordinatorTest(SimpleTestCase):
+    @staticmethod
+    def second_shift(hours=0, department=None):
+        """A Morning shift over make_problem's courses, `hours` later, moved to `department` with its own staff and labs if given."""
+        constrains, courses, teachers, rooms, time_slots, _, sections = make_problem()
+        shift = Shift(id=2, name='Morning')
+        time_slots = [s.model_copy(update={
+            'id': s.id + 100, 'shift': shift,
+            'start_time': s.start_time.replace(hour=s.start_time.hour + hours),
+            'end_time': s.end_time.replace(hour=s.end_time.hour + hours),
+        }) for s in time_slots]
+        sections = [s.model_copy(update={'id': s.id + 100, 'shift': shift}) for s in sections]
+        if department:
+            courses = [c.model_copy(update={
+                'id': c.id + 100, 'department': department, 'preferred_teachers': [t + 100 for t in c.preferred_teachers],
+            }) for c in courses]
+            teachers = [t.model_copy(update={'id': t.id + 100, 'department': department}) for t in teachers]
+            # Theory rooms are open to every department, labs belong to one
+            rooms = [r.model_copy(update={'id': r.id + 100, 'department': department}) if r.is_lab else r for r in rooms]
+            sections = [s.model_copy(update={'department': department}) for s in sections]
+        return constrains, courses, teachers, rooms, time_slots, shift, sections
+
+    def test_shifts_share_teachers_rooms_and_loads(self):
+        inputs = {'Evening': make_problem(), 'Morning': self.second_shift()}
+        with contextlib.redirect_stdout(io.StringIO()):
+            results, groups = run_coordinated(inputs, seed=0)
+
+        # Same teachers and rooms at the same hours, the shifts run one after the other on one occupancy
+        self.assertEqual(groups, [[0, 1]])
+        assignments = [a for result in results for a in result.assignments]
+
+        busy = set()
+        for a in assignments:
+            for slot in a.slot_group:
+                for key in (('teacher', a.teacher.id), ('room', a.room.id)):
+                    self.assertNotIn((key, slot.day, slot.start_time), busy)
+                    busy.add((key, slot.day, slot.start_time))
+
+        loads, teachers = {}, {}
+        for a in assignments:
+            loads[a.teacher.id] = loads.get(a.teacher.id, 0) + 1
+            teachers[a.teacher.id] = a.teacher
+        for teacher_id, load in loads.items():
+            self.assertLessEqual(load, teachers[teacher_id].max_classes_per_week)
+        self.assertGreater(len(assignments), sum(t.max_classes_per_week for t in teachers.values()) // 2)
+
+    def test_independent_departments_are_separate_components(self):
+        later = {'Evening': make_problem(), 'Morning': self.second_shift(hours=8, department=Department(id=2, name='EEE'))}
+        self.assertEqual(components(conflict_graph(split_units(later, by_department=True))), [[0], [1]])
+
+        # Same hours: the departments' own teachers and labs are apart, the theory rooms are not
+        same_time = {'Evening': make_problem(), 'Morning': self.second_shift(department=Department(id=2, name='EEE'))}
+        self.assertEqual(components(conflict_graph(split_units(same_time, by_department=True))), [[0, 1]])
+
+    def test_departments_keep_other_departments_courses(self):
+        constrains, courses, teachers, rooms, time_slots, shift, sections = make_problem()
+        other = self.second_shift(department=Department(id=2, name='EEE'))
+        inputs = (constrains, courses + other[1], teachers + other[2], rooms + other[3][-2:], time_slots, shift,
+                  sections[:2] + [s.model_copy(update={'id': s.id + 100, 'shift': shift}) for s in other[6][:2]])
+
+        # Both departments' sections are semester 1, each is offered every semester 1 course as in a single run
+        units = split_units({'Evening': inputs}, by_department=True)
+        self.assertEqual([unit.department for unit in units], [1, 2])
+        for unit in units:
+            self.assertEqual({c.id for c in unit.inputs[1]}, {c.id for c in inputs[1] if c.semester == 1})
+
+
+class SaveRoutineTest(DatabaseTestCase):
+    def test_bulk_save_matches_generated_routine(self):
+        SynthesizeCommand.insert(generate_records(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',)))
+        command = GenerateCommand(stdout=io.StringIO())
+        generator = ScheduleGenerator(*command.initialize_data(shift='Evening'), seed=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            assignments, _ = generator.generate()
+
+        with self.assertNumQueries(6):
+            stats = command.save_routine(assignments)
+
+        self.assertEqual(stats['assignments'], len(assignments))
+        self.assertEqual(stats['time_slots'], sum(len(a.slot_group) for a in assignments))
+        saved = {
+            (row.course_id, row.section_id, row.teacher_id, row.room_id, tuple(sorted(ts.id for ts in row.time_slot.all())))
+            for row in DjangoAssignment.objects.prefetch_related('time_slot')
+        }
+        expected = {
+            (a.course.id, a.section.id, a.teacher.id, a.room.id, tuple(sorted(ts.id for ts in a.slot_group)))
+            for a in assignments
+        }
+        self.assertEqual(saved, expected)
+        self.assertEqual(
+            set(DjangoCourse.objects.filter(is_assigned=True).values_list('id', flat=True)),
+            {a.course.id for a in assignments},
+        )
+
+
+    def test_bulk_save_without_returned_ids(self):
+        SynthesizeCommand.insert(generate_records(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',)))
+        command = GenerateCommand(stdout=io.StringIO())
+        generator = ScheduleGenerator(*command.initialize_data(shift='Evening'), seed=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            assignments, _ = generator.generate()
+
+        # As on MySQL, bulk_create leaves the ids unset and they are read back
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            with self.assertNumQueries(8):
+                command.save_routine(assignments)
+
+        saved = {
+            (row.course_id, row.section_id, tuple(sorted(ts.id for ts in row.time_slot.all())))
+            for row in DjangoAssignment.objects.prefetch_related('time_slot')
+        }
+        self.assertEqual(saved, {(a.course.id, a.section.id, tuple(sorted(ts.id for ts in a.slot_group))) for a in assignments})
+
+
+class LoaderTest(DatabaseTestCase):
+    def test_query_count_does_not_grow_with_data(self):
+        for scale in (1, 3):
+            SynthesizeCommand.insert(generate_records(scale=scale), flush=True)
+            with self.assertNumQueries(12):
+                constrains, courses, teachers, rooms, time_slots, shift, sections = load_inputs('Morning')
+
+            self.assertEqual(len(teachers), 22 * scale)
+            self.assertEqual(len(sections), 16 * scale)
+            self.assertTrue(all(teacher.preferred_courses for teacher in teachers))
+            self.assertTrue(all(course.shifts for course in courses))
+            self.assertEqual({ts.shift for ts in time_slots}, {shift})
+
+
+class GenerationJobTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        SynthesizeCommand.insert(generate_records(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',)))
+        self.shift = DjangoShift.objects.get(name='Evening')
+
+    def test_active_job_is_reused(self):
+        job = enqueue_generation(self.shift, seed=0)
+        self.assertEqual(enqueue_generation(self.shift).pk, job.pk)
+
+        with self.settings(GENERATION_SPAWN_WORKER=False):
+            self.client.get(reverse('generate_routine_view', args=[self.shift.id]))
+        self.assertEqual(GenerationJob.objects.count(), 1)
+
+    def test_worker_runs_job_and_reports_progress(self):
+        job = enqueue_generation(self.shift, seed=0)
+        claimed = claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(claim_next_job())
+
+        with mock.patch('university.jobs.update_progress', wraps=update_progress) as progress:
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_job(claimed, progress_interval=0, stdout=io.StringIO())
+
+        placed = [call.args[1]['courses_placed'] for call in progress.call_args_list]
+        self.assertGreater(len(placed), 1)
+        self.assertEqual(placed, sorted(placed))
+
+        status = self.client.get(reverse('generation_status', args=[self.shift.id])).json()
+        self.assertEqual(status['status'], GenerationJob.DONE)
+        self.assertFalse(status['active'])
+        self.assertEqual(status['courses_placed'], status['courses_total'])
+        self.assertTrue(DjangoAssignment.objects.filter(shift=self.shift).exists())
+
+        # The shift is free again once the job finished
+        self.assertNotEqual(enqueue_generation(self.shift).pk, job.pk)
+
+
+def save_synthetic_routine(shift_name='Evening', **kwargs):
+    """Synthetic university in the test database with a generated and saved routine for the shift."""
+    SynthesizeCommand.insert(generate_records(**kwargs), flush=True)
+    command = GenerateCommand(stdout=io.StringIO())
+    with contextlib.redirect_stdout(io.StringIO()):
+        assignments, _ = ScheduleGenerator(*command.initialize_data(shift=shift_name), seed=0).generate()
+    command.save_routine(assignments)
+    return DjangoShift.objects.get(name=shift_name)
+
+
+class IncrementalGenerateTest(DatabaseTestCase):
+    @staticmethod
+    def routine(shift):
+        return {
+            row.id: (row.course_id, row.section_id, row.teacher_id, row.room_id, frozenset(ts.id for ts in row.time_slot.all()))
+            for row in DjangoAssignment.objects.filter(shift=shift).prefetch_related('time_slot')
+        }
+
+    def generate(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('generate', '--shift', 'Evening', '--incremental', '--seed', '0', stdout=io.StringIO())
+
+    def test_only_the_changes_are_placed(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        before = self.routine(shift)
+        self.generate()
+        self.assertEqual(self.routine(shift), before)
+
+        teacher_id = next(iter(before.values()))[2]
+        DjangoTeacher.objects.filter(id=teacher_id).update(is_active=False)
+        course = DjangoCourse.objects.filter(is_lab=False).exclude(assignment__teacher_id=teacher_id).first()
+        course.sessions_per_week += 1
+        course.save()
+        self.generate()
+        after = self.routine(shift)
+
+        # Everything the deactivated teacher did not teach stays where it was, the rest is placed anew
+        unchanged = {pk: row for pk, row in before.items() if row[2] != teacher_id}
+        self.assertEqual({pk: after[pk] for pk in unchanged}, unchanged)
+        self.assertNotIn(teacher_id, {row[2] for row in after.values()})
+        self.assertEqual(len(after), len(before) + len({row[1] for row in before.values() if row[0] == course.id}))
+
+        busy = set()
+        for course_id, section_id, teacher_id, room_id, slot_ids in after.values():
+            for slot_id in slot_ids:
+                for key in (('teacher', teacher_id), ('section', section_id), ('room', room_id)):
+                    self.assertNotIn((key, slot_id), busy)
+                    busy.add((key, slot_id))
+
+
+class GenerateCommandTest(DatabaseTestCase):
+    def test_generate_replaces_saved_routine(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        old_ids = set(DjangoAssignment.objects.filter(shift=shift).values_list('id', flat=True))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command('generate', '--shift', 'Evening', '--seed', '1', stdout=io.StringIO())
+
+        new_ids = set(DjangoAssignment.objects.filter(shift=shift).values_list('id', flat=True))
+        self.assertTrue(new_ids)
+        self.assertFalse(old_ids & new_ids)
+
+    def test_failed_coordinated_run_keeps_saved_routines(self):
+        save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6)
+        saved = DjangoAssignment.objects.count()
+        self.assertGreater(saved, 0)
+
+        with mock.patch('university.management.commands.generate.run_coordinated', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('generate', '--shift', 'Evening', 'Morning', stdout=io.StringIO())
+        self.assertEqual(DjangoAssignment.objects.count(), saved)
+
+    def test_failed_solve_keeps_saved_routine(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        saved = DjangoAssignment.objects.filter(shift=shift).count()
+        self.assertGreater(saved, 0)
+
+        solver = mock.Mock()
+        solver.solve.return_value = SolverResult(
+            solver='cp-sat', status='unknown', assignments=[], unassigned_sessions=10, total_score=0.0, seconds=0.05,
+        )
+        with mock.patch('university.management.commands.generate.get_solver', return_value=solver):
+            with self.assertRaises(CommandError):
+                call_command('generate', '--shift', 'Evening', '--solver', 'cp-sat', '--no-warm-start',
+                             '--time-limit', '0.05', stdout=io.StringIO())
+
+        self.assertEqual(DjangoAssignment.objects.filter(shift=shift).count(), saved)
+
+
+class RoutineViewTest(DatabaseTestCase):
+    def test_explain_queries_leaves_the_indexes(self):
+        save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        call_command('explain_queries', '--without-indexes', '--repeat', '1', stdout=io.StringIO())
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, DjangoAssignment._meta.db_table)
+        self.assertIn('assignment_shift_section_idx', constraints)
+        self.assertEqual(constraints['assignment_shift_teacher_idx']['columns'], ['shift_id', 'teacher_id'])
+
+        # Without transactional DDL the dropped indexes could not be rolled back
+        with mock.patch.object(type(connection.features), 'can_rollback_ddl', False):
+            with self.assertRaises(CommandError):
+                call_command('explain_queries', '--without-indexes', '--repeat', '1', stdout=io.StringIO())
+        with connection.cursor() as cursor:
+            self.assertIn('assignment_shift_section_idx', connection.introspection.get_constraints(
+                cursor, DjangoAssignment._meta.db_table))
+
+    def test_query_count_does_not_grow_with_data(self):
+        for scale in (1, 2):
+            shift = save_synthetic_routine(semesters=3, courses_per_semester=4, teachers=6, shifts=('Evening',), scale=scale)
+            with self.assertNumQueries(7):
+                response = self.client.get(reverse('routine', args=[shift.id]))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(reverse('routine', args=[shift.id])).content, response.content)
+
+            sections = {f"{a.section.semester}-{a.section.name}" for a in DjangoAssignment.objects.select_related('section')}
+            self.assertEqual(set(response.context['routine_data']), sections)
+            for day, slots in response.context['slots_by_day'].items():
+                for row in response.context['routine_data'].values():
+                    self.assertEqual(sum(cell['colspan'] for cell in row[day]), len(slots))
+
+    def test_changes_invalidate_the_snapshot(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        self.client.get(reverse('routine', args=[shift.id]))
+
+        teacher = DjangoAssignment.objects.select_related('teacher').first().teacher
+        teacher.name = 'Renamed Teacher'
+        teacher.save()
+        self.assertContains(self.client.get(reverse('routine', args=[shift.id])), 'Renamed Teacher')
+
+        # A bulk delete bumps once, not once per row through the signals
+        with mock.patch('university.signals.bump_routine_version') as row_bump:
+            GenerateCommand(stdout=io.StringIO()).clear_previous_assignments(shift)
+        row_bump.assert_not_called()
+        self.assertEqual(self.client.get(reverse('routine', args=[shift.id])).context['routine_data'], {})
+
+    def test_admin_delete_invalidates_the_snapshot(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        self.client.get(reverse('routine', args=[shift.id]))
+
+        AssignmentAdmin(DjangoAssignment, admin.site).delete_queryset(None, DjangoAssignment.objects.filter(shift=shift))
+        self.assertEqual(self.client.get(reverse('routine', args=[shift.id])).context['routine_data'], {})
+
+    def test_teacher_view_reads_cached_snapshots(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        teacher = DjangoAssignment.objects.select_related('teacher').first().teacher
+        self.client.get(reverse('routine', args=[shift.id]))
+
+        # Teacher and shift lookups only, the routine itself comes from the snapshot
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('teacher_routine', args=[teacher.initial]))
+        cells = [
+            cell for data in response.context['all_routines'].values()
+            for days in data['routine_data'].values() for row in days.values() for cell in row if cell['text']
+        ]
+        self.assertEqual(
+            sum(cell['colspan'] for cell in cells),
+            sum(a.time_slot.count() for a in DjangoAssignment.objects.filter(teacher=teacher)),
+        )
+
+    def test_all_teachers_view_is_one_request(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        self.client.get(reverse('routine', args=[shift.id]))
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('all_teachers_routine'))
+        routines = {routine['teacher'].id: routine['all_routines'] for routine in response.context['routines']}
+        self.assertEqual(set(routines), set(DjangoTeacher.objects.values_list('id', flat=True)))
+
+        teacher = DjangoAssignment.objects.select_related('teacher').first().teacher
+        single = self.client.get(reverse('teacher_routine', args=[teacher.initial]))
+        self.assertEqual(routines[teacher.id], single.context['all_routines'])
+
+        response = self.client.get(reverse('all_teachers_routine'), {'department': teacher.department_id})
+        self.assertEqual(
+            {routine['teacher'].department_id for routine in response.context['routines']}, {teacher.department_id},
+        )
+        self.assertEqual(self.client.get(reverse('all_teachers_routine'), {'department': 'abc'}).status_code, 400)
+
+
+class RoutinePdfTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        settings = self.settings(ROUTINE_PDF_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        weasyprint = mock.Mock()
+        weasyprint.HTML.return_value.write_pdf.return_value = b'%PDF-1.7'
+        patcher = mock.patch.dict('sys.modules', {'weasyprint': weasyprint})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.html = weasyprint.HTML
+        self.write_pdf = weasyprint.HTML.return_value.write_pdf
+
+    def test_pdf_is_rendered_once_per_content(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        url = reverse('export_routine_pdf', args=[shift.id])
+
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.7')
+        self.assertIn('cse_evening_routine.pdf', response['Content-Disposition'])
+        self.assertEqual(self.client.get(url)['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.write_pdf.call_count, 1)
+
+        course = DjangoAssignment.objects.select_related('course').first().course
+        course.name = 'Renamed Course'
+        course.save()
+        self.assertNotEqual(self.client.get(url)['ETag'], response['ETag'])
+        self.assertEqual(self.write_pdf.call_count, 2)
+
+    def test_section_and_teacher_pdfs(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        assignment = DjangoAssignment.objects.select_related('teacher', 'section').first()
+
+        for url in (
+            reverse('export_section_routine_pdf', args=[assignment.section_id]),
+            reverse('export_teacher_routine_pdf', args=[assignment.teacher.initial]),
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(reverse('export_teacher_routine_pdf', args=['nobody'])).status_code, 404)
+
+        rendered = [call.kwargs['string'] for call in self.html.call_args_list]
+        self.assertIn(assignment.course.name, rendered[0])
+        self.assertIn(assignment.teacher.name, rendered[1])
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        shift = save_synthetic_routine(semesters=2, courses_per_semester=4, teachers=6, shifts=('Evening',))
+        with mock.patch('university.pdf.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                pdf.render(pdf.shift_document(shift.id))
+        self.assertEqual([p for p in self.root.rglob('*') if p.is_file()], [])
@@ -0,0 +1,237 @@
+# shift timetable snapshots shared by the routine, teacher and pdf views, cached per routine version.
+
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from university.models import Assignment, Course, Section, Shift, TimeSlot
+
+DAYS = ['Thursday', 'Friday', 'Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday']
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+EPOCH_KEY = 'timetable:epoch'
+# Part of the snapshot keys, bump it when the snapshot layout changes so old cached ones are never read
+SNAPSHOT_FORMAT = 3
+
+
+def _version_key(shift_id: int) -> str:
+    return f'timetable:version:{shift_id}'
+
+
+def routine_version(shift_id: int) -> str:
+    """
+    Version stamp of a shift's routine, a random token per shift plus one shared by all shifts.
+    Tokens are never reused, a token lost from the cache just means a rebuild, never a stale snapshot.
+    """
+    keys = [_version_key(shift_id), EPOCH_KEY]
+    tokens = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in tokens}
+    if missing:
+        cache.set_many(missing, None)
+        tokens.update(missing)
+    return f'{tokens[EPOCH_KEY]}:{tokens[keys[0]]}'
+
+
+def bump_routine_version(*shift_ids: int):
+    """
+    New version for the shifts, or for every shift when none are given. Bumped right away and again on commit,
+    a snapshot built from the data seen inside the transaction must not outlive it.
+    """
+    def bump():
+        if shift_ids:
+            cache.set_many({_version_key(shift_id): uuid.uuid4().hex for shift_id in shift_ids}, None)
+        else:
+            cache.set(EPOCH_KEY, uuid.uuid4().hex, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def group_slots_by_day(time_slots: List[dict], days: List[str] = DAYS) -> Dict[str, List[dict]]:
+    """Slots in `days` order, each day's slots in the order given, days without slots are left out."""
+    by_day = defaultdict(list)
+    for slot in time_slots:
+        by_day[slot['day']].append(slot)
+    return {day: by_day[day] for day in days if by_day[day]}
+
+
+def build_rows(records: List[dict], slots_by_day: Dict[str, List[dict]], row_key: Callable[[dict], object],
+               order: Optional[List[int]] = None) -> dict:
+    """
+    Colspan rows per row key and day, from a (row key, day, slot id) -> record index built in one pass.
+    The first record in `order` covering a slot wins the cell and spans all its slots of that day.
+    returns: {row key: {day: [(colspan, record index or None), ...]}}, row keys in `order`
+    """
+    order = range(len(records)) if order is None else order
+    index = {}
+    for i in order:
+        for day, slot_ids in records[i]['slots'].items():
+            for slot_id in slot_ids:
+                index.setdefault((row_key(records[i]), day, slot_id), i)
+
+    rows = {}
+    for key in dict.fromkeys(row_key(records[i]) for i in order):
+        rows[key] = {}
+        for day, slots in slots_by_day.items():
+            row = []
+            used_slots = set()
+            i = 0
+            while i < len(slots):
+                found = index.get((key, day, slots[i]['id']))
+                if found is not None and slots[i]['id'] not in used_slots:
+                    slot_ids = records[found]['slots'][day]
+                    used_slots.update(slot_ids)
+                    row.append((len(slot_ids), found))
+                    i += len(slot_ids)
+                else:
+                    row.append((1, None))
+                    i += 1
+            rows[key][day] = row
+    return rows
+
+
+def section_order(records: List[dict]) -> List[int]:
+    """Record indices by section (semester, name), then by assignment id."""
+    return sorted(range(len(records)), key=lambda i: (records[i]['section_order'], records[i]['id']))
+
+
+def render_rows(rows: dict, records: List[dict], cell_text: Callable[[dict], str]) -> dict:
+    """Snapshot rows as the {'colspan', 'text'} cells the templates expect."""
+    return {
+        key: {
+            day: [{'colspan': colspan, 'text': cell_text(records[i]) if i is not None else ""} for colspan, i in row]
+            for day, row in days.items()
+        }
+        for key, days in rows.items()
+    }
+
+
+def public_cell_text(record: dict) -> str:
+    return f"({record['course_code']}) {record['course_name']} ({record['teacher_name']})<br><small>{record['room']}</small>"
+
+
+def teacher_cell_text(record: dict) -> str:
+    return f"({record['course_code']}) {record['course_name']}<br><small>{record['room']}</small>"
+
+
+def pdf_cell_text(record: dict) -> str:
+    return f"{record['course_name']} ({record['teacher_initial']})<br><small>{record['room']}</small>"
+
+
+def build_snapshot(shift_id: int) -> Optional[dict]:
+    """
+    Plain data (dicts, lists, times) describing a shift's routine: its sections, slots by day, one record per assignment,
+    the record indices per teacher, the section and semester grids and the unassigned summary. A fixed number of queries, None for an unknown shift.
+    """
+    shift = Shift.objects.filter(id=shift_id).values('id', 'name').first()
+    if shift is None:
+        return None
+
+    time_slots = list(
+        TimeSlot.objects.filter(shift_id=shift_id).order_by('day', 'slot_number')
+        .values('id', 'day', 'slot_number', 'start_time', 'end_time')
+    )
+    slots_by_day = group_slots_by_day(time_slots)
+
+    records = []
+    for a in Assignment.objects.filter(shift_id=shift_id).select_related('course', 'teacher', 'room', 'section')\
+            .prefetch_related('time_slot').order_by('id'):
+        slots = defaultdict(list)
+        for s in sorted(a.time_slot.all(), key=lambda s: s.slot_number):
+            slots[s.day].append(s.id)
+        records.append({
+            'id': a.id,
+            'course_code': a.course.code,
+            'course_name': a.course.name,
+            'semester': a.course.semester,
+            'teacher_id': a.teacher_id,
+            'teacher_name': a.teacher.name,
+            'teacher_initial': a.teacher.initial,
+            'room': a.room.name,
+            'section_id': a.section_id,
+            'section': f"{a.section.semester}-{a.section.name}",
+            'section_order': (a.section.semester, a.section.name),
+            'slots': dict(slots),
+        })
+
+    teacher_index = defaultdict(list)
+    for i, record in enumerate(records):
+        teacher_index[record['teacher_id']].append(i)
+
+    section_rows = build_rows(records, slots_by_day, row_key=lambda r: r['section'], order=section_order(records))
+    semester_rows = build_rows(records, slots_by_day, row_key=lambda r: r['semester'])
+    semester_rows = dict(sorted(semester_rows.items()))
+
+    # Sessions placed per (course, section), one aggregate query instead of one count per pair
+    assigned_counts = {
+        (row['course_id'], row['section_id']): row['count']
+        for row in Assignment.objects.filter(section__shift_id=shift_id).values('course_id', 'section_id')
+        .annotate(count=Count('id'))
+    }
+    sections = list(Section.objects.filter(shift_id=shift_id).order_by('id').values('id', 'name', 'semester'))
+    sections_by_semester = defaultdict(list)
+    for sec in sections:
+        sections_by_semester[sec['semester']].append(sec)
+
+    unassigned = defaultdict(list)
+    unassigned_count = 0
+    for course in Course.objects.filter(is_active=True).order_by('id').values('id', 'code', 'name', 'semester', 'sessions_per_week'):
+        for sec in sections_by_semester[course['semester']]:
+            as_count = assigned_counts.get((course['id'], sec['id']), 0)
+            if as_count < course['sessions_per_week']:
+                unassigned[f"{sec['semester']}-{sec['name']}"].append({
+                    'semester': sec['semester'],
+                    'section': sec['name'],
+                    'course_id': course['id'],
+                    'code': course['code'],
+                    'name': course['name'],
+                    'session_needed_per_week': course['sessions_per_week'],
+                    'assigned_per_week': as_count,
+                })
+                unassigned_count += 1
+
+    return {
+        'shift': shift,
+        'sections': {sec['id']: f"{sec['semester']}-{sec['name']}" for sec in sections},
+        'slots_by_day': slots_by_day,
+        'assignments': records,
+        'teacher_index': dict(teacher_index),
+        'section_rows': section_rows,
+        'semester_rows': semester_rows,
+        'unassigned': dict(sorted(unassigned.items())),
+        'unassigned_count': unassigned_count,
+    }
+
+
+def get_snapshot(shift_id: int) -> Optional[dict]:
+    """Cached snapshot of the shift's current routine version, built on a miss."""
+    key = f'timetable:snapshot:{SNAPSHOT_FORMAT}:{shift_id}:{routine_version(shift_id)}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot(shift_id)
+        if snapshot is not None:
+            cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def teacher_routine(snapshot: dict, teacher_id: int, cell_text: Callable[[dict], str]) -> dict:
+    """
+    A teacher's grid within one shift snapshot, over the slots the teacher teaches in only.
+    Reads the teacher's records through the snapshot's teacher index, never the whole shift.
+    """
+    records = [snapshot['assignments'][i] for i in snapshot['teacher_index'].get(teacher_id, [])]
+
+    used = {slot_id for r in records for slot_ids in r['slots'].values() for slot_id in slot_ids}
+    slots_by_day = {
+        day: [slot for slot in slots if slot['id'] in used] for day, slots in snapshot['slots_by_day'].items()
+    }
+    slots_by_day = {day: slots for day, slots in slots_by_day.items() if slots}
+
+    rows = build_rows(records, slots_by_day, row_key=lambda r: r['section'], order=section_order(records))
+    return {
+        'routine_data': render_rows(rows, records, cell_text),
+        'slots_by_day': slots_by_day,
+        'days': slots_by_day.keys(),
+    }
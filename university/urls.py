@@ -1,10 +1,15 @@
 from django.urls import path
-from university.views import routine_test_view, teacher_routine_view, public_routine_view, generate_routine_pdf, GenerateNewRoutineSet
+from university.views import routine_test_view, teacher_routine_view, all_teachers_routine_view, public_routine_view, generate_routine_pdf, GenerateNewRoutineSet, \
+    generation_status_view, section_routine_pdf, teacher_routine_pdf
 
 urlpatterns = [
     path('<int:shift_id>/', public_routine_view, name='routine'),
     path('export/<int:shift_id>/', generate_routine_pdf, name='export_routine_pdf'),
+    path('export/section/<int:section_id>/', section_routine_pdf, name='export_section_routine_pdf'),
+    path('export/teacher/<initial>/', teacher_routine_pdf, name='export_teacher_routine_pdf'),
     path('scheduler/routine/', routine_test_view, name='routine'),
     path('routine/teacher/<initial>/', teacher_routine_view, name='teacher_routine'),
+    path('routine/teachers/', all_teachers_routine_view, name='all_teachers_routine'),
     path('generate/<int:shift_id>/', GenerateNewRoutineSet.as_view(), name='generate_routine_view'),
+    path('generate/<int:shift_id>/status/', generation_status_view, name='generation_status'),
 ]
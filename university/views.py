@@ -1,11 +1,9 @@
-from collections import defaultdict
-from weasyprint import HTML
-from django.http import Http404
+from django.http import Http404, HttpResponseBadRequest
 from django.shortcuts import render, get_object_or_404
-from django.template.loader import render_to_string
-from django.http import HttpResponse
 from django.db.models import Count
-from university.models import Assignment, TimeSlot, Teacher, Course, Shift, Section
+from university.models import Assignment, TimeSlot, Teacher, Course, Shift
+from university import pdf
+from university.timetable import get_snapshot, render_rows, teacher_routine, public_cell_text, teacher_cell_text
 
 
 def routine_test_view(request):
@@ -57,241 +55,123 @@ def routine_test_view(request):
     return render(request, 'routine.html', context)
 
 def public_routine_view(request, shift_id):
-    shift = get_object_or_404(Shift, id=shift_id)
-    assignments = Assignment.objects.filter(shift=shift).select_related('course', 'teacher', 'room')\
-        .prefetch_related('time_slot')
-
-    # Order time slots consistently
-    time_slots = TimeSlot.objects.filter(shift=shift).order_by('day', 'slot_number')
-    days = ['Thursday', 'Friday', 'Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday']
-
-    # Build time slots grouped by day
-    slots_by_day = defaultdict(list)
-    for day in days:
-        for slot in time_slots:
-            if slot.day == day:
-                slots_by_day[slot.day].append(slot)
-
-    # Get unique semesters sections
-    sections = sorted(set(a.section for a in assignments), key=lambda s: s.semester)
-    all_courses = Course.objects.filter(is_active=True)
-
-    # Initialize routine data
-    routine_data = {f"{sec.semester}-{sec.name}": {day: [] for day in slots_by_day.keys()} for sec in sections}
-
-    for sec in sections:
-        sem_assignments = [a for a in assignments if a.section.id == sec.id]
-
-        for day in slots_by_day.keys():
-            slots = slots_by_day[day]
-            # slot_ids = [s.id for s in slots]
-
-            # Track which slots are already used (to avoid duplicates)
-            used_slots = set()
-            row = []
-
-            i = 0
-            while i < len(slots):
-                slot = slots[i]
-
-                # Check if any assignment starts at this slot
-                matched_assignment = None
-                for a in sem_assignments:
-                    a_slot_ids = [s.id for s in a.time_slot.all() if s.day == day]
-                    if slot.id in a_slot_ids and slot.id not in used_slots:
-                        matched_assignment = a
-                        break
-
-                if matched_assignment:
-                    a_slot_ids = [s.id for s in matched_assignment.time_slot.all() if s.day == day]
-                    a_slot_objs = [s for s in matched_assignment.time_slot.all() if s.day == day]
-                    a_slot_objs.sort(key=lambda x: x.slot_number)
-
-                    # Count how many slots this assignment spans
-                    colspan = len(a_slot_objs)
-
-                    # Mark these slots as used
-                    for s in a_slot_objs:
-                        used_slots.add(s.id)
-
-                    cell_text = f"({matched_assignment.course.code}) {matched_assignment.course.name} ({matched_assignment.teacher.name})<br><small>{matched_assignment.room.name}</small>"
-                    row.append({'colspan': colspan, 'text': cell_text})
-                    i += colspan
-                else:
-                    row.append({'colspan': 1, 'text': ""})
-                    i += 1
-
-            routine_data[f"{sec.semester}-{sec.name}"][day] = row
-
-    # Count how many times each course is already assigned in this section
-    unassigned = defaultdict(list)
-    unassigned_count = 0
-    for course in all_courses:
-        for sec in Section.objects.filter(shift=shift, semester=course.semester):
-            as_count = Assignment.objects.filter(course=course, section=sec).count()
-            if as_count < course.sessions_per_week:
-                unassigned[f"{sec.semester}-{sec.name}"].append(
-                    {
-                        'semester': sec.semester,
-                        'section': sec.name,
-                        'course_id': course.id,
-                        'code': course.code,
-                        'name': course.name,
-                        'session_needed_per_week': course.sessions_per_week,
-                        'assigned_per_week': as_count,
-                    }
-                )
-                unassigned_count += 1
-    unassigned = dict(sorted(unassigned.items()))
+    snapshot = get_snapshot(shift_id)
+    if snapshot is None:
+        raise Http404('No Shift matches the given query.')
 
+    slots_by_day = snapshot['slots_by_day']
     context = {
-        'routine_data': routine_data,
+        'routine_data': render_rows(snapshot['section_rows'], snapshot['assignments'], public_cell_text),
         'slots_by_day': slots_by_day,
         'days': slots_by_day.keys(),
-        'unassigned': unassigned,
-        'unassigned_count': unassigned_count,
+        'unassigned': snapshot['unassigned'],
+        'unassigned_count': snapshot['unassigned_count'],
         'shift_id': shift_id,
-        'shift': shift,
+        'shift': snapshot['shift'],
     }
     return render(request, 'public_routine.html', context)
 
 def teacher_routine_view(request, *args, **kwargs):
     teacher = get_object_or_404(Teacher, initial=kwargs['initial'])
-    shifts = Shift.objects.all() # or order by id if needed
-    days = ['Thursday', 'Friday', 'Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday']
-
-    all_routines = {}
-
-    for shift in shifts:
-        assignments = Assignment.objects.filter(shift=shift, teacher=teacher).select_related(
-            'course', 'room', 'section').prefetch_related('time_slot')
-
-        # time_slots = [ass.time_slot.all() for ass in assignments]
-
-        time_slots = TimeSlot.objects.filter(shift=shift, assignments__in=assignments).distinct().order_by('day', 'slot_number')
-
-        slots_by_day = defaultdict(list)
-        for day in days:
-            for slot in time_slots:
-                if slot.day == day:
-                    slots_by_day[day].append(slot)
-
-        sections = sorted(set(a.section for a in assignments), key=lambda s: (s.semester, s.name))
-        routine_data = {f"{sec.semester}-{sec.name}": {day: [] for day in slots_by_day.keys()} for sec in sections}
-
-        for sec in sections:
-            sec_assignments = [a for a in assignments if a.section.id == sec.id]
-
-            for day in slots_by_day.keys():
-                slots = slots_by_day[day]
-                used_slots = set()
-                row = []
-
-                i = 0
-                while i < len(slots):
-                    slot = slots[i]
-                    matched_assignment = None
-                    for a in sec_assignments:
-                        a_slot_ids = [s.id for s in a.time_slot.all() if s.day == day]
-                        if slot.id in a_slot_ids and slot.id not in used_slots:
-                            matched_assignment = a
-                            break
-
-                    if matched_assignment:
-                        a_slot_objs = [s for s in matched_assignment.time_slot.all() if s.day == day]
-                        a_slot_objs.sort(key=lambda x: x.slot_number)
-                        colspan = len(a_slot_objs)
-                        for s in a_slot_objs:
-                            used_slots.add(s.id)
-
-                        cell_text = f"({matched_assignment.course.code}) {matched_assignment.course.name}<br><small>{matched_assignment.room.name}</small>"
-                        row.append({'colspan': colspan, 'text': cell_text})
-                        i += colspan
-                    else:
-                        row.append({'colspan': 1, 'text': ""})
-                        i += 1
-
-                routine_data[f"{sec.semester}-{sec.name}"][day] = row
-
-        all_routines[shift.name] = {
-            'routine_data': routine_data,
-            'slots_by_day': slots_by_day,
-            'days': slots_by_day.keys(),
-        }
+    snapshots = [get_snapshot(shift_id) for shift_id in Shift.objects.order_by('id').values_list('id', flat=True)]
 
     context = {
         'teacher': teacher,
-        'all_routines': all_routines,
+        'all_routines': {
+            snapshot['shift']['name']: teacher_routine(snapshot, teacher.id, teacher_cell_text) for snapshot in snapshots
+        },
     }
     return render(request, 'teacher_routine.html', context)
 
-def generate_routine_pdf(request, shift_id):
-    DAYS = ['Thursday', 'Friday', 'Saturday']
-
-    shift = get_object_or_404(Shift, id=shift_id)
-
-    # Preload data
-    timeslots = TimeSlot.objects.all().order_by('slot_number')
-    assignments = Assignment.objects.filter(shift=shift).prefetch_related(
-        'time_slot', 'course', 'teacher', 'room'
-    )
-
-    # Group by day
-    day_map = defaultdict(list)
-    for assignment in assignments:
-        for ts in assignment.time_slot.all():
-            day_map[ts.day].append({
-                'assignment': assignment,
-                'time_slots': list(assignment.time_slot.all()),
-                'min_slot': min([s.slot_number for s in assignment.time_slot.all()])
-            })
-
-    # Get sorted days
-    # days_sorted = sorted(day_map.items(), key=lambda x: x[0])  # Optional: custom weekday sort
+def all_teachers_routine_view(request):
+    """Every active teacher's routine on one page, optionally for one department (?department=<id>)."""
+    teachers = Teacher.objects.filter(is_active=True).select_related('department').order_by('department__name', 'name')
+    if request.GET.get('department'):
+        try:
+            department_id = int(request.GET['department'])
+        except ValueError:
+            return HttpResponseBadRequest('department must be a department id')
+        teachers = teachers.filter(department_id=department_id)
+    snapshots = [get_snapshot(shift_id) for shift_id in Shift.objects.order_by('id').values_list('id', flat=True)]
+
+    routines = [
+        {
+            'teacher': teacher,
+            'all_routines': {
+                snapshot['shift']['name']: teacher_routine(snapshot, teacher.id, teacher_cell_text) for snapshot in snapshots
+            },
+        }
+        for teacher in teachers
+    ]
+    return render(request, 'all_teachers_routine.html', {'routines': routines})
 
-    sorted_keys = [key for key in DAYS if key in day_map]
-    days_sorted = {key: day_map[key] for key in DAYS}
+def generate_routine_pdf(request, shift_id):
+    document = pdf.shift_document(shift_id)
+    if document is None:
+        raise Http404('No Shift matches the given query.')
+    return pdf.pdf_response(request, document)
 
 
-    html_string = render_to_string('pdf/routine_pdf.html', {
-        'days_data': days_sorted.items(),
-        'all_slots': timeslots,
-        'semesters': sorted({a.course.semester for a in assignments}),
-    })
+def section_routine_pdf(request, section_id):
+    document = pdf.section_document(section_id)
+    if document is None:
+        raise Http404('No Section matches the given query.')
+    return pdf.pdf_response(request, document)
 
-    html = HTML(string=html_string)
-    pdf_file = html.write_pdf()
 
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="cse_evening_routine.pdf"'
-    return response
+def teacher_routine_pdf(request, initial):
+    document = pdf.teacher_document(initial)
+    if document is None:
+        raise Http404('No Teacher matches the given query.')
+    return pdf.pdf_response(request, document)
 
 
 from django.views import View
-from django.http import HttpResponseRedirect
-from django.core.management import call_command
-from io import StringIO
+from django.http import HttpResponseRedirect, JsonResponse
+from django.conf import settings
+from university.jobs import enqueue_generation, spawn_worker
+from university.models import GenerationJob
 
 
 class GenerateNewRoutineSet(View):
     """
-    Django class-based view that runs a management command and redirects back to the referring URL.
+    Queues a generation job for the shift and redirects back to the referring URL right away.
+    A detached worker runs the job unless GENERATION_SPAWN_WORKER is off, then a long running
+    `manage.py run_generation_jobs` is expected to pick it up.
     """
 
     def get(self, request, *args, **kwargs):
-        command_name = 'generate'  # Replace with your management command name
-
         shift_id = kwargs.get('shift_id')
         shift = get_object_or_404(Shift, pk=shift_id)
 
-        out = StringIO()
-        err = StringIO()
-        try:
-            call_command(command_name, shift=shift.name, stdout=out, stderr=err)
-        except Exception as ex:
-            print(ex)
-            pass
+        job = enqueue_generation(shift)
+        if job.status == GenerationJob.QUEUED and getattr(settings, 'GENERATION_SPAWN_WORKER', True):
+            spawn_worker()
 
         # Get 'Referer' HTTP header to redirect back
         referer_url = request.META.get('HTTP_REFERER', '/')
-        return HttpResponseRedirect(referer_url)
\ No newline at end of file
+        return HttpResponseRedirect(referer_url)
+
+
+def generation_status_view(request, shift_id):
+    """Latest generation job of the shift as JSON, polled by the routine page while a job is active."""
+    shift = get_object_or_404(Shift, pk=shift_id)
+    job = GenerationJob.objects.filter(shift=shift).order_by('-created_at', '-id').first()
+    if job is None:
+        return JsonResponse({'status': None})
+
+    return JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'active': job.status in GenerationJob.ACTIVE_STATUSES,
+        'phase': job.phase,
+        'courses_placed': job.courses_placed,
+        'courses_total': job.courses_total,
+        'candidates': job.candidates,
+        'best_score': job.best_score,
+        'unassigned_sessions': job.unassigned_sessions,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    })